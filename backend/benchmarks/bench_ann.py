@@ -0,0 +1,103 @@
+# backend/benchmarks/bench_ann.py
+# Recall / latency benchmark for the index types in backend/database/index_factory.py.
+# - Synthetic 384-d unit vectors (clustered, like sentence embeddings)
+# - Ground truth = exact IndexFlatIP (the current default)
+# - Reports build time, index bytes/vector, recall@k vs flat and single-query p50/p99 latency
+# - Lossy kinds (sq8/fp16/ivfpq) get a second "+rerank" row: candidates re-scored exactly
+#   against the float32 vectors, as many as the app fetches (FAISS_RERANK / FAISS_PQ_RERANK)
+#   unless --rerank overrides it
+#
+# Usage:
+#   python -m backend.benchmarks.bench_ann                      # 10k, 100k, 1M
+#   python -m backend.benchmarks.bench_ann --sizes 10000 100000 --kinds flat hnsw
+#   python -m backend.benchmarks.bench_ann --sizes 100000 --kinds flat sq8 fp16 ivfpq --rerank 4
+# Knobs (efSearch, nprobe, PQ m, ...) come from the same FAISS_* env vars as the app.
+
+from __future__ import annotations
+import argparse
+import time
+from typing import Dict, List
+import faiss
+import numpy as np
+
+from backend.database import index_factory
+
+
+#--- clustered synthetic data: n base vectors + nq held-out queries ---#
+def synthetic(n: int, nq: int, d: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 500), d)).astype("float32")
+    def draw(m: int) -> np.ndarray:
+        X = centers[rng.integers(0, len(centers), m)] + 0.6 * rng.standard_normal((m, d)).astype("float32")
+        faiss.normalize_L2(X)
+        return X
+    return draw(n), draw(nq)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0].tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def build(kind: str, X: np.ndarray):
+    t0 = time.perf_counter()
+    train = X[np.random.default_rng(1).permutation(len(X))[:100_000]] if index_factory.needs_training(kind) else None
+    idx = index_factory.build_index(kind, X.shape[1], train)
+    idx.add_with_ids(X, np.arange(len(X), dtype="int64"))
+    return idx, time.perf_counter() - t0
+
+
+def bench_kind(idx, kind: str, X: np.ndarray, Q: np.ndarray, truth: np.ndarray, k: int, rerank: int = 0) -> Dict[str, float]:
+    params = index_factory.search_params(kind)
+    fetch = (k * rerank if rerank > 0 else index_factory.candidates(kind, k)) if rerank else k
+    lat: List[float] = []
+    found = np.empty((len(Q), k), dtype="int64")
+    for i in range(len(Q)):
+        t = time.perf_counter()
+        _, I = idx.search(Q[i:i + 1], fetch, params=params)
+        if rerank:
+            _, I = index_factory.rerank(Q[i:i + 1], I, X, k)
+        lat.append((time.perf_counter() - t) * 1000)
+        found[i] = I[0]
+    return {
+        "recall": recall_at_k(found, truth),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="FAISS index type recall/latency benchmark")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--kinds", nargs="+", default=list(index_factory.INDEX_KINDS), choices=index_factory.INDEX_KINDS)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--threads", type=int, default=1, help="faiss OpenMP threads (1 = per-request latency)")
+    ap.add_argument("--rerank", type=int, default=-1, help="candidates per result for the +rerank rows (-1 = the app's setting)")
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(args.threads)
+
+    print(f"| n | kind | build s | bytes/vec | recall@{args.k} | p50 ms | p99 ms |")
+    print("|---|---|---|---|---|---|---|")
+    for n in args.sizes:
+        X, Q = synthetic(n, args.queries, args.dim)
+        gt = faiss.IndexFlatIP(args.dim)
+        gt.add(X)
+        _, truth = gt.search(Q, args.k)
+        del gt
+        for kind in args.kinds:
+            idx, build_s = build(kind, X)
+            size = faiss.serialize_index(idx).nbytes / n
+            runs = [(kind, 0)] + ([(f"{kind}+rerank", args.rerank)] if index_factory.is_lossy(kind) else [])
+            for label, rerank in runs:
+                r = bench_kind(idx, kind, X, Q, truth, args.k, rerank)
+                print(
+                    f"| {n:,} | {label} | {build_s:.1f} | {size:.0f} | {r['recall']:.3f} | {r['p50_ms']:.2f} | {r['p99_ms']:.2f} |",
+                    flush=True,
+                )
+            del idx
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# backend/benchmarks/bench_assembly.py
+# Per-query Python overhead of docs_search result assembly.
+# - "legacy": the original path, i.e. search K = oversample unfiltered candidates, then walk
+#   them in Python (_norm_id on both sides, string compares, one dict per candidate
+#   carrying the full metadata dict, sort, slice top_k)
+# - "vectorized": numpy mask over the coded MetaStore columns -> IDSelector search
+#   for exactly top_k -> lazy Hits (only the returned rows' text is decoded)
+# Faiss time and assembly time are reported separately; the gap in the assembly
+# column is the Python overhead removed, and it grows with oversample.
+#
+# Usage:
+#   python -m backend.benchmarks.bench_assembly
+#   python -m backend.benchmarks.bench_assembly --rows 200000 --oversample 50 500 5000
+
+from __future__ import annotations
+import argparse
+import time
+from typing import Any, Dict, List
+import faiss
+import numpy as np
+
+from backend.database.faiss_handler import _norm_id
+from backend.database.meta_store import MetaStore
+from backend.database.vector_store import _id_selector
+
+
+def build(rows: int, dim: int, docs: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, dim)).astype("float32")
+    faiss.normalize_L2(X)
+    idx = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+    idx.add_with_ids(X, np.arange(rows, dtype="int64"))
+    doc = rng.integers(0, docs, rows)
+    meta = MetaStore("docs:bench", dim)
+    meta.append(
+        [f"chunk {i} " + "lorem ipsum " * 40 for i in range(rows)],
+        user_id="u1", doc_id=[f"doc{d}" for d in doc.tolist()], filename=[f"doc{d}.pdf" for d in doc.tolist()],
+    )
+    items = [meta.record(i) for i in range(rows)]   # the old meta.pkl list-of-dicts
+    return idx, meta, items, rng
+
+
+def legacy(idx, items: List[Dict[str, Any]], q: np.ndarray, top_k: int, oversample: int, user_id: str, doc_id: str):
+    t0 = time.perf_counter()
+    D, I = idx.search(q, min(oversample, idx.ntotal))
+    t1 = time.perf_counter()
+    candidates = []
+    for score, rowid in zip(D[0].tolist(), I[0].tolist()):
+        if rowid < 0:
+            continue
+        info = items[rowid] if rowid < len(items) else None
+        if not info or info.get("deleted") is True:
+            continue
+        if _norm_id(info.get("user_id")) != _norm_id(user_id):
+            continue
+        if doc_id and _norm_id(info.get("doc_id")) != _norm_id(doc_id):
+            continue
+        candidates.append({"score": float(score), "id": int(rowid), "text": info.get("text", ""), "metadata": info})
+    candidates.sort(key=lambda x: x["score"], reverse=True)
+    out = [h["text"] for h in candidates[:top_k]]
+    return t1 - t0, time.perf_counter() - t1, out
+
+
+def vectorized(idx, meta: MetaStore, q: np.ndarray, top_k: int, user_id: str, doc_id: str):
+    t0 = time.perf_counter()
+    mask = meta.mask(user_id=user_id, doc_id=doc_id)
+    count = int(mask.sum())
+    sel, keepalive = _id_selector(mask, count)
+    t1 = time.perf_counter()
+    D, I = idx.search(q, min(top_k, count), params=faiss.SearchParameters(sel=sel))
+    t2 = time.perf_counter()
+    out = [h["text"] for h in meta.hits(D, I)[0]]
+    t3 = time.perf_counter()
+    return t2 - t1, (t1 - t0) + (t3 - t2), out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="docs_search result assembly benchmark")
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--docs", type=int, default=50, help="distinct doc_ids (a doc filter keeps ~1/docs rows)")
+    ap.add_argument("--oversample", type=int, nargs="+", default=[50, 500, 5000, 50000])
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--queries", type=int, default=100)
+    args = ap.parse_args()
+    faiss.omp_set_num_threads(1)
+
+    idx, meta, items, rng = build(args.rows, args.dim, args.docs)
+    Q = rng.standard_normal((args.queries, args.dim)).astype("float32")
+    faiss.normalize_L2(Q)
+
+    print("| filter | oversample | path | faiss ms | assembly ms | hits |")
+    print("|---|---|---|---|---|---|")
+    for doc_id in (None, "doc7"):
+        label = "doc_id" if doc_id else "user only"
+        runs = [("legacy", k) for k in args.oversample] + [("vectorized", None)]
+        for path, K in runs:
+            f_ms, a_ms, n = [], [], 0
+            for i in range(len(Q)):
+                if path == "legacy":
+                    tf, ta, out = legacy(idx, items, Q[i:i + 1], args.top_k, K, "u1", doc_id)
+                else:
+                    tf, ta, out = vectorized(idx, meta, Q[i:i + 1], args.top_k, "u1", doc_id)
+                f_ms.append(tf * 1000)
+                a_ms.append(ta * 1000)
+                n += len(out)
+            print(
+                f"| {label} | {K if K else '-'} | {path} | {np.median(f_ms):.2f} | {np.median(a_ms):.3f} | {n / len(Q):.1f} |",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
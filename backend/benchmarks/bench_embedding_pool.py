@@ -0,0 +1,62 @@
+# backend/benchmarks/bench_embedding_pool.py
+# Ingestion embedding throughput: chunks/s in-process vs the process pool at N workers.
+# - "in-process": one model.encode over all chunks in this process (the previous path)
+# - "pool N": EmbeddingPool(N) with cores // N threads per worker; vectors come back
+#   through shared memory. Pool start-up (spawn + model load) is timed separately
+#   and excluded from chunks/s, since the pool is long-lived in the server
+# Chunks are ~1000-character texts, like chunk_text(chunk_size=1000) produces.
+#
+# Usage:
+#   python -m backend.benchmarks.bench_embedding_pool
+#   python -m backend.benchmarks.bench_embedding_pool --chunks 4000 --workers 1 2 4 8
+
+from __future__ import annotations
+import argparse
+import os
+import time
+import numpy as np
+
+from backend.utils.embedding_pool import EMBED_POOL_SHARD, EmbeddingPool
+from backend.utils.model_registry import get_model
+
+
+def chunks(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = "policy invoice audit retention contract revenue server rotation clause the of and to in".split()
+    return [" ".join(rng.choice(words, size=160)) for _ in range(n)]
+
+
+def main() -> None:
+    cores = os.cpu_count() or 1
+    ap = argparse.ArgumentParser(description="process-pool ingestion embedding benchmark")
+    ap.add_argument("--chunks", type=int, default=1000)
+    ap.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, max(1, cores // 2), cores}))
+    ap.add_argument("--shard", type=int, default=EMBED_POOL_SHARD)
+    args = ap.parse_args()
+    texts = chunks(args.chunks)
+
+    print(f"cores={cores} chunks={len(texts)}")
+    print("| path | workers x threads | start-up s | chunks/s | speedup |")
+    print("|---|---|---|---|---|")
+    model = get_model()
+    model.encode(texts[:32], convert_to_numpy=True)
+    t0 = time.perf_counter()
+    ref = np.asarray(model.encode(texts, convert_to_numpy=True), dtype="float32")
+    base = len(texts) / (time.perf_counter() - t0)
+    print(f"| in-process | 1 x {cores} | - | {base:.1f} | 1.00x |", flush=True)
+
+    for n in args.workers:
+        pool = EmbeddingPool(workers=n, shard=args.shard)
+        t0 = time.perf_counter()
+        pool.encode(texts[:n * 2])                     # spawn + load the model in every worker
+        startup = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        V = pool.encode(texts)
+        cps = len(texts) / (time.perf_counter() - t0)
+        pool.shutdown()
+        assert V.shape == ref.shape and np.allclose(V, ref, atol=1e-4), "pool output differs from in-process"
+        print(f"| pool | {n} x {pool.threads} | {startup:.1f} | {cps:.1f} | {cps / base:.2f}x |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
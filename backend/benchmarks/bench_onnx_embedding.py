@@ -0,0 +1,86 @@
+# backend/benchmarks/bench_onnx_embedding.py
+# PyTorch SentenceTransformer vs ONNX Runtime (fp32 / int8) embedding backends on CPU.
+# 1) Parity: cosine similarity of each backend's vectors against the PyTorch output on
+#    a fixed mixed-length corpus; fails (exit 1) below --min-cos (fp32) / --min-cos-int8
+# 2) Throughput: texts/s for chunk-sized texts at each --batch size
+# Needs the exported directory (python -m backend.utils.onnx_embedder export) and, for
+# the reference, sentence-transformers + torch.
+#
+# Usage:
+#   python -m backend.benchmarks.bench_onnx_embedding
+#   python -m backend.benchmarks.bench_onnx_embedding --texts 2000 --batch 1 32 128
+
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import sys
+import time
+import numpy as np
+
+from backend.utils.model_registry import EMBED_MODEL, model_source
+from backend.utils.onnx_embedder import ONNX_INT8_FILE, OnnxEmbedder, onnx_dir, parity
+
+_WORDS = (
+    "invoice payment policy retention schedule ISO-9001 audit clause v2.3.1 server key rotation "
+    "employee onboarding contract termination notice period quarterly revenue forecast table "
+    "the a of and to in for on with by from that this is are was were be"
+).split()
+
+
+def corpus(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.choice([4, 12, 40, 120, 400], size=n)            # question .. full chunk
+    return [" ".join(rng.choice(_WORDS, size=k)) for k in lengths]
+
+
+def throughput(model, texts, batch: int) -> float:
+    model.encode(texts[:batch], batch_size=batch, convert_to_numpy=True)   # warm
+    t0 = time.perf_counter()
+    model.encode(texts, batch_size=batch, convert_to_numpy=True)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="ONNX vs PyTorch embedding backend benchmark")
+    ap.add_argument("--model", default=EMBED_MODEL)
+    ap.add_argument("--dir", default=None, help="exported ONNX directory (default onnx_dir(model))")
+    ap.add_argument("--texts", type=int, default=512)
+    ap.add_argument("--batch", type=int, nargs="+", default=[1, 32])
+    ap.add_argument("--min-cos", type=float, default=0.999)
+    ap.add_argument("--min-cos-int8", type=float, default=0.98)
+    args = ap.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    path = onnx_dir(args.model) if args.dir is None else Path(args.dir)
+    backends = [("torch", SentenceTransformer(model_source(args.model), device="cpu"), None)]
+    backends.append(("onnx fp32", OnnxEmbedder(path, quantized=False), args.min_cos))
+    if (path / ONNX_INT8_FILE).is_file():
+        backends.append(("onnx int8", OnnxEmbedder(path, quantized=True), args.min_cos_int8))
+
+    texts = corpus(args.texts)
+    ref = backends[0][1]
+    ok = True
+    print("| backend | dim | min cos | mean cos | parity |")
+    print("|---|---|---|---|---|")
+    for label, model, floor in backends[1:]:
+        p = parity(ref, model, texts[:256])
+        passed = p["dim"] == p["dim_ref"] and p["min"] >= floor
+        ok &= passed
+        print(f"| {label} | {p['dim']} | {p['min']:.5f} | {p['mean']:.5f} | {'ok' if passed else 'FAIL'} |", flush=True)
+
+    print()
+    print("| backend | batch | texts/s | speedup |")
+    print("|---|---|---|---|")
+    for batch in args.batch:
+        base = None
+        for label, model, _ in backends:
+            tps = throughput(model, texts, batch)
+            base = base or tps
+            print(f"| {label} | {batch} | {tps:.0f} | {tps / base:.2f}x |", flush=True)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# backend/benchmarks/bench_query_batching.py
+# Query-embedding throughput under concurrency: one encode per request vs the micro-batcher.
+# - "single": every client thread calls model.encode([query]) itself (the previous path)
+# - "batched": clients submit to EmbeddingBatcher, which encodes up to --max-batch
+#   queued queries per model call
+# The embedding cache is bypassed (every query text is unique), so the numbers are
+# pure model throughput. Reports queries/s and per-request latency p50 / p95.
+#
+# Usage:
+#   python -m backend.benchmarks.bench_query_batching
+#   python -m backend.benchmarks.bench_query_batching --clients 1 8 32 --max-wait-ms 2 5
+
+from __future__ import annotations
+import argparse
+import threading
+import time
+from typing import Callable, List
+import numpy as np
+
+from backend.utils.embedding_batcher import EmbeddingBatcher
+from backend.utils.model_registry import get_model
+
+
+def run(clients: int, per_client: int, call: Callable[[str], np.ndarray]):
+    lat: List[float] = []
+    lock = threading.Lock()
+
+    def client(c: int) -> None:
+        mine = []
+        for i in range(per_client):
+            t0 = time.perf_counter()
+            call(f"client {c} question {i}: how do I rotate the signing keys for service {i * 7 + c}?")
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    ms = np.array(lat) * 1000
+    return len(lat) / wall, float(np.percentile(ms, 50)), float(np.percentile(ms, 95))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="query embedding micro-batching benchmark")
+    ap.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--per-client", type=int, default=50)
+    ap.add_argument("--max-batch", type=int, default=32)
+    ap.add_argument("--max-wait-ms", type=float, nargs="+", default=[5.0])
+    args = ap.parse_args()
+
+    model = get_model()
+    model.encode(["warmup"], convert_to_numpy=True)
+    encode = lambda texts: model.encode(texts, convert_to_numpy=True)
+
+    print("| clients | path | max wait ms | queries/s | p50 ms | p95 ms |")
+    print("|---|---|---|---|---|---|")
+    for clients in args.clients:
+        qps, p50, p95 = run(clients, args.per_client, lambda q: encode([q])[0])
+        print(f"| {clients} | single | - | {qps:.0f} | {p50:.1f} | {p95:.1f} |", flush=True)
+        for wait in args.max_wait_ms:
+            batcher = EmbeddingBatcher(encode, max_batch=args.max_batch, max_wait_ms=wait)
+            qps, p50, p95 = run(clients, args.per_client, batcher.embed)
+            print(
+                f"| {clients} | batched (avg {batcher.stats()['avg_batch']}) | {wait:g} | {qps:.0f} | {p50:.1f} | {p95:.1f} |",
+                flush=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# backend/benchmarks/bench_vector_pipeline.py
+# Encoder output -> store-ready matrix: time and peak memory of the two hand-offs.
+# - "lists": the previous path. encode() ndarray -> .tolist() (get_embeddings) ->
+#   np.array(..., float32) in docs_add -> _norm's astype copy + normalize_L2
+# - "ndarray": embed_texts normalizes the encoder's float32 array in place; _norm sees
+#   unit rows and hands the same buffer to the store (no copy)
+# The model itself is not run (a random (n, dim) float32 array stands in for its
+# output), so the numbers are the pipeline overhead alone. Peak memory is measured
+# with tracemalloc above the encoder output (timings include tracemalloc's per-object
+# overhead, which inflates the list path; compare the ndarray row against a plain run).
+#
+# Usage:
+#   python -m backend.benchmarks.bench_vector_pipeline
+#   python -m backend.benchmarks.bench_vector_pipeline --chunks 1000 10000 50000
+
+from __future__ import annotations
+import argparse
+import time
+import tracemalloc
+import faiss
+import numpy as np
+
+from backend.database.faiss_handler import _norm
+from backend.utils.embedding_handler import _unit
+
+
+def lists(E: np.ndarray) -> np.ndarray:
+    vectors = E.tolist()                                    # get_embeddings
+    X = np.array(vectors, dtype="float32").astype("float32")  # docs_add + old _norm
+    faiss.normalize_L2(X)
+    return X
+
+
+def ndarray(E: np.ndarray) -> np.ndarray:
+    return _norm(_unit(E))                                  # embed_texts -> docs_add
+
+
+def measure(fn, E: np.ndarray):
+    E = E.copy()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    X = fn(E)
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dt, peak, X
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="embedding -> store hand-off benchmark")
+    ap.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--dim", type=int, default=384)
+    args = ap.parse_args()
+
+    print("| chunks | path | ms | peak extra MB | copies of the matrix |")
+    print("|---|---|---|---|---|")
+    rng = np.random.default_rng(0)
+    for n in args.chunks:
+        E = rng.standard_normal((n, args.dim)).astype("float32")
+        size = E.nbytes
+        ref = None
+        for label, fn in (("lists", lists), ("ndarray", ndarray)):
+            dt, peak, X = measure(fn, E)
+            ref = X if ref is None else ref
+            assert np.allclose(X, ref, atol=1e-5)
+            print(f"| {n} | {label} | {dt * 1000:.1f} | {peak / 2**20:.1f} | {peak / size:.1f} |", flush=True)
+
+
+if __name__ == "__main__":
+    main()
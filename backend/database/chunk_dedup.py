@@ -0,0 +1,97 @@
+# backend/database/chunk_dedup.py
+# Chunk-level dedup for document ingest.
+# - Exact: blake2b of the whitespace-collapsed chunk text (case is kept: a linked row's
+#   stored text is what the new doc's hits return)
+# - Near-duplicate (optional, CHUNK_DEDUP_MINHASH=1): MinHash over word 3-shingles of the
+#   casefolded text with LSH banding; a candidate counts as a duplicate once the estimated
+#   Jaccard similarity reaches CHUNK_DEDUP_JACCARD
+# - ChunkIndex maps (user code, text) -> the latest row holding that text in a docs
+#   namespace. vector_store keeps it in step with meta (built lazily, like BM25), and
+#   faiss_handler.docs_add_chunks uses it so a repeated chunk links the existing row
+#   to the new doc instead of being embedded and stored again
+# Env: CHUNK_DEDUP (1 = on), CHUNK_DEDUP_MINHASH, CHUNK_DEDUP_JACCARD
+
+from __future__ import annotations
+import hashlib
+import os
+import re
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+CHUNK_DEDUP = os.getenv("CHUNK_DEDUP", "1") == "1"
+CHUNK_DEDUP_MINHASH = os.getenv("CHUNK_DEDUP_MINHASH", "0") == "1"
+CHUNK_DEDUP_JACCARD = float(os.getenv("CHUNK_DEDUP_JACCARD", "0.9"))
+
+MINHASH_PERMS = 64
+MINHASH_BANDS = 16                      # 16 bands x 4 rows: ~0.9 Jaccard pairs collide almost surely
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240607)
+_A = _rng.integers(1, _PRIME, MINHASH_PERMS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, MINHASH_PERMS, dtype=np.uint64)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _SPACES.sub(" ", (text or "").strip())
+
+
+def chunk_hash(text: str) -> bytes:
+    return hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=16).digest()
+
+
+def minhash(text: str) -> np.ndarray:
+    """(MINHASH_PERMS,) uint64 signature of the text's word 3-shingles."""
+    words = normalize(text).casefold().split(" ")
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+    h = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((_A[:, None] * h[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+
+
+def unique_chunks(texts: Sequence[str]) -> List[str]:
+    """Drop exact repeats (after normalize), keeping the first occurrence and the order."""
+    seen, out = set(), []
+    for t in texts:
+        h = chunk_hash(t)
+        if h not in seen:
+            seen.add(h)
+            out.append(t)
+    return out
+
+
+class ChunkIndex:
+    """(user code, chunk text) -> latest row id, exact and (optionally) near-duplicate."""
+
+    def __init__(self, near: bool = CHUNK_DEDUP_MINHASH):
+        self.near = near
+        self.rows = 0                                          # meta rows indexed so far
+        self._exact: Dict[Tuple[int, bytes], int] = {}
+        self._bands: Dict[Tuple[int, int, bytes], List[int]] = {}
+        self._sigs: Dict[int, np.ndarray] = {}
+
+    def add(self, texts: Sequence[str], user_codes: Sequence[int]) -> None:
+        """Index the next len(texts) rows (row ids continue from self.rows)."""
+        for text, user in zip(texts, user_codes):
+            row, user = self.rows, int(user)
+            self._exact[(user, chunk_hash(text))] = row
+            if self.near:
+                sig = minhash(text)
+                self._sigs[row] = sig
+                for b, band in enumerate(np.split(sig, MINHASH_BANDS)):
+                    self._bands.setdefault((user, b, band.tobytes()), []).append(row)
+            self.rows += 1
+
+    def find(self, user_code: int, text: str) -> Optional[int]:
+        row = self._exact.get((int(user_code), chunk_hash(text)))
+        if row is not None or not self.near:
+            return row
+        sig = minhash(text)
+        cands = set()
+        for b, band in enumerate(np.split(sig, MINHASH_BANDS)):
+            cands.update(self._bands.get((int(user_code), b, band.tobytes()), ()))
+        best, best_sim = None, 0.0
+        for r in sorted(cands, reverse=True):                  # newest first wins ties
+            sim = float(np.mean(self._sigs[r] == sig))
+            if sim >= CHUNK_DEDUP_JACCARD and sim > best_sim:
+                best, best_sim = r, sim
+        return best
@@ -0,0 +1,265 @@
+# backend/database/conv_memory.py
+# Per-conversation memory store (replaces the global "conv" FAISS namespace).
+# - One small append-only log per conversation:
+#     vectorstores/conversations/mem/<conversation key>/memory.log
+#   (wal.py framing: "add" records carry the turn vectors + texts, "del" records drop message ids)
+# - Loaded lazily on first use into one contiguous float32 matrix; a lookup is a single
+#   numpy matrix-vector product over THIS conversation's turns -> O(turns), no matter
+#   how many conversations / users exist
+# - LRU residency: at most CONV_MEM_CACHE conversations are kept in RAM
+# - Appends from other workers are picked up by tailing the log (one stat per access);
+#   writers hold the conversation's FileLock
+# - The old global "conv" namespace is split into per-conversation logs once, on first use
+
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+from backend.database.locks import FileLock
+from backend.database.wal import WriteAheadLog
+from backend.database.vector_store import CONV_DIR, Namespace, _has_snapshot
+
+logger = logging.getLogger("conv_memory")
+
+MEM_DIR = CONV_DIR / "mem"
+CONV_MEM_CACHE = int(os.getenv("CONV_MEM_CACHE", "256"))   # resident conversations (LRU)
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _conv_key(conversation_id: str) -> str:
+    cid = str(conversation_id or "")
+    return cid if _SAFE_KEY.match(cid) else hashlib.sha1(cid.encode("utf-8")).hexdigest()
+
+
+# ---------------- one conversation ----------------
+class _Conversation:
+    """Resident turns of one conversation: float32 matrix + parallel text/role/id lists."""
+
+    def __init__(self, key: str):
+        self.dir: Path = MEM_DIR / key
+        self.log = WriteAheadLog(self.dir / "memory.log")
+        self.flock = FileLock(self.dir / ".lock")
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.X = np.empty((0, 0), dtype="float32")   # capacity-doubling buffer, rows [:n] are valid
+        self.n = 0
+        self.alive = np.empty(0, dtype=bool)
+        self.texts: List[str] = []
+        self.roles: List[Optional[str]] = []
+        self.message_ids: List[Optional[str]] = []
+        self.user_id: Optional[str] = None
+        self.pos = 0                                   # log bytes applied
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self.X.shape[1] if self.n else None
+
+    #--- apply log records not seen yet (first load, or another worker's appends); caller holds self.lock ---#
+    def catch_up(self) -> None:
+        size = self.log.size
+        if size < self.pos:
+            self._reset()                              # conversation dropped / recreated
+        if size == self.pos:
+            return
+        for head, payload, end in self.log.read_from(self.pos):
+            self.pos = end
+            if head["op"] == "add":
+                X = np.frombuffer(payload, dtype="float32").reshape(-1, int(head["dim"]))
+                self._add(X, head["texts"], head["roles"], head["message_ids"], head.get("user_id"))
+            elif head["op"] == "del":
+                drop = set(head["message_ids"])
+                for i, mid in enumerate(self.message_ids):
+                    if mid in drop:
+                        self.alive[i] = False
+
+    def _add(self, X: np.ndarray, texts: List[str], roles: List[Optional[str]], message_ids: List[Optional[str]], user_id: Optional[str]) -> None:
+        need = self.n + X.shape[0]
+        if self.n and X.shape[1] != self.X.shape[1]:
+            raise ValueError(f"Conversation memory dimension mismatch: existing={self.X.shape[1]}, new={X.shape[1]}")
+        if need > self.X.shape[0] or X.shape[1] != self.X.shape[1]:
+            grown = np.empty((max(need, 2 * self.X.shape[0], 16), X.shape[1]), dtype="float32")
+            alive = np.zeros(grown.shape[0], dtype=bool)
+            if self.n:
+                grown[: self.n] = self.X[: self.n]
+                alive[: self.n] = self.alive[: self.n]
+            self.X, self.alive = grown, alive
+        self.X[self.n:need] = X
+        self.alive[self.n:need] = True
+        self.texts += texts
+        self.roles += roles
+        self.message_ids += message_ids
+        self.user_id = self.user_id or user_id
+        self.n = need
+
+
+# ---------------- store ----------------
+class ConversationMemory:
+    """LRU of resident conversations, each lazily loaded from its own log."""
+
+    def __init__(self, capacity: int = CONV_MEM_CACHE):
+        self.capacity = capacity
+        self._convs: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._migrated = False
+
+    def _get(self, conversation_id: str) -> _Conversation:
+        self._migrate_legacy()
+        key = _conv_key(conversation_id)
+        with self._lock:
+            conv = self._convs.get(key)
+            if conv is None:
+                conv = self._convs[key] = _Conversation(key)
+                while len(self._convs) > self.capacity:
+                    self._convs.popitem(last=False)
+            else:
+                self._convs.move_to_end(key)
+            return conv
+
+    def add(
+        self, *, user_id: str, conversation_id: str, X: np.ndarray, texts: List[str],
+        roles: Optional[List[Optional[str]]] = None, message_ids: Optional[List[Optional[str]]] = None,
+    ) -> int:
+        X = np.ascontiguousarray(X, dtype="float32")
+        n = X.shape[0]
+        head = {
+            "op": "add", "dim": int(X.shape[1]), "user_id": user_id, "texts": list(texts),
+            "roles": list(roles) if roles else [None] * n,
+            "message_ids": list(message_ids) if message_ids else [None] * n,
+        }
+        conv = self._get(conversation_id)
+        with conv.lock, conv.flock.hold():
+            conv.catch_up()
+            if conv.dim is not None and conv.dim != X.shape[1]:
+                raise ValueError(f"Conversation memory dimension mismatch: existing={conv.dim}, new={X.shape[1]}")
+            conv.log.truncate(conv.pos)                # torn tail of a crashed writer
+            conv.pos = conv.log.append(head, X.tobytes())
+            conv._add(X, head["texts"], head["roles"], head["message_ids"], user_id)
+        return n
+
+    def search(self, *, user_id: str, conversation_id: str, q: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Top-k turns of one conversation by inner product (q: normalized (d,) or (1, d))."""
+        return self.search_batch(user_id=user_id, conversation_id=conversation_id, Q=q, top_k=top_k)[0]
+
+    def search_batch(self, *, user_id: str, conversation_id: str, Q: np.ndarray, top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Top-k turns for each row of Q (normalized (n, d)): one matrix product for the whole batch."""
+        Q = np.asarray(Q, dtype="float32").reshape(-1, np.shape(Q)[-1])
+        conv = self._get(conversation_id)
+        with conv.lock:
+            conv.catch_up()
+            if not conv.n or conv.user_id != user_id:
+                return [[] for _ in range(Q.shape[0])]
+            if Q.shape[1] != conv.dim:
+                raise ValueError(f"Conversation memory dimension mismatch: existing={conv.dim}, query={Q.shape[1]}")
+            alive = conv.alive[: conv.n]
+            k = min(int(top_k), int(alive.sum()))
+            if k <= 0:
+                return [[] for _ in range(Q.shape[0])]
+            S = Q @ conv.X[: conv.n].T                 # (n, turns)
+            S[:, ~alive] = -np.inf
+            top = np.argpartition(-S, k - 1, axis=1)[:, :k]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(S, top, axis=1), axis=1, kind="stable"), axis=1)
+            return [[self._hit(conv, conversation_id, int(i), float(S[r, i])) for i in row] for r, row in enumerate(top.tolist())]
+
+    @staticmethod
+    def _hit(conv: _Conversation, conversation_id: str, i: int, score: float) -> Dict[str, Any]:
+        return {
+            "score": score,
+            "id": i,
+            "text": conv.texts[i],
+            "metadata": {
+                "ns": "conv", "user_id": conv.user_id, "conversation_id": str(conversation_id),
+                **({"role": conv.roles[i]} if conv.roles[i] is not None else {}),
+                **({"message_id": conv.message_ids[i]} if conv.message_ids[i] is not None else {}),
+                "text": conv.texts[i], "deleted": False,
+            },
+        }
+
+    def remove_messages(self, *, user_id: str, conversation_id: str, message_ids: List[str]) -> int:
+        conv = self._get(conversation_id)
+        with conv.lock, conv.flock.hold():
+            conv.catch_up()
+            if not conv.n or conv.user_id != user_id:
+                return 0
+            drop = set(message_ids)
+            hit = [i for i, mid in enumerate(conv.message_ids) if mid in drop and conv.alive[i]]
+            if not hit:
+                return 0
+            conv.log.truncate(conv.pos)
+            conv.pos = conv.log.append({"op": "del", "message_ids": sorted(drop)})
+            conv.alive[hit] = False
+            return len(hit)
+
+    def drop(self, *, user_id: str, conversation_id: str) -> int:
+        """Forget a whole conversation (its log is deleted)."""
+        conv = self._get(conversation_id)
+        with conv.lock, conv.flock.hold():
+            conv.catch_up()
+            if conv.n and conv.user_id != user_id:
+                return 0
+            count = int(conv.alive[: conv.n].sum())
+            if conv.log.path.exists():
+                conv.log.path.unlink()
+            conv._reset()
+        with self._lock:
+            self._convs.pop(conv.dir.name, None)
+        shutil.rmtree(conv.dir, ignore_errors=True)
+        return count
+
+    #--- one-time split of the global "conv" FAISS namespace into per-conversation logs ---#
+    def _migrate_legacy(self) -> None:
+        if self._migrated:
+            return
+        marker = MEM_DIR / ".migrated"
+        if marker.exists() or not (_has_snapshot("conv") or (CONV_DIR / "wal.log").exists()):
+            self._migrated = True
+            return
+        with FileLock(MEM_DIR / ".migrate.lock").hold():
+            if marker.exists():
+                self._migrated = True
+                return
+            space = Namespace("conv")
+            meta, moved = space.meta, 0
+            live = np.flatnonzero(~meta.deleted)
+            if live.size and meta.dim is not None:
+                convs = meta.column("conversation_id")[live]
+                for code in np.unique(convs).tolist():
+                    rows = live[convs == code]
+                    cid = meta.vocab["conversation_id"][code] if code >= 0 else ""
+                    log = WriteAheadLog(MEM_DIR / _conv_key(cid) / "memory.log")
+                    if log.size:
+                        continue                       # already migrated (interrupted earlier run)
+                    head = {
+                        "op": "add", "dim": int(meta.dim), "user_id": meta.value("user_id", int(rows[0])),
+                        "texts": [meta.text(int(r)) for r in rows],
+                        "roles": [meta.value("role", int(r)) for r in rows],
+                        "message_ids": [meta.value("message_id", int(r)) for r in rows],
+                    }
+                    log.append(head, np.ascontiguousarray(space.raw.take(rows), dtype="float32").tobytes())
+                    moved += int(rows.size)
+            MEM_DIR.mkdir(parents=True, exist_ok=True)
+            marker.write_text("conv namespace split into mem/<conversation>/memory.log\n", encoding="utf-8")
+            self._migrated = True
+            logger.info(f"Migrated {moved} conversation-memory vectors from the global conv index (old files can be deleted)")
+
+
+_MEMORY: Optional[ConversationMemory] = None
+_MEMORY_LOCK = threading.Lock()
+
+
+def get_memory() -> ConversationMemory:
+    global _MEMORY
+    if _MEMORY is None:
+        with _MEMORY_LOCK:
+            if _MEMORY is None:
+                _MEMORY = ConversationMemory()
+    return _MEMORY
@@ -1,32 +1,46 @@
 # backend/database/faiss_handler.py
 # Windows-friendly FAISS utils for document RAG + conversation memory.
-# - Uses IndexIDMap over IndexFlatIP for stable IDs
+# - conversation memory lives in per-conversation numpy matrices (conv_memory.py),
+#   so a lookup only scores that conversation's turns
+# - Uses IndexIDMap for stable IDs (over IndexFlatIP by default, or HNSW/IVF per
+#   FAISS_INDEX_DOCS / FAISS_INDEX_CONV, see index_factory.py)
 # - ALWAYS uses add_with_ids (never add) to avoid IDMap errors
-# - Keeps a simple meta.pkl (dim, next_id, items=list aligned to rows)
+# - Metadata is columnar + integer coded (meta_store.MetaStore), row id == position
+# - Index + meta stay resident in the process-wide VectorStore (vector_store.py);
+#   writes are persisted by its snapshot policy instead of on every call
+# - docs are sharded per user (docs_shard), so search only scans that user's vectors
+# - filters (user/doc/filename/conversation, deleted) are applied inside faiss via
+#   IDSelectors, so searches return exactly top_k eligible rows (no oversampling)
+# - results are lazy meta_store.Hit objects (read like the old dicts); text and
+#   metadata are only decoded for the hits a caller touches
+# - docs searches can also run lexical (BM25) or hybrid (dense + BM25, RRF) per call,
+#   see lexical_index.py
+# - docs results are cached per user (retrieval_cache.py); uploads / deletes bump
+#   the user's generation so stale results are never served
+# - ingest dedups chunks (docs_add_chunks): text the user already stored reuses its
+#   row, so it is neither embedded nor stored twice
+# - vectors are float32 ndarrays end to end: embedding_handler.embed_* output is already
+#   unit length and reaches the store without a copy (lists are still accepted)
+# - deletes hard-remove vectors (flat / sq8 / fp16; hnsw and ivf rows stay tombstoned and
+#   filtered out); tombstoned meta rows are compacted in the background
+# - safe under concurrent threads / worker processes: searches hold the namespace
+#   read lock while they resolve row ids, writes go through the store's locks
 
 from __future__ import annotations
-from pathlib import Path
-import pickle
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Union
 from bson import ObjectId
 import faiss
 import numpy as np
 import logging
 
-# Storage# 
-ROOT = Path(__file__).resolve().parents[2]  # repo root
-BASE = ROOT / "vectorstores"
-DOCS_DIR = BASE / "docs"
-CONV_DIR = BASE / "conversations"
-DOCS_DIR.mkdir(parents=True, exist_ok=True)
-CONV_DIR.mkdir(parents=True, exist_ok=True)
-#creat faiss index and meta path return for  doc and cov #-----
-def _paths(ns: str) -> Tuple[Path, Path]:
-    if ns == "docs":
-        return DOCS_DIR / "index.faiss", DOCS_DIR / "meta.pkl"
-    if ns == "conv":
-        return CONV_DIR / "index.faiss", CONV_DIR / "meta.pkl"
-    raise ValueError(f"Unknown namespace: {ns}")
+from backend.database.vector_store import BASE, DOCS_DIR, CONV_DIR, docs_shard, get_store
+from backend.database.conv_memory import get_memory
+from backend.database.lexical_index import HYBRID_DEPTH, resolve_mode, rrf
+from backend.database.retrieval_cache import get_cache, text_key, vector_key
+from backend.database.chunk_dedup import CHUNK_DEDUP, unique_chunks
+
+logger = logging.getLogger("faiss_handler")
+
 # Helpers---#
 # --------------------------------------------------------------------------
 def _norm_id(x)-> str: # this always return Id  as string #
@@ -36,61 +50,19 @@ def _norm_id(x)-> str: # this always return Id  as string #
         return str(x)
     return str(x)
 
-# vector normalization for fais search#
-def _norm(X: np.ndarray) -> np.ndarray:
-    X = X.astype("float32")
-    if X.ndim == 1:
-        X = X.reshape(1, -1)
-    faiss.normalize_L2(X)
-    return X
-# it creat new fais index#---
-def _new_idmap(dim: int) -> faiss.IndexIDMap:
-    return faiss.IndexIDMap(faiss.IndexFlatIP(dim))
-#-- verify add with id inside faiss--#
-def _is_idmap(ix: faiss.Index) -> bool:
-    return hasattr(ix, "add_with_ids")
-#-- load fais and meta index if file is present then load id index map is present and vector are not tjhrough error and if fais is empty it creat new---#
-def _load(ns: str) -> Tuple[faiss.IndexIDMap, Dict[str, Any]]:
-    idx_path, meta_path = _paths(ns)
-    if idx_path.exists() and meta_path.exists():
-        idx = faiss.read_index(str(idx_path))
-        if not _is_idmap(idx):
-            if getattr(idx, "ntotal", 0) > 0:
-                raise RuntimeError(
-                    f"FAISS: {idx_path.name} is not an IDMap but already has vectors. "
-                    f"Delete these files once so we can rebuild as IDMap:\n  {idx_path}\n  {meta_path}"
-                )
-            idx = faiss.IndexIDMap(idx)
-
-        with open(meta_path, "rb") as f:
-            meta = pickle.load(f)
-        meta.setdefault("dim", None)
-        meta.setdefault("next_id", int(getattr(idx, "ntotal", 0)))
-        meta.setdefault("items", [])
-        nt = int(getattr(idx, "ntotal", 0))
-        if len(meta["items"]) < nt:
-            meta["items"].extend([None] * (nt - len(meta["items"])))
-        return idx, meta
-    idx = _new_idmap(1)
-    meta = {"dim": None, "next_id": 0, "items": []}
-    return idx, meta
-# save index and meta on disk#
-def _save(ns: str, idx: faiss.IndexIDMap, meta: Dict[str, Any]) -> None:
-    idx_path, meta_path = _paths(ns)
-    faiss.write_index(idx, str(idx_path))
-    with open(meta_path, "wb") as f:
-        pickle.dump(meta, f)
-# it ensure that either you are changing your model or no--#
-def _ensure_dim(idx: faiss.IndexIDMap, meta: Dict[str, Any], d: int) -> faiss.IndexIDMap:
-    if meta["dim"] is None:
-        if getattr(idx, "ntotal", 0) != 0:
-            raise ValueError("Index not empty but dim is None; delete index files and retry.")
-        idx = _new_idmap(d)
-        meta["dim"] = d
-        return idx
-    if meta["dim"] != d:
-        raise ValueError(f"FAISS dimension mismatch: existing={meta['dim']}, new={d}. Delete files to rebuild.")
-    return idx
+# vector normalization for fais search: vectors from embedding_handler.embed_* are already
+# unit length and pass through without a copy; anything else is normalized in a private copy#
+def _norm(X) -> np.ndarray:
+    A = np.ascontiguousarray(X, dtype="float32")
+    if A.ndim == 1:
+        A = A.reshape(1, -1)
+    sq = np.einsum("ij,ij->i", A, A)
+    if sq.size and np.all(np.abs(sq - 1.0) < 1e-4):
+        return A
+    if (isinstance(X, np.ndarray) and np.may_share_memory(A, X)) or not A.flags.writeable:
+        A = A.copy()                     # never normalize the caller's (or the cache's) array
+    faiss.normalize_L2(A)
+    return A
 
 # DOCS namespace id assign , metadata store , and save index----------------#
 
@@ -99,39 +71,24 @@ def docs_add(
     user_id: str, 
     doc_id: Optional[str], 
     texts: List[str], 
-    vectors: List[List[float]], 
+    vectors: Union[np.ndarray, List[List[float]]], 
     filename: Optional[str] = None
 ) -> Dict[str, Any]:
-    if not vectors or not texts:
+    if not len(vectors) or not texts:
         return {"added": 0}
     if len(vectors) != len(texts):
         raise ValueError("docs_add: vectors/texts length mismatch")
 
-    X = _norm(np.array(vectors, dtype="float32"))
+    X = _norm(vectors)
     d = X.shape[1]
-    idx, meta = _load("docs")
-    idx = _ensure_dim(idx, meta, d)
-
-    start = int(meta["next_id"])
-    ids = np.arange(start, start + X.shape[0], dtype="int64")
-    idx.add_with_ids(X, ids)
+    shard = docs_shard(_norm_id(user_id))
+    space = get_store().ns(shard)
+    space.ensure_dim(d)
 
-    for i, t in enumerate(texts):
-        rowid = int(ids[i])
-        md = {
-            "ns": "docs",
-            "user_id": _norm_id(user_id),
-            "doc_id": _norm_id(doc_id),
-            "filename": filename,
-            "text": t,
-            "deleted": False,
-        }
-        if len(meta["items"]) <= rowid:
-            meta["items"].extend([None] * (rowid - len(meta["items"]) + 1))
-        meta["items"][rowid] = md
-
-    meta["next_id"] = int(start + X.shape[0])
-    _save("docs", idx, meta)
+    start = space.append(X, texts, user_id=_norm_id(user_id), doc_id=_norm_id(doc_id), filename=filename)
+    get_cache().bump(_norm_id(user_id))
+    get_store().mark_dirty(shard)
+    get_store().maybe_upgrade(shard)
 
     # 🔎 Debug print
     print("\n--- FAISS ADD DEBUG ---")
@@ -139,88 +96,154 @@ def docs_add(
     print("user_id saved :", _norm_id(user_id))
     print("doc_id saved  :", _norm_id(doc_id))
     print("filename      :", filename)
-    print("ntotal vectors:", idx.ntotal)
     print("--- END ADD DEBUG ---\n")
+    logger.debug("docs_add shard=%s ntotal=%d", shard, space.ntotal)
 
     return {"added": len(texts), "first_id": start}
 
+# dedup-aware add used at ingest: chunks this user already stored are linked to doc_id (no embedding,
+# no new row); only unseen text is passed to `embed` (texts -> vectors) and added --#
+def docs_add_chunks(
+    *,
+    user_id: str,
+    doc_id: str,
+    texts: List[str],
+    embed: Callable[[List[str]], np.ndarray],
+    filename: Optional[str] = None,
+) -> Dict[str, Any]:
+    uid, did = _norm_id(user_id), _norm_id(doc_id)
+    texts = unique_chunks(texts) if CHUNK_DEDUP else list(texts)   # repeats inside this upload
+    if not texts:
+        return {"added": 0, "linked": 0, "copied": 0, "chunks": 0}
+    shard = docs_shard(uid)
+    space = get_store().ns(shard)
+    fields = {"user_id": uid, "doc_id": did, "filename": filename}
+    for _ in range(3):
+        epoch, found = space.dedup_plan(texts, uid) if CHUNK_DEDUP else (space.meta.epoch, [None] * len(texts))
+        new = [t for t, r in zip(texts, found) if r is None]
+        reuse = [(t, r) for t, r in zip(texts, found) if r is not None]
+        X = _norm(embed(new)) if new else None
+        res = space.add_chunks(X, new, fields, reuse, epoch)
+        if res is not None:
+            break
+    else:
+        raise RuntimeError(f"docs_add_chunks: {shard} kept compacting during ingest, retry later")
+    get_cache().bump(uid)
+    get_store().mark_dirty(shard)
+    get_store().maybe_upgrade(shard)
+    logger.debug(
+        "docs_add_chunks doc_id=%s shard=%s chunks=%d embedded=%d linked=%d copied=%d",
+        did, shard, len(texts), len(new), res["linked"], res["copied"],
+    )
+    return {**res, "chunks": len(texts)}
+
 # return similar chunk when we ask questions-----#
 def docs_search(
     *, 
     user_id: str, 
-    query_vector: List[float], 
+    query_vector: Union[np.ndarray, List[float]], 
     top_k: int = 5, 
     filename: Optional[str] = None, 
     doc_id: Optional[str] = None, 
-    oversample: int = 50
+    oversample: int = 50,
+    query_text: Optional[str] = None,
+    mode: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
-    idx, meta = _load("docs")
-    if getattr(idx, "ntotal", 0) == 0 or not meta["items"]:
-        return []
-
-    q = _norm(np.array(query_vector, dtype="float32"))
-    K = min(oversample, idx.ntotal)  # always oversample more than needed
-    D, I = idx.search(q, K)
-
-    candidates: List[Dict[str, Any]] = []
-    for score, rowid in zip(D[0].tolist(), I[0].tolist()):
-        if rowid < 0:
-            continue
-        info = meta["items"][rowid] if rowid < len(meta["items"]) else None
-        if not info:
-            continue
-        # ✅ only skip if explicitly True
-        if info.get("deleted") is True:
-            continue
-
-        # ✅ normalize IDs before compare
-        if _norm_id(info.get("user_id")) != _norm_id(user_id):
-            continue
-        if filename and str(info.get("filename")) != str(filename):
-            continue
-        if doc_id:
-            # normalize both sides before comparing (handles ObjectId and str)
-            if _norm_id(info.get("doc_id")) != _norm_id(doc_id):
-                continue
-        candidates.append({
-            "score": float(score),
-            "id": int(rowid),
-            "text": info.get("text", ""),
-            "metadata": info,
-        })
-
-    # sort by score and keep top_k
-    candidates.sort(key=lambda x: x["score"], reverse=True)
-    return candidates[:top_k]
+    # `oversample` is kept for API compatibility; filtering now happens inside faiss
+    return docs_search_batch(
+        user_id=user_id, query_vectors=_norm(query_vector), top_k=top_k,
+        filters=[{"doc_id": doc_id, "filename": filename}],
+        query_texts=[query_text] if query_text else None, mode=mode,
+    )[0]
+
+# many queries of one user in ONE faiss call; filters[i] = {"doc_id": .., "filename": ..} for query i --#
+# mode: "dense" (faiss), "bm25" (lexical) or "hybrid" (both, RRF-fused); lexical modes need query_texts
+def docs_search_batch(
+    *,
+    user_id: str,
+    query_vectors,
+    top_k: int = 5,
+    filters: Optional[List[Dict[str, Optional[str]]]] = None,
+    query_texts: Optional[List[str]] = None,
+    mode: Optional[str] = None,
+) -> List[List[Dict[str, Any]]]:
+    Q = _norm(query_vectors)
+    if filters is not None and len(filters) != Q.shape[0]:
+        raise ValueError("docs_search_batch: filters/query_vectors length mismatch")
+    if query_texts is not None and len(query_texts) != Q.shape[0]:
+        raise ValueError("docs_search_batch: query_texts/query_vectors length mismatch")
+    mode = resolve_mode(mode) if query_texts else "dense"
+    store, shard = get_store(), docs_shard(_norm_id(user_id))
+    if not store.exists(shard):
+        return [[] for _ in range(Q.shape[0])]
+    space = store.ns(shard)
+    if space.ntotal == 0 or not len(space.meta):
+        return [[] for _ in range(Q.shape[0])]
+
+    per_query = [
+        {
+            "user_id": _norm_id(user_id),
+            "doc_id": _norm_id(f.get("doc_id")) if f.get("doc_id") else None,
+            "filename": str(f["filename"]) if f.get("filename") else None,
+        }
+        for f in (filters or [{}] * Q.shape[0])
+    ]
+    cache = get_cache()
+    with space.reading():
+        # cached results are only reused while the user's generation (uploads/deletes) is unchanged
+        gen = (cache.generation(_norm_id(user_id)), space.version)
+        keys = [
+            (_norm_id(user_id), f["doc_id"], f["filename"], mode, int(top_k), text_key(query_texts[i]) if query_texts else vector_key(Q[i]))
+            for i, f in enumerate(per_query)
+        ]
+        out = [cache.get(key, gen) if cache.enabled else None for key in keys]
+        todo = [i for i, hits in enumerate(out) if hits is None]
+        if todo:
+            D, I = _docs_search_rows(
+                space, Q[todo], top_k, [per_query[i] for i in todo],
+                [query_texts[i] for i in todo] if query_texts else None, mode,
+            )
+            # lazy hits keep this MetaStore: compaction swaps in a new one, so their row ids stay valid
+            for i, hits in zip(todo, space.meta.hits(D, I, [per_query[i] for i in todo])):
+                out[i] = hits
+                cache.put(keys[i], gen, hits)
+        # callers get their own Hit objects: editing a result must not change the cached entry
+        return [[hit.copy() for hit in hits] for hits in out]
+
+def _docs_search_rows(space, Q: np.ndarray, top_k: int, per_query: List[Dict[str, Optional[str]]], query_texts: Optional[List[str]], mode: str):
+    if mode == "dense":
+        return space.search_batch(Q, top_k, per_query)
+    depth = top_k * max(HYBRID_DEPTH, 1)
+    dense_I = space.search_batch(Q, depth, per_query)[1] if mode == "hybrid" else None
+    D = np.full((Q.shape[0], top_k), -np.inf, dtype="float32")
+    I = np.full((Q.shape[0], top_k), -1, dtype="int64")
+    for i, (text, f) in enumerate(zip(query_texts, per_query)):
+        lex_D, lex_I = space.lexical_search(text, depth if dense_I is not None else top_k, **f)
+        d, ix = rrf([dense_I[i], lex_I[0]], top_k) if dense_I is not None else (lex_D[0], lex_I[0])
+        D[i, : ix.size], I[i, : ix.size] = d, ix
+    return D, I
 
 # delet all chunks of one document --#
 def docs_remove_by_doc_id(*, user_id: str, doc_id: str) -> Dict[str, Any]:
-    idx, meta = _load("docs")
-    if not meta["items"]:
+    store, shard = get_store(), docs_shard(_norm_id(user_id))
+    if not store.exists(shard):
         return {"deleted": 0}
-    count = 0
-    # collect rowids to remove from FAISS index
-    #rowids_to_remove: List[int] = []
-
-    for i, info in enumerate(meta["items"]):
-        if not info:
-            continue
-        if (
-            _norm_id(info.get("user_id")) == _norm_id(user_id)
-            and _norm_id(info.get("doc_id")) == _norm_id(doc_id)
-            and not info.get("deleted")
-        ):
-            # mark deleted in metadata and schedule removal
-            info["deleted"] = True
-            count += 1
+    space = store.ns(shard)
+    if not len(space.meta):
+        return {"deleted": 0}
+    # tombstone in metadata + remove the vectors from faiss (rows other docs still link survive)
+    count = space.delete_doc(_norm_id(doc_id), user_id=_norm_id(user_id))
+    get_cache().bump(_norm_id(user_id))
 
-    _save("docs", idx, meta)
+    if count:
+        store.mark_dirty(shard)
+        store.maybe_compact(shard)
 # debug
     print(f"--- FAISS REMOVE DEBUG ---\nRequested doc_id: {_norm_id(doc_id)}\nRemoved vectors: {count}\n--- END REMOVE DEBUG ---")
     return {"deleted": count}
 # CONVERSATION namespace---- it add every meesage of chat in to faiss after making chunks -----#
-def conv_save_vectors(*, user_id: str, conversation_id: str, texts: List[str], vectors: List[List[float]], roles: Optional[List[Optional[str]]] = None, message_ids: Optional[List[Optional[str]]] = None) -> Dict[str, Any]:
-    if not vectors or not texts:
+def conv_save_vectors(*, user_id: str, conversation_id: str, texts: List[str], vectors: Union[np.ndarray, List[List[float]]], roles: Optional[List[Optional[str]]] = None, message_ids: Optional[List[Optional[str]]] = None) -> Dict[str, Any]:
+    if not len(vectors) or not texts:
         return {"added": 0}
     if len(vectors) != len(texts):
         raise ValueError("conv_save_vectors: vectors/texts length mismatch")
@@ -229,69 +252,61 @@ def conv_save_vectors(*, user_id: str, conversation_id: str, texts: List[str], v
     if message_ids and len(message_ids) != len(texts):
         raise ValueError("conv_save_vectors: message_ids length mismatch")
 
-    X = _norm(np.array(vectors, dtype="float32"))
-    d = X.shape[1]
-    idx, meta = _load("conv")
-    idx = _ensure_dim(idx, meta, d)
-
-    start = int(meta["next_id"])
-    ids = np.arange(start, start + X.shape[0], dtype="int64")
-    idx.add_with_ids(X, ids)
-
-    for i, t in enumerate(texts):
-        rowid = int(ids[i])
-        md = {
-            "ns": "conv",
-            "user_id": _norm_id(user_id),
-            "conversation_id": _norm_id(conversation_id),
-            "role": roles[i] if roles else None,
-            "message_id": message_ids[i] if message_ids else None,
-            "text": t,
-            "deleted": False,
-        }
-        if len(meta["items"]) <= rowid:
-            meta["items"].extend([None] * (rowid - len(meta["items"]) + 1))
-        meta["items"][rowid] = md
-
-    meta["next_id"] = int(start + X.shape[0])
-    _save("conv", idx, meta)
-    return {"added": len(texts)}
-# it search in conversation memory and return similar message--------#
-def conv_search(*, user_id: str, conversation_id: str, query_vector: List[float], top_k: int = 5, oversample: int = 50) -> List[Dict[str, Any]]:
-    idx, meta = _load("conv")
-    if getattr(idx, "ntotal", 0) == 0 or not meta["items"]:
-        return []
-
-    q = _norm(np.array(query_vector, dtype="float32"))
-    K = min(oversample, idx.ntotal)
-    D, I = idx.search(q, K)
-
-    candidates: List[Dict[str, Any]] = []
-    for score, rowid in zip(D[0].tolist(), I[0].tolist()):
-        if rowid < 0:
-            continue
-        info = meta["items"][rowid] if rowid < len(meta["items"]) else None
-        if not info or info.get("deleted"):
-            continue
-        if _norm_id(info.get("user_id")) != _norm_id(user_id):
-            continue
-        if _norm_id(info.get("conversation_id")) != _norm_id(conversation_id):
-            continue
-        candidates.append({
-            "score": float(score),
-            "id": int(rowid),
-            "text": info.get("text", ""),
-            "metadata": info,
-        })
-
-    candidates.sort(key=lambda x: x["score"], reverse=True)
-    return candidates[:top_k]
+    X = _norm(vectors)
+    added = get_memory().add(
+        user_id=_norm_id(user_id),
+        conversation_id=_norm_id(conversation_id),
+        X=X, texts=list(texts),
+        roles=list(roles) if roles else None,
+        message_ids=list(message_ids) if message_ids else None,
+    )
+    return {"added": added}
+# it search in conversation memory and return similar message (only this conversation's turns are scored) --------#
+def conv_search(*, user_id: str, conversation_id: str, query_vector: Union[np.ndarray, List[float]], top_k: int = 5, oversample: int = 50) -> List[Dict[str, Any]]:
+    return conv_search_batch(user_id=user_id, conversation_id=conversation_id, query_vectors=_norm(query_vector), top_k=top_k)[0]
+
+def conv_search_batch(*, user_id: str, conversation_id: str, query_vectors, top_k: int = 5) -> List[List[Dict[str, Any]]]:
+    Q = _norm(query_vectors)
+    return get_memory().search_batch(user_id=_norm_id(user_id), conversation_id=_norm_id(conversation_id), Q=Q, top_k=top_k)
+
+# RAG context for one question: document chunks + conversation memory, query normalized once --#
+def rag_search(
+    *,
+    user_id: str,
+    conversation_id: Optional[str],
+    query_vector: Union[np.ndarray, List[float]],
+    doc_top_k: int = 8,
+    conv_top_k: int = 5,
+    doc_id: Optional[str] = None,
+    query_text: Optional[str] = None,
+    mode: Optional[str] = None,
+):
+    Q = _norm(query_vector)
+    doc_hits = docs_search_batch(
+        user_id=user_id, query_vectors=Q, top_k=doc_top_k, filters=[{"doc_id": doc_id}],
+        query_texts=[query_text] if query_text else None, mode=mode,
+    )[0]
+    conv_hits = conv_search_batch(user_id=user_id, conversation_id=conversation_id, query_vectors=Q, top_k=conv_top_k)[0] if conversation_id else []
+    return doc_hits, conv_hits
+
+# drop conversation memory vectors (whole conversation, or selected messages) --#
+def conv_remove(*, user_id: str, conversation_id: Optional[str] = None, message_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    if not conversation_id:
+        # memory is stored per conversation; without its id there is nothing to look in
+        logger.warning("conv_remove called without conversation_id; nothing removed")
+        return {"deleted": 0}
+    memory = get_memory()
+    if message_ids:
+        count = memory.remove_messages(user_id=_norm_id(user_id), conversation_id=_norm_id(conversation_id), message_ids=[_norm_id(m) for m in message_ids])
+    else:
+        count = memory.drop(user_id=_norm_id(user_id), conversation_id=_norm_id(conversation_id))
+    return {"deleted": count}
 
 # --------------------------------------------------------------------------
 # Backward-compat wrappers
 # --------------------------------------------------------------------------
-def save_to_faiss(vectors: List[List[float]], metadata_list: List[Dict[str, Any]]):
-    if not vectors or not metadata_list:
+def save_to_faiss(vectors: Union[np.ndarray, List[List[float]]], metadata_list: List[Dict[str, Any]]):
+    if not len(vectors) or not metadata_list:
         return {"added": 0}
     texts = [(md.get("chunk") or md.get("text") or "") for md in metadata_list]
     user_id = _norm_id(metadata_list[0].get("user_id"))
@@ -300,24 +315,29 @@ def save_to_faiss(vectors: List[List[float]], metadata_list: List[Dict[str, Any]
     return docs_add(user_id=user_id, doc_id=doc_id, texts=texts, vectors=vectors, filename=filename)
 
 def search_in_faiss_for_user(
-    query_vector: List[float], 
+    query_vector: Union[np.ndarray, List[float]], 
     user_id: str, 
     doc_id: Optional[str] = None, 
     filename: Optional[str] = None, 
-    top_k: int = 5
+    top_k: int = 5,
+    query_text: Optional[str] = None,
+    mode: Optional[str] = None,
 ):
     # Debug start
     print("\n--- FAISS SEARCH DEBUG ---")
     print("Input user_id:", user_id)
     print("Input doc_id :", doc_id)
     print("Input filename:", filename)
+    logger.debug("search_in_faiss_for_user mode=%s", mode)
 
     results = docs_search(
         user_id=_norm_id(user_id), 
         query_vector=query_vector, 
         top_k=top_k, 
         filename=filename, 
-        doc_id=_norm_id(doc_id) if doc_id else None
+        doc_id=_norm_id(doc_id) if doc_id else None,
+        query_text=query_text,
+        mode=mode,
     )
 
     # Debug output
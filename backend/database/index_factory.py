@@ -0,0 +1,173 @@
+# backend/database/index_factory.py
+# Pluggable FAISS index types per namespace.
+# - FAISS_INDEX_DOCS / FAISS_INDEX_CONV: "flat" (exact, default), "hnsw", "ivfflat", "ivfpq", "sq8", "fp16"
+# - Every index is wrapped in IndexIDMap so row ids stay stable across types
+# - ANN types are only used once a namespace has FAISS_ANN_MIN_ROWS live rows;
+#   below that an exact flat scan is both faster and exact. The switch (and any
+#   IVF training) is a rebuild from the raw vector sidecar (raw_vectors.py)
+# - Compressed storage: "sq8" (1 byte/dim), "fp16" (2 bytes/dim) and "ivfpq"
+#   (FAISS_PQ_M bytes/vector, default dim/4) keep only quantized codes in the searchable
+#   index. Lossy kinds fetch FAISS_RERANK x top_k candidates (FAISS_PQ_RERANK x for ivfpq,
+#   whose codes are much coarser) and re-rank them with exact inner products read from
+#   the float32 sidecar (rerank()). ivfpq recall depends on both knobs: on 384-d data
+#   m=dim/8 gave recall@10 ~0.25 (0.6 re-ranked 4x); the defaults (m=dim/4, 10x) reach
+#   ~0.99. Measure with bench_ann before lowering them. Plain IndexPQ is not
+#   offered: it rejects SearchParameters, so it cannot take an IDSelector
+# - Deletes: flat / sq8 / fp16 remove vectors from the index; hnsw and ivf keep them,
+#   filtered out by the IDSelector, until compaction rebuilds the namespace
+
+from __future__ import annotations
+import math
+import os
+from typing import Optional, Tuple
+import faiss
+import numpy as np
+
+INDEX_KINDS = ("flat", "hnsw", "ivfflat", "ivfpq", "sq8", "fp16")
+LOSSY_KINDS = ("ivfpq", "sq8", "fp16")
+
+FAISS_ANN_MIN_ROWS = int(os.getenv("FAISS_ANN_MIN_ROWS", "5000"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_CONSTRUCTION = int(os.getenv("FAISS_HNSW_EF_CONSTRUCTION", "80"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "0"))      # 0 = auto (~4*sqrt(n))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "0"))                # 0 = auto (dim/4 sub-quantizers)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_RERANK = int(os.getenv("FAISS_RERANK", "4"))            # candidates per result re-scored exactly (0 = off)
+FAISS_PQ_RERANK = int(os.getenv("FAISS_PQ_RERANK", "10"))     # same, for ivfpq
+
+
+#--- configured kind for a namespace ("docs:<shard>" uses the docs setting) ---#
+def configured_kind(ns: str) -> str:
+    base = ns.split(":", 1)[0]
+    kind = os.getenv(f"FAISS_INDEX_{base.upper()}", "flat").strip().lower()
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown FAISS index kind '{kind}' for {base} (use one of {INDEX_KINDS})")
+    return kind
+
+
+#--- kind that should be live for a namespace with `rows` live vectors ---#
+def target_kind(ns: str, rows: int) -> str:
+    kind = configured_kind(ns)
+    return kind if kind == "flat" or rows >= FAISS_ANN_MIN_ROWS else "flat"
+
+
+def needs_training(kind: str) -> bool:
+    return kind in ("ivfflat", "ivfpq", "sq8")
+
+
+def is_lossy(kind: str) -> bool:
+    return kind in LOSSY_KINDS
+
+
+#--- hard deletes: IndexIDMap.remove_ids over an IVF aborts the process (faiss asserts
+# j == ntotal once lists were filled by batched adds), hnsw cannot remove at all; those
+# kinds keep tombstoned rows filtered out by the IDSelector until compaction ---#
+def supports_remove_ids(kind: str) -> bool:
+    return kind in ("flat", "sq8", "fp16")
+
+
+def _nlist(n: int) -> int:
+    if FAISS_IVF_NLIST:
+        return FAISS_IVF_NLIST
+    return max(1, min(int(4 * math.sqrt(max(n, 1))), n // 39 or 1))
+
+
+def _pq_m(d: int) -> int:
+    m = FAISS_PQ_M or max(1, d // 4)
+    while d % m:
+        m -= 1
+    return m
+
+
+#--- build an (empty, trained if needed) IDMap index of `kind` ---#
+def build_index(kind: str, d: int, train_X: Optional[np.ndarray] = None) -> faiss.IndexIDMap:
+    if kind == "flat":
+        base = faiss.IndexFlatIP(d)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(d, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        base.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    elif kind in ("sq8", "fp16"):
+        qtype = faiss.ScalarQuantizer.QT_8bit if kind == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        base = faiss.IndexScalarQuantizer(d, qtype, faiss.METRIC_INNER_PRODUCT)
+        if kind == "sq8":
+            if train_X is None or len(train_X) == 0:
+                raise ValueError(f"{kind} needs training vectors")
+            base.train(np.ascontiguousarray(train_X, dtype="float32"))
+    elif kind in ("ivfflat", "ivfpq"):
+        if train_X is None or len(train_X) == 0:
+            raise ValueError(f"{kind} needs training vectors")
+        nlist = _nlist(len(train_X))
+        quantizer = faiss.IndexFlatIP(d)
+        if kind == "ivfflat":
+            base = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            # 2**nbits centroids per sub-quantizer need ~39 training points each
+            nbits = max(4, min(FAISS_PQ_NBITS, int(math.log2(max(len(train_X) // 39, 16)))))
+            base = faiss.IndexIVFPQ(quantizer, d, nlist, _pq_m(d), nbits, faiss.METRIC_INNER_PRODUCT)
+        base.train(np.ascontiguousarray(train_X, dtype="float32"))
+        base.nprobe = FAISS_IVF_NPROBE
+        base.own_fields = True
+        quantizer.this.disown()
+    else:
+        raise ValueError(f"Unknown FAISS index kind: {kind}")
+    return faiss.IndexIDMap(base)
+
+
+#--- empty index with the same kind / training as `idx` (no training vectors needed) ---#
+def empty_like(idx: faiss.IndexIDMap) -> faiss.IndexIDMap:
+    inner = faiss.clone_index(faiss.downcast_index(idx.index))
+    inner.reset()
+    out = faiss.IndexIDMap(inner)
+    out.own_fields = True
+    inner.this.disown()
+    return out
+
+
+#--- what kind is this (loaded) index? ---#
+def kind_of(idx: faiss.Index) -> str:
+    inner = faiss.downcast_index(idx.index) if hasattr(idx, "id_map") else faiss.downcast_index(idx)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivfflat"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "fp16" if inner.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+#--- search parameters carrying the IDSelector + per-kind knobs ---#
+def search_params(kind: str, sel: Optional[faiss.IDSelector] = None) -> faiss.SearchParameters:
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(sel=sel, efSearch=FAISS_HNSW_EF_SEARCH)
+    if kind in ("ivfflat", "ivfpq"):
+        return faiss.SearchParametersIVF(sel=sel, nprobe=FAISS_IVF_NPROBE)
+    return faiss.SearchParameters(sel=sel)
+
+
+#--- how many candidates to fetch so re-ranking can recover the exact top_k ---#
+def candidates(kind: str, k: int) -> int:
+    factor = FAISS_PQ_RERANK if kind == "ivfpq" else FAISS_RERANK
+    return k * factor if is_lossy(kind) and FAISS_RERANK > 0 and factor > 1 else k
+
+
+#--- exact re-rank of quantized candidates against the float32 vectors ---#
+def rerank(q: np.ndarray, I: np.ndarray, vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    q: (nq, d) queries, I: (nq, m) candidate row ids (-1 = none), vectors: row-id
+    addressable float32 matrix (e.g. the vectors.f32 memmap). Returns exact (D, I) top-k.
+    """
+    valid = I >= 0
+    rows = np.where(valid, I, 0)
+    uniq, inv = np.unique(rows, return_inverse=True)
+    X = np.asarray(vectors[uniq], dtype="float32")
+    D = np.einsum("qmd,qd->qm", X[inv.reshape(rows.shape)], q)
+    D[~valid] = -np.inf
+    order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+    D, I = np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+    I[~np.isfinite(D)] = -1
+    return D.astype("float32"), I
@@ -0,0 +1,161 @@
+# backend/database/lexical_index.py
+# BM25 inverted index for a docs namespace + reciprocal-rank fusion with the dense results.
+# - Row ids are the namespace's meta row ids (row id == position), so the same
+#   numpy masks (user / doc / filename / tombstones) filter lexical hits too
+# - Built incrementally: every add appends its rows' postings (vector_store keeps it in
+#   step with meta, including rows replayed from other workers' WAL records)
+# - Persisted beside the snapshot as <gen dir>/bm25.npz (CSR postings); a generation
+#   without one (or after compaction renumbered rows) is rebuilt from meta texts
+# - Tokens: lowercased \w+ runs; identifiers joined by - . / : _ (ISO-9001, v2.3.1,
+#   AB/1234) are indexed whole AND as their parts, so exact codes match
+# Retrieval modes (per request, default RETRIEVAL_MODE):
+#   dense  -> faiss only (previous behaviour)
+#   bm25   -> lexical only
+#   hybrid -> dense + bm25 top (top_k * HYBRID_DEPTH) each, fused by RRF
+
+from __future__ import annotations
+from array import array
+from collections import Counter
+from pathlib import Path
+import io
+import math
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+from backend.database.meta_store import _write_atomic
+
+RETRIEVAL_MODES = ("dense", "bm25", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense").strip().lower()
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+HYBRID_DEPTH = int(os.getenv("HYBRID_DEPTH", "4"))   # candidates per list = top_k * depth
+
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    out: List[str] = []
+    for tok in _TOKEN.findall((text or "").lower()):
+        out.append(tok)
+        parts = _PART.findall(tok)
+        if len(parts) > 1:
+            out.extend(parts)
+    return out
+
+
+def resolve_mode(mode: Optional[str]) -> str:
+    mode = (mode or RETRIEVAL_MODE).strip().lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}' (expected one of {', '.join(RETRIEVAL_MODES)})")
+    return mode
+
+
+# ---------------- BM25 ----------------
+class BM25Index:
+    """Append-only postings (term -> row ids, term freqs) + per-row lengths."""
+
+    def __init__(self):
+        self.terms: List[str] = []
+        self._tid = {}
+        self._rows: List[array] = []     # per term, int32 row ids (ascending)
+        self._tfs: List[array] = []      # per term, int32 term frequencies
+        self._len = array("i")           # tokens per row
+        self.total = 0                   # sum of _len
+
+    @property
+    def rows(self) -> int:
+        return len(self._len)
+
+    def add(self, texts: Sequence[str]) -> None:
+        for text in texts:
+            row = len(self._len)
+            counts = Counter(tokenize(text))
+            for term, tf in counts.items():
+                tid = self._tid.get(term)
+                if tid is None:
+                    tid = self._tid[term] = len(self.terms)
+                    self.terms.append(term)
+                    self._rows.append(array("i"))
+                    self._tfs.append(array("i"))
+                self._rows[tid].append(row)
+                self._tfs[tid].append(tf)
+            n = sum(counts.values())
+            self._len.append(n)
+            self.total += n
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, row ids) by BM25 among rows where mask is True."""
+        tids = [self._tid[t] for t in set(tokenize(query)) if t in self._tid]
+        if not tids or not self.rows or k <= 0:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        N, avgdl = self.rows, max(self.total / self.rows, 1e-9)
+        dl = np.frombuffer(self._len, dtype=np.int32)
+        rows_parts, score_parts = [], []
+        for tid in tids:
+            r = np.frombuffer(self._rows[tid], dtype=np.int32)
+            tf = np.frombuffer(self._tfs[tid], dtype=np.int32).astype("float32")
+            idf = math.log(1.0 + (N - r.size + 0.5) / (r.size + 0.5))
+            if mask is not None:
+                keep = mask[r]
+                r, tf = r[keep], tf[keep]
+            rows_parts.append(r)
+            score_parts.append(idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl[r] / avgdl)))
+        rows = np.concatenate(rows_parts)
+        if not rows.size:
+            return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+        uniq, inv = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(score_parts)).astype("float32")
+        k = min(k, uniq.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top], uniq[top].astype("int64")
+
+    #--- persistence (CSR: indptr over concatenated postings) ---#
+    def save(self, path: Path) -> None:
+        lens = np.fromiter((len(a) for a in self._rows), dtype="int64", count=len(self._rows))
+        indptr = np.concatenate([[0], np.cumsum(lens)]).astype("int64")
+        rows = np.concatenate([np.frombuffer(a, dtype=np.int32) for a in self._rows]) if self._rows else np.empty(0, np.int32)
+        tfs = np.concatenate([np.frombuffer(a, dtype=np.int32) for a in self._tfs]) if self._tfs else np.empty(0, np.int32)
+        buf = io.BytesIO()
+        np.savez(
+            buf, terms=np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype="uint8"),
+            indptr=indptr, rows=rows, tfs=tfs, doclen=np.frombuffer(self._len, dtype=np.int32),
+        )
+        _write_atomic(path, buf.getvalue())
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as z:
+            raw = z["terms"].tobytes().decode("utf-8")
+            indptr, rows, tfs, doclen = z["indptr"], z["rows"].astype(np.int32), z["tfs"].astype(np.int32), z["doclen"]
+        ix = cls()
+        ix.terms = raw.split("\n") if raw else []
+        ix._tid = {t: i for i, t in enumerate(ix.terms)}
+        for a, b in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+            ix._rows.append(array("i", rows[a:b].tobytes()))
+            ix._tfs.append(array("i", tfs[a:b].tobytes()))
+        ix._len = array("i", doclen.astype(np.int32).tobytes())
+        ix.total = int(doclen.sum())
+        return ix
+
+
+# ---------------- fusion ----------------
+def rrf(rankings: Sequence[np.ndarray], k: int, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """Reciprocal-rank fusion of ranked row-id lists (-1 = padding) -> top-k (scores, row ids)."""
+    rows, scores = [], []
+    for ranked in rankings:
+        ranked = np.asarray(ranked, dtype="int64")
+        ranked = ranked[ranked >= 0]
+        rows.append(ranked)
+        scores.append(1.0 / (rrf_k + 1 + np.arange(ranked.size)))
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype="int64")
+    if not rows.size:
+        return np.empty(0, dtype="float32"), np.empty(0, dtype="int64")
+    uniq, inv = np.unique(rows, return_inverse=True)
+    total = np.bincount(inv, weights=np.concatenate(scores))
+    order = np.argsort(-total, kind="stable")[:k]
+    return total[order].astype("float32"), uniq[order]
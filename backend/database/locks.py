@@ -0,0 +1,122 @@
+# backend/database/locks.py
+# Locking for the vector store.
+# - RWLock: many readers OR one writer inside a process. Writers are re-entrant
+#   (rebuild -> snapshot) and may read; readers may nest; waiting writers block
+#   new readers so a stream of searches cannot starve an upload
+# - FileLock: exclusive advisory lock on a file, shared by every worker process
+#   (fcntl.flock on POSIX, msvcrt.locking on Windows). Re-entrant per process.
+
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import os
+import threading
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:          # Windows
+    fcntl = None
+    import msvcrt
+
+
+class RWLock:
+    """Reader/writer lock (writer preference, re-entrant writer)."""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None          # ident of the thread holding the write lock
+        self._depth = 0
+        self._waiting = 0            # writers waiting
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        me = threading.get_ident()
+        held = getattr(self._local, "reads", 0)
+        if self._writer == me or held:
+            # nested read, or a writer reading its own state
+            self._local.reads = held + 1
+            try:
+                yield
+            finally:
+                self._local.reads -= 1
+            return
+        with self._cond:
+            while self._writer is not None or self._waiting:
+                self._cond.wait()
+            self._readers += 1
+        self._local.reads = 1
+        try:
+            yield
+        finally:
+            self._local.reads = 0
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._waiting -= 1
+                self._writer, self._depth = me, 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class FileLock:
+    """Cross-process exclusive lock on `path` (created if missing)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mutex = threading.RLock()   # flock is per process: serialize our own threads first
+        self._fd = None
+        self._depth = 0
+
+    @contextmanager
+    def hold(self) -> Iterator[None]:
+        with self._mutex:
+            if not self._depth:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(fd, fcntl.LOCK_EX)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    fd, self._fd = self._fd, None
+                    try:
+                        if fcntl is not None:
+                            fcntl.flock(fd, fcntl.LOCK_UN)
+                        else:
+                            os.lseek(fd, 0, os.SEEK_SET)
+                            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                    finally:
+                        os.close(fd)
@@ -0,0 +1,516 @@
+# backend/database/meta_store.py
+# Columnar metadata for one FAISS namespace (replaces meta.pkl list-of-dicts).
+# - Row id == position: every vector row has one entry in each column
+# - String fields (user, doc, conversation, filename, role, message id) are
+#   interned per namespace -> int32 code columns (-1 = None)
+# - Tombstones are a numpy bool column, chunk texts live in one utf-8 blob
+#   addressed by an int64 offsets column
+# - Filters are vectorized numpy masks over the code columns
+# - Chunk dedup: a row belongs to the doc in its doc_id column and may also be linked
+#   from other docs of the same user (links / doc_files / gone in meta.json); doc_id and
+#   filename filters include linked rows and skip rows of removed owners, hits report the
+#   doc that matched the filter, and a removed doc only tombstones rows nobody else uses
+# - Search results are lazy Hit objects: text / metadata are decoded only for the
+#   rows a caller actually reads
+# On disk (one directory per namespace):
+#   meta/meta.json            dim, ns, rows, epoch, vocabularies (written last = commit point)
+#   meta/<field>.npy          int32 code columns
+#   meta/deleted.npy          bool tombstones
+#   meta/text_off.npy         int64 offsets (len = rows + 1)
+#   meta/text.bin             utf-8 text blob
+# MetaStore.load(meta_dir, mmap=True) maps the code columns, offsets and text blob
+# read-only (np.load(mmap_mode="r") / np.memmap) instead of copying them into RAM:
+# workers share the page cache and only rows appended since the snapshot live in
+# process memory. Tombstones are always copied (they are mutated in place, 1 byte/row).
+
+from __future__ import annotations
+from collections.abc import Mapping
+from pathlib import Path
+import json
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Union
+import numpy as np
+
+CODE_FIELDS = ("user_id", "doc_id", "conversation_id", "filename", "role", "message_id")
+
+
+#--- write-then-rename so a crash never leaves a half-written file ---#
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _save_npy(path: Path, arr: np.ndarray) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+
+# ---------------- growable numpy column ----------------
+class _Column:
+    """Append-only numpy array with amortized O(1) growth."""
+
+    def __init__(self, dtype, data: Optional[np.ndarray] = None):
+        data = np.asarray(data if data is not None else [], dtype=dtype)
+        self._arr = np.array(data, dtype=dtype, copy=True)
+        self._n = len(data)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._arr[: self._n]
+
+    def extend(self, values: np.ndarray) -> None:
+        values = np.asarray(values, dtype=self._arr.dtype)
+        need = self._n + len(values)
+        if need > len(self._arr):
+            grown = np.empty(max(need, 2 * len(self._arr), 64), dtype=self._arr.dtype)
+            grown[: self._n] = self._arr[: self._n]
+            self._arr = grown
+        self._arr[self._n:need] = values
+        self._n = need
+
+    def eq(self, value) -> np.ndarray:
+        return self.view == value
+
+    def take(self, rowids):
+        return self.view[rowids]
+
+
+class _MappedColumn:
+    """Read-only mapped base (the snapshot) + in-RAM tail for rows appended since."""
+
+    def __init__(self, dtype, base: np.ndarray):
+        self._base = base
+        self._nb = len(base)
+        self._tail = _Column(dtype)
+
+    def __len__(self) -> int:
+        return self._nb + len(self._tail)
+
+    @property
+    def view(self) -> np.ndarray:
+        if not len(self._tail):
+            return self._base
+        return np.concatenate([self._base, self._tail.view])
+
+    def extend(self, values: np.ndarray) -> None:
+        self._tail.extend(values)
+
+    def eq(self, value) -> np.ndarray:
+        if not len(self._tail):
+            return self._base == value
+        return np.concatenate([self._base == value, self._tail.view == value])
+
+    def take(self, rowids):
+        if np.isscalar(rowids) or np.ndim(rowids) == 0:
+            r = int(rowids)
+            return self._base[r] if r < self._nb else self._tail.view[r - self._nb]
+        rowids = np.asarray(rowids, dtype="int64")
+        out = np.empty(len(rowids), dtype=self._base.dtype)
+        lo = rowids < self._nb
+        out[lo] = self._base[rowids[lo]]
+        out[~lo] = self._tail.view[rowids[~lo] - self._nb]
+        return out
+
+
+# ---------------- utf-8 text blob ----------------
+class _Blob:
+    """Chunk texts: an optional mapped base (text.bin) + in-RAM appended bytes."""
+
+    def __init__(self, base: Union[bytes, np.ndarray] = b""):
+        self._base = base
+        self._nb = len(base)
+        self._tail = bytearray()
+
+    def __len__(self) -> int:
+        return self._nb + len(self._tail)
+
+    def append(self, data: bytes) -> None:
+        self._tail += data
+
+    def slice(self, a: int, b: int) -> bytes:
+        if a >= self._nb:
+            return bytes(self._tail[a - self._nb:b - self._nb])
+        if b <= self._nb:
+            return bytes(self._base[a:b])
+        return bytes(self._base[a:]) + bytes(self._tail[: b - self._nb])
+
+    def tobytes(self) -> bytes:
+        return bytes(self._base) + bytes(self._tail)
+
+
+# ---------------- MetaStore ----------------
+class MetaStore:
+    """Integer-coded, columnar metadata aligned with faiss row ids."""
+
+    def __init__(self, ns: str, dim: Optional[int] = None):
+        self.ns = ns
+        self.dim = dim
+        self.epoch = 0      # bumped whenever row ids are renumbered (compaction)
+        self.vocab: Dict[str, List[str]] = {f: [] for f in CODE_FIELDS}
+        self._codes: Dict[str, Dict[str, int]] = {f: {} for f in CODE_FIELDS}
+        self._cols: Dict[str, Union[_Column, _MappedColumn]] = {f: _Column("int32") for f in CODE_FIELDS}
+        self._deleted = _Column("bool")
+        self._text_off: Union[_Column, _MappedColumn] = _Column("int64", [0])
+        self._text = _Blob()
+        # chunk dedup: a row is owned by one doc (doc_id column) but other docs may link it
+        self.links: Dict[int, List[int]] = {}   # doc code -> rows of other docs it also contains
+        self.gone: Set[int] = set()             # removed doc codes whose rows may live on via links
+        self.doc_files: Dict[int, int] = {}     # linking doc code -> its filename code
+
+    def __len__(self) -> int:
+        return len(self._deleted)
+
+    @property
+    def next_id(self) -> int:
+        return len(self)
+
+    @property
+    def deleted(self) -> np.ndarray:
+        return self._deleted.view
+
+    def column(self, field: str) -> np.ndarray:
+        return self._cols[field].view
+
+    #--- interning ---#
+    def intern(self, field: str, value: Any) -> int:
+        if value is None:
+            return -1
+        value = str(value)
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = len(self.vocab[field])
+            codes[value] = code
+            self.vocab[field].append(value)
+        return code
+
+    def code_of(self, field: str, value: Any) -> Optional[int]:
+        """Lookup without inserting; None if the value was never seen."""
+        if value is None:
+            return -1
+        return self._codes[field].get(str(value))
+
+    #--- writes ---#
+    def append(self, texts: List[str], **fields: Union[Any, List[Any]]) -> int:
+        """
+        Append len(texts) rows. Each field is either one value for all rows
+        or a list with one value per row. Returns the first row id.
+        """
+        start, n = len(self), len(texts)
+        for field in CODE_FIELDS:
+            value = fields.get(field)
+            if isinstance(value, (list, tuple)):
+                codes = np.fromiter((self.intern(field, v) for v in value), dtype="int32", count=n)
+            else:
+                codes = np.full(n, self.intern(field, value), dtype="int32")
+            self._cols[field].extend(codes)
+            if field == "doc_id" and self.gone:
+                self.gone.difference_update(np.unique(codes).tolist())   # re-uploaded doc is live again
+        offs = np.empty(n, dtype="int64")
+        for i, t in enumerate(texts):
+            self._text.append((t or "").encode("utf-8"))
+            offs[i] = len(self._text)
+        self._text_off.extend(offs)
+        self._deleted.extend(np.zeros(n, dtype=bool))
+        return start
+
+    def mark_deleted(self, rowids: Iterable[int]) -> int:
+        rowids = np.asarray(list(rowids) if not isinstance(rowids, np.ndarray) else rowids, dtype="int64")
+        if rowids.size == 0:
+            return 0
+        dead = self._deleted.view
+        fresh = rowids[~dead[rowids]]
+        dead[fresh] = True
+        return int(fresh.size)
+
+    #--- doc links (chunk dedup) ---#
+    def link(self, doc_id: str, rowids: Iterable[int], filename: Optional[str] = None) -> int:
+        """Make `doc_id` contain existing rows (owned by other docs); returns rows newly linked."""
+        code = self.intern("doc_id", doc_id)
+        if filename is not None:
+            self.doc_files[code] = self.intern("filename", filename)
+        rows = np.asarray(list(rowids), dtype="int64")
+        have = set(self.links.get(code, []))
+        owners = self._cols["doc_id"].take(rows) if rows.size else rows
+        fresh = [r for r, o in zip(rows.tolist(), np.atleast_1d(owners).tolist()) if o != code and r not in have]
+        if fresh:
+            self.links.setdefault(code, []).extend(fresh)
+        self.gone.discard(code)
+        return len(fresh)
+
+    def doomed_rows(self, doc_id: str, user_id: Optional[str] = None) -> np.ndarray:
+        """Live rows that removing `doc_id` leaves unused (not owned by / linked from another live doc)."""
+        code = self.code_of("doc_id", doc_id)
+        if code is None or code < 0:
+            return np.empty(0, dtype="int64")
+        rows = self.mask(doc_id=doc_id, user_id=user_id)
+        cand = np.flatnonzero(rows)
+        if not cand.size:
+            return cand
+        owner = self._cols["doc_id"].take(cand)
+        dead_docs = np.fromiter(self.gone | {code}, dtype="int32")
+        used = ~np.isin(owner, dead_docs)
+        others = [r for c, r in self.links.items() if c != code and c not in self.gone]
+        if others:
+            used |= np.isin(cand, np.concatenate([np.asarray(r, dtype="int64") for r in others]))
+        return cand[~used]
+
+    def drop_links(self, doc_id: str) -> None:
+        code = self.code_of("doc_id", doc_id)
+        if code is None or code < 0:
+            return
+        self.links.pop(code, None)
+        self.doc_files.pop(code, None)
+        self.gone.add(code)
+
+    def take(self, rowids: np.ndarray) -> "MetaStore":
+        """New store holding only `rowids` (renumbered 0..n-1, unused vocab dropped)."""
+        rowids = np.asarray(rowids, dtype="int64")
+        out = MetaStore(self.ns, self.dim)
+        out.epoch = self.epoch + 1
+        pos = np.full(len(self), -1, dtype="int64")
+        pos[rowids] = np.arange(rowids.size)
+        links = {c: pos[np.asarray(r, dtype="int64")] for c, r in self.links.items()}
+        links = {c: r[r >= 0] for c, r in links.items() if (r >= 0).any()}
+        doc_files = {c: f for c, f in self.doc_files.items() if c in links}
+        remaps: Dict[str, np.ndarray] = {}
+        for field in CODE_FIELDS:
+            codes = self._cols[field].take(rowids)
+            used = codes[codes >= 0]
+            if field == "doc_id" and links:
+                used = np.concatenate([used, np.fromiter(links, dtype="int32")])   # link-only docs keep their code
+            if field == "filename" and doc_files:
+                used = np.concatenate([used, np.fromiter(doc_files.values(), dtype="int32")])
+            used = np.unique(used)
+            remap = np.full(len(self.vocab[field]) + 1, -1, dtype="int32")  # slot 0 keeps -1 (None)
+            remap[used + 1] = np.arange(len(used), dtype="int32")
+            out._cols[field] = _Column("int32", remap[codes + 1])
+            out.vocab[field] = [self.vocab[field][c] for c in used.tolist()]
+            out._codes[field] = {w: i for i, w in enumerate(out.vocab[field])}
+            remaps[field] = remap
+        doc_map, file_map = remaps["doc_id"], remaps["filename"]
+        out.links = {int(doc_map[c + 1]): r.tolist() for c, r in links.items()}
+        out.gone = {int(doc_map[c + 1]) for c in self.gone if doc_map[c + 1] >= 0}
+        out.doc_files = {int(doc_map[c + 1]): int(file_map[f + 1]) for c, f in doc_files.items()}
+        starts, ends = self._text_off.take(rowids), self._text_off.take(rowids + 1)
+        out._text = _Blob(b"".join(self._text.slice(a, b) for a, b in zip(starts.tolist(), ends.tolist())))
+        out._text_off = _Column("int64", np.concatenate([[0], np.cumsum(ends - starts)]))
+        out._deleted = _Column("bool", self._deleted.view[rowids])
+        return out
+
+    #--- vectorized filters ---#
+    def mask(self, **filters: Any) -> np.ndarray:
+        """Live rows (not deleted) matching every non-empty field=value filter."""
+        m = ~self._deleted.view
+        for field, value in filters.items():
+            if not value:
+                continue
+            code = self.code_of(field, value)
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            if field == "doc_id":
+                hit = self._doc_rows(code)
+            elif field == "filename":
+                hit = self._file_rows(code)
+            else:
+                hit = self._cols[field].eq(code)
+            m &= hit
+        return m
+
+    #--- doc / filename filters with dedup links: linked rows count, rows of removed owners do not ---#
+    def _owned(self, hit: np.ndarray) -> np.ndarray:
+        if self.gone:
+            hit &= ~np.isin(self._cols["doc_id"].view, np.fromiter(self.gone, dtype="int32"))
+        return hit
+
+    def _doc_rows(self, code: int) -> np.ndarray:
+        if code in self.gone:
+            return np.zeros(len(self), dtype=bool)   # surviving rows now belong to the docs linking them
+        hit = self._cols["doc_id"].eq(code)
+        if self.links.get(code):
+            hit[self.links[code]] = True              # rows shared with other docs (dedup)
+        return hit
+
+    def _file_rows(self, code: int) -> np.ndarray:
+        hit = self._owned(self._cols["filename"].eq(code))
+        for doc, fcode in self.doc_files.items():
+            if fcode == code and self.links.get(doc):
+                hit[self.links[doc]] = True
+        return hit
+
+    #--- which doc a (possibly shared) row is reported under ---#
+    def holder(self, rowid: int, doc_code: Optional[int] = None, file_code: Optional[int] = None) -> int:
+        """
+        The owner, unless it was removed or does not match the search's doc / filename
+        filter; then the first live doc that links the row and matches (else the owner).
+        """
+        owner = int(self._cols["doc_id"].take(rowid))
+        if (owner not in self.gone and doc_code in (None, owner)
+                and file_code in (None, int(self._cols["filename"].take(rowid)))):
+            return owner
+        for doc, rows in self.links.items():
+            if doc_code not in (None, doc) or file_code not in (None, self.doc_files.get(doc)):
+                continue
+            if rowid in rows:
+                return doc
+        return owner
+
+    #--- row id -> record fast path ---#
+    def value(self, field: str, rowid: int) -> Optional[str]:
+        code = int(self._cols[field].take(rowid))
+        return self.vocab[field][code] if code >= 0 else None
+
+    def text(self, rowid: int) -> str:
+        off = self._text_off
+        return self._text.slice(int(off.take(rowid)), int(off.take(rowid + 1))).decode("utf-8")
+
+    def record(self, rowid: int, doc: Optional[int] = None) -> Dict[str, Any]:
+        """`doc`: report the row under this doc code (see holder()) instead of its owner."""
+        rec: Dict[str, Any] = {"ns": self.ns}
+        for field in CODE_FIELDS:
+            v = self.value(field, rowid)
+            if v is not None:
+                rec[field] = v
+        if doc is not None and doc != int(self._cols["doc_id"].take(rowid)):
+            rec["doc_id"] = self.vocab["doc_id"][doc]
+            fcode = self.doc_files.get(doc, -1)
+            if fcode >= 0:
+                rec["filename"] = self.vocab["filename"][fcode]
+            else:
+                rec.pop("filename", None)
+        rec["text"] = self.text(rowid)
+        rec["deleted"] = bool(self._deleted.view[rowid])
+        return rec
+
+    def hits(self, D: np.ndarray, I: np.ndarray, filters: Optional[List[Dict[str, Any]]] = None) -> List[List["Hit"]]:
+        """
+        faiss (D, I) -> one list of lazy Hits per query. faiss already returns rows in
+        score order with -1 padding at the end, so this is one mask, no re-sort.
+        filters[i]: query i's doc_id / filename filter, so shared rows report the matching doc.
+        """
+        valid = I >= 0
+        counts = valid.sum(axis=1).tolist()
+        scores, rowids = D[valid].tolist(), I[valid].tolist()
+        out, pos = [], 0
+        for q, n in enumerate(counts):
+            f = filters[q] if filters else {}
+            doc = self.code_of("doc_id", f["doc_id"]) if f.get("doc_id") else None
+            fname = self.code_of("filename", f["filename"]) if f.get("filename") else None
+            out.append([Hit(self, r, s, doc, fname) for s, r in zip(scores[pos:pos + n], rowids[pos:pos + n])])
+            pos += n
+        return out
+
+    #--- persistence ---#
+    def save(self, meta_dir: Path) -> None:
+        meta_dir.mkdir(parents=True, exist_ok=True)
+        for field in CODE_FIELDS:
+            _save_npy(meta_dir / f"{field}.npy", self._cols[field].view)
+        _save_npy(meta_dir / "deleted.npy", self._deleted.view)
+        _save_npy(meta_dir / "text_off.npy", self._text_off.view)
+        _write_atomic(meta_dir / "text.bin", self._text.tobytes())
+        header = {
+            "ns": self.ns, "dim": self.dim, "rows": len(self), "epoch": self.epoch, "vocab": self.vocab,
+            "links": {self.vocab["doc_id"][c]: rows for c, rows in self.links.items()},
+            "gone": [self.vocab["doc_id"][c] for c in sorted(self.gone)],
+            "doc_files": {self.vocab["doc_id"][c]: self.vocab["filename"][f] for c, f in self.doc_files.items()},
+        }
+        _write_atomic(meta_dir / "meta.json", json.dumps(header).encode("utf-8"))
+
+    @classmethod
+    def load(cls, meta_dir: Path, mmap: bool = False) -> "MetaStore":
+        header = json.loads((meta_dir / "meta.json").read_text(encoding="utf-8"))
+        rows = int(header["rows"])
+        ms = cls(header["ns"], header.get("dim"))
+        ms.epoch = int(header.get("epoch", 0))
+        mode = "r" if mmap else None
+        col = _MappedColumn if mmap else _Column
+        # columns may be ahead of meta.json if a snapshot was interrupted -> cut to the committed rows
+        for field in CODE_FIELDS:
+            words = header["vocab"].get(field, [])
+            ms.vocab[field] = list(words)
+            ms._codes[field] = {w: i for i, w in enumerate(words)}
+            path = meta_dir / f"{field}.npy"
+            ms._cols[field] = col("int32", np.load(path, mmap_mode=mode)[:rows] if path.exists() else np.full(rows, -1, dtype="int32"))
+        ms._deleted = _Column("bool", np.load(meta_dir / "deleted.npy")[:rows])
+        ms.links = {ms._codes["doc_id"][d]: [r for r in rs if r < rows] for d, rs in header.get("links", {}).items()}
+        ms.gone = {ms._codes["doc_id"][d] for d in header.get("gone", [])}
+        ms.doc_files = {ms._codes["doc_id"][d]: ms._codes["filename"][f] for d, f in header.get("doc_files", {}).items()}
+        ms._text_off = col("int64", np.load(meta_dir / "text_off.npy", mmap_mode=mode)[: rows + 1])
+        end = int(ms._text_off.take(rows))
+        text_path = meta_dir / "text.bin"
+        if mmap and end:
+            ms._text = _Blob(np.memmap(text_path, dtype="uint8", mode="r", shape=(end,)))
+        else:
+            ms._text = _Blob(text_path.read_bytes()[:end])
+        return ms
+
+    @classmethod
+    def from_items(cls, ns: str, dim: Optional[int], items: List[Optional[Dict[str, Any]]], rows: int) -> "MetaStore":
+        """Convert the legacy meta.pkl list-of-dicts (None / padded rows become tombstones)."""
+        ms = cls(ns, dim)
+        items = list(items) + [None] * max(0, rows - len(items))
+        ms.append(
+            [(it or {}).get("text", "") for it in items],
+            **{f: [(it or {}).get(f) for it in items] for f in CODE_FIELDS},
+        )
+        ms.mark_deleted([i for i, it in enumerate(items) if not it or it.get("deleted")])
+        return ms
+
+
+# ---------------- Hit ----------------
+class Hit(Mapping):
+    """
+    One search result, read like the old dict ({"score", "id", "text", "metadata"}).
+    Text and the metadata record are decoded on first access only.
+    """
+
+    __slots__ = ("_meta", "id", "score", "_text", "_record", "_doc", "_file")
+    _KEYS = ("score", "id", "text", "metadata")
+
+    def __init__(self, meta: MetaStore, rowid: int, score: float, doc: Optional[int] = None, file: Optional[int] = None):
+        self._meta, self.id, self.score = meta, rowid, score
+        self._doc, self._file = doc, file              # the query's doc_id / filename filter (codes)
+        self._text: Optional[str] = None
+        self._record: Optional[Dict[str, Any]] = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._meta.text(self.id)
+        return self._text
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._record is None:
+            m = self._meta
+            self._record = m.record(self.id, m.holder(self.id, self._doc, self._file))
+            self._text = self._record["text"]
+        return self._record
+
+    def copy(self) -> "Hit":
+        """Same result with its own metadata dict (cached hits are shared across callers)."""
+        hit = Hit(self._meta, self.id, self.score, self._doc, self._file)
+        hit._text = self._text
+        hit._record = dict(self._record) if self._record is not None else None
+        return hit
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return len(self._KEYS)
+
+    def __repr__(self) -> str:
+        return f"Hit(id={self.id}, score={self.score:.4f})"
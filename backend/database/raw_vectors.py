@@ -0,0 +1,52 @@
+# backend/database/raw_vectors.py
+# Raw float32 vector sidecar for one FAISS namespace (<ns dir>/vectors.f32).
+# - Row-major, row id == position (same numbering as MetaStore)
+# - Appended on every add, so ANN rebuilds / IVF training / compaction never
+#   depend on reconstructing vectors from a (possibly lossy) index
+# - Read through np.memmap: nothing is held in RAM between rebuilds
+
+from __future__ import annotations
+from pathlib import Path
+import os
+import numpy as np
+
+
+class RawVectors:
+    """Append-only float32 matrix on disk."""
+
+    def __init__(self, path: Path, dim: int):
+        self.path = path
+        self.dim = int(dim)
+
+    @property
+    def rows(self) -> int:
+        if not self.path.exists():
+            return 0
+        return self.path.stat().st_size // (4 * self.dim)
+
+    def append(self, X: np.ndarray) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(np.ascontiguousarray(X, dtype="float32").tobytes())
+
+    def matrix(self) -> np.ndarray:
+        """Read-only (rows, dim) view backed by the file."""
+        n = self.rows
+        if n == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.memmap(self.path, dtype="float32", mode="r", shape=(n, self.dim))
+
+    def take(self, rowids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.matrix()[np.asarray(rowids, dtype="int64")])
+
+    def truncate(self, rows: int) -> None:
+        """Drop rows past `rows` (appended after the last meta snapshot)."""
+        if self.rows > rows:
+            with open(self.path, "r+b") as f:
+                f.truncate(rows * 4 * self.dim)
+
+    def rewrite(self, X: np.ndarray) -> None:
+        tmp = self.path.with_suffix(".f32.tmp")
+        with open(tmp, "wb") as f:
+            f.write(np.ascontiguousarray(X, dtype="float32").tobytes())
+        os.replace(tmp, self.path)
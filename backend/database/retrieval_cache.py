@@ -0,0 +1,115 @@
+# backend/database/retrieval_cache.py
+# LRU + TTL cache of document retrieval results (docs_search / docs_search_batch).
+# - Key: (user, doc_id, filename, mode, top_k, query) where query is the normalized
+#   query text when the caller has it, else the query vector quantized to
+#   RETRIEVAL_CACHE_QUANT steps (near-identical embeddings share an entry)
+# - Every entry remembers the user's generation when it was stored; docs_add and
+#   docs_remove_by_doc_id bump the user's counter, and the generation also includes
+#   the shard's on-disk version (snapshot gen / epoch / WAL position), so uploads or
+#   deletes made by ANY worker invalidate the user's cached results
+# - Entries are shared: docs_search_batch hands every caller copies of the cached Hits
+#   (Hit.copy), so a caller editing its results does not change what others get
+# - Hit / miss / stale / eviction counters are exposed via stats() (GET /stats)
+# Env: RETRIEVAL_CACHE_SIZE (entries, 0 = off), RETRIEVAL_CACHE_TTL (seconds),
+#      RETRIEVAL_CACHE_QUANT (vector quantization step)
+
+from __future__ import annotations
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+import numpy as np
+
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "600"))
+RETRIEVAL_CACHE_QUANT = float(os.getenv("RETRIEVAL_CACHE_QUANT", "0.01"))
+
+_SPACES = re.compile(r"\s+")
+
+
+def text_key(text: str) -> str:
+    return "t:" + _SPACES.sub(" ", (text or "").strip().lower())
+
+
+def vector_key(q: np.ndarray) -> str:
+    codes = np.round(np.asarray(q, dtype="float32") / RETRIEVAL_CACHE_QUANT).astype("int32")
+    return "v:" + hashlib.sha1(codes.tobytes()).hexdigest()
+
+
+class RetrievalCache:
+    """Thread-safe LRU with per-entry TTL and per-user generation check."""
+
+    def __init__(self, size: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, Any]]" = OrderedDict()
+        self._gens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def generation(self, user_id: str) -> int:
+        return self._gens.get(user_id, 0)
+
+    def bump(self, user_id: str) -> None:
+        """Invalidate everything cached for this user (their documents changed)."""
+        with self._lock:
+            self._gens[user_id] = self._gens.get(user_id, 0) + 1
+
+    def get(self, key: Hashable, gen: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, entry_gen, value = entry
+            if entry_gen != gen or expires < time.monotonic():
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, gen: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, gen, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "capacity": self.size, "ttl_s": self.ttl,
+                "hits": self.hits, "misses": self.misses, "stale": self.stale, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_CACHE: Optional[RetrievalCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache() -> RetrievalCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = RetrievalCache()
+    return _CACHE
@@ -0,0 +1,947 @@
+# backend/database/vector_store.py
+# Process-wide, in-memory FAISS store used by faiss_handler.
+# - Each namespace ("docs", "conv") is read from disk ONCE and kept resident
+# - Searches are served straight from memory (no pickle/index I/O per call)
+# - Writers append one record to the namespace's write-ahead log (wal.py) and
+#   apply it in memory; a snapshot policy decides when the log is folded into
+#   index.faiss + meta (every N writes, every T seconds, or when the log gets big)
+# - On load the log records newer than the snapshot are replayed
+# - flush() persists everything that is dirty (called on shutdown / atexit)
+# - The "docs" namespace is sharded: one sub-index per user (or per hash bucket)
+#   under vectorstores/docs/shards/<key>/, addressed as "docs:<key>"
+# - Metadata is a columnar MetaStore (meta_store.py, <gen dir>/meta/); legacy
+#   meta.pkl files are converted on first load
+# - Filtered search is done INSIDE faiss: a numpy mask over the coded metadata
+#   columns gives the eligible rows, passed as an IDSelector so only those are scored
+# - Deletes remove vectors from faiss right away (remove_ids); the metadata keeps a
+#   tombstone until a background compaction rebuilds index + meta once the
+#   tombstone ratio passes FAISS_COMPACT_RATIO
+# - Index type is pluggable per namespace (index_factory.py: flat/hnsw/ivfflat/ivfpq);
+#   raw vectors are kept in a sidecar (raw_vectors.py) so any namespace can be
+#   rebuilt / trained / migrated to another type without reconstructing from faiss
+# - docs namespaces also keep a BM25 inverted index over the same rows
+#   (lexical_index.py, <gen dir>/bm25.npz) for lexical / hybrid retrieval. It is built on
+#   the first bm25 / hybrid search (then kept in step and persisted); with a lexical
+#   RETRIEVAL_MODE default the first upload builds it instead
+# - Chunk dedup (chunk_dedup.py): a repeated chunk links its existing row to the new
+#   doc (WAL "link" op) instead of adding a row; removing a doc ("drop") only
+#   tombstones rows no other live doc links
+# - Compressed kinds (sq8 / fp16 / ivfpq) keep only codes in faiss; their
+#   candidates are re-ranked exactly against the sidecar (FAISS_RERANK)
+# - FAISS_MMAP=1: docs shards are opened memory-mapped and read-only (faiss
+#   IO_FLAG_MMAP + mmap'd meta columns / text blob), so startup does no copying and
+#   every worker shares the same page cache. The mapped snapshot is never mutated:
+#   rows added since it live in a small in-RAM flat "delta" index, deletes are
+#   tombstones filtered by the IDSelector, and a snapshot folds delta into a new
+#   file which is then re-mapped
+# Concurrency (threads + worker processes):
+# - Snapshots are immutable generation dirs (gen-NNNNNN/{index.faiss, meta/, vectors.f32});
+#   a snapshot writes the next one and then atomically replaces CURRENT to point at
+#   it, so nobody ever reads a half-written snapshot. The sidecar is hard-linked
+#   into the next generation (rewritten only by compaction)
+# - In a process: RWLock per namespace -> searches run in parallel, writers
+#   (append / delete / snapshot / rebuild) are exclusive
+# - Across processes: every writer holds <ns dir>/.lock (FileLock) and first catches
+#   up with what other workers logged (WAL tail) or snapshotted (CURRENT changed);
+#   readers catch up the same way without the file lock (ns() -> sync())
+# Layout of a namespace dir:
+#   CURRENT  wal.log  .lock  gen-NNNNNN/   (pre-generation files in the dir itself = gen 0)
+
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import atexit
+import hashlib
+import os
+import re
+import pickle
+import shutil
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import faiss
+import numpy as np
+
+from backend.database.meta_store import CODE_FIELDS, MetaStore, _write_atomic
+from backend.database.raw_vectors import RawVectors
+from backend.database.wal import WriteAheadLog
+from backend.database.locks import FileLock, RWLock
+from backend.database import index_factory
+from backend.database.lexical_index import RETRIEVAL_MODE, BM25Index
+from backend.database.chunk_dedup import ChunkIndex
+
+logger = logging.getLogger("vector_store")
+
+# Storage#
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+BASE = ROOT / "vectorstores"
+DOCS_DIR = BASE / "docs"
+SHARDS_DIR = DOCS_DIR / "shards"
+CONV_DIR = BASE / "conversations"
+DOCS_DIR.mkdir(parents=True, exist_ok=True)
+CONV_DIR.mkdir(parents=True, exist_ok=True)
+
+#--- snapshot policy (env configurable) ---#
+# Every write is already durable in the WAL; snapshots only bound replay time.
+# FAISS_SNAPSHOT_EVERY : fold after this many write calls (0 = never by count)
+# FAISS_SNAPSHOT_SECS  : fold dirty namespaces at most this often (0 = never by time)
+# FAISS_WAL_MAX_MB     : fold once a namespace's log grows past this size
+FAISS_SNAPSHOT_EVERY = int(os.getenv("FAISS_SNAPSHOT_EVERY", "1000"))
+FAISS_SNAPSHOT_SECS = float(os.getenv("FAISS_SNAPSHOT_SECS", "300"))
+FAISS_WAL_MAX_BYTES = int(float(os.getenv("FAISS_WAL_MAX_MB", "64")) * 1024 * 1024)
+
+#--- compaction: rebuild a namespace once this share of its meta rows are tombstones ---#
+FAISS_COMPACT_RATIO = float(os.getenv("FAISS_COMPACT_RATIO", "0.2"))
+FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", "100000"))  # max vectors used to train IVF
+
+#--- memory-mapped, read-only snapshots for the docs shards ---#
+FAISS_MMAP = os.getenv("FAISS_MMAP", "0") == "1"
+
+#--- docs sharding ---#
+# FAISS_DOCS_SHARDS="user" -> one sub-index per user (default)
+# FAISS_DOCS_SHARDS=<N>    -> N tenant buckets, user routed by stable hash
+FAISS_DOCS_SHARDS = os.getenv("FAISS_DOCS_SHARDS", "user").strip().lower()
+_SAFE_KEY = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+#--- route a user to its docs shard namespace ---#
+def docs_shard(user_id: str) -> str:
+    uid = str(user_id or "")
+    if FAISS_DOCS_SHARDS.isdigit() and int(FAISS_DOCS_SHARDS) > 0:
+        bucket = int(hashlib.sha1(uid.encode("utf-8")).hexdigest(), 16) % int(FAISS_DOCS_SHARDS)
+        return f"docs:b{bucket:04d}"
+    key = uid if _SAFE_KEY.match(uid) else hashlib.sha1(uid.encode("utf-8")).hexdigest()
+    return f"docs:u_{key}"
+
+
+#creat faiss index and meta path return for  doc and cov #-----
+def _ns_dir(ns: str) -> Path:
+    if ns == "docs":
+        return DOCS_DIR
+    if ns == "conv":
+        return CONV_DIR
+    if ns.startswith("docs:"):
+        return SHARDS_DIR / ns.split(":", 1)[1]
+    raise ValueError(f"Unknown namespace: {ns}")
+
+#--- snapshot generations: CURRENT names the live gen dir (missing = pre-generation layout, gen 0) ---#
+def _current_gen(ns: str) -> int:
+    try:
+        return int((_ns_dir(ns) / "CURRENT").read_text(encoding="utf-8").strip().split("-", 1)[1])
+    except (FileNotFoundError, IndexError, ValueError):
+        return 0
+
+def _gen_stamp(ns: str) -> Optional[Tuple[int, int]]:
+    """Cheap change detector for CURRENT (it is replaced, never rewritten in place)."""
+    try:
+        st = os.stat(_ns_dir(ns) / "CURRENT")
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+def _gen_dir(ns: str, gen: int) -> Path:
+    return _ns_dir(ns) / f"gen-{gen:06d}" if gen else _ns_dir(ns)
+
+def _paths(ns: str, gen: Optional[int] = None) -> Tuple[Path, Path]:
+    """index.faiss + columnar meta dir of a generation (default: the live one)."""
+    d = _gen_dir(ns, _current_gen(ns) if gen is None else gen)
+    return d / "index.faiss", d / "meta"
+
+def _has_snapshot(ns: str) -> bool:
+    d = _ns_dir(ns)
+    return (d / "CURRENT").exists() or (d / "index.faiss").exists()
+
+# it creat new fais index#---
+def _new_idmap(dim: int) -> faiss.IndexIDMap:
+    return faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+#-- verify add with id inside faiss--#
+def _is_idmap(ix: faiss.Index) -> bool:
+    return hasattr(ix, "add_with_ids")
+
+def _use_mmap(ns: str) -> bool:
+    return FAISS_MMAP and ns.startswith("docs:")
+
+def _read_index(path: Path, mmap: bool = False) -> faiss.Index:
+    if mmap:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(str(path))
+#-- load fais and meta index if file is present then load id index map is present and vector are not tjhrough error and if fais is empty it creat new---#
+def _load(ns: str, mmap: bool = False, gen: Optional[int] = None) -> Tuple[faiss.IndexIDMap, MetaStore]:
+    idx_path, meta_dir = _paths(ns, gen)
+    legacy_pkl = _ns_dir(ns) / "meta.pkl"
+    kind = ns.split(":", 1)[0]
+    if idx_path.exists() and ((meta_dir / "meta.json").exists() or legacy_pkl.exists()):
+        idx = _read_index(idx_path, mmap)
+        if not _is_idmap(idx):
+            if getattr(idx, "ntotal", 0) > 0:
+                raise RuntimeError(
+                    f"FAISS: {idx_path.name} is not an IDMap but already has vectors. "
+                    f"Delete these files once so we can rebuild as IDMap:\n  {idx_path}\n  {meta_dir}"
+                )
+            idx = faiss.IndexIDMap(idx)
+
+        nt = int(getattr(idx, "ntotal", 0))
+        if (meta_dir / "meta.json").exists():
+            meta = MetaStore.load(meta_dir, mmap=mmap)
+        else:
+            # legacy list-of-dicts -> columnar (written in the new format on next snapshot)
+            with open(legacy_pkl, "rb") as f:
+                old = pickle.load(f)
+            rows = max(int(old.get("next_id", nt)), nt, len(old.get("items", [])))
+            meta = MetaStore.from_items(kind, old.get("dim"), old.get("items", []), rows)
+        return idx, meta
+    return _new_idmap(1), MetaStore(kind)
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+# save index and meta on disk as the next generation; CURRENT is the commit point#
+def _save(
+    ns: str, gen: int, idx: Optional[faiss.IndexIDMap], meta: MetaStore,
+    raw_src: Optional[Path] = None, raw_X: Optional[np.ndarray] = None,
+) -> int:
+    """
+    Write generation gen+1 and switch CURRENT to it. `idx=None` reuses gen's
+    index file (unchanged); the sidecar is linked from `raw_src` unless `raw_X`
+    (compacted vectors) is given. Caller holds the namespace file lock.
+    """
+    new = gen + 1
+    gdir = _gen_dir(ns, new)
+    if gdir.exists():
+        shutil.rmtree(gdir)               # leftover of an interrupted snapshot
+    gdir.mkdir(parents=True)
+    if idx is None:
+        _link_or_copy(_paths(ns, gen)[0], gdir / "index.faiss")
+    else:
+        faiss.write_index(idx, str(gdir / "index.faiss"))
+    meta.save(gdir / "meta")
+    if raw_X is not None:
+        RawVectors(gdir / "vectors.f32", int(meta.dim)).rewrite(raw_X)
+    elif raw_src is not None and raw_src.exists():
+        _link_or_copy(raw_src, gdir / "vectors.f32")
+    _write_atomic(_ns_dir(ns) / "CURRENT", f"{gdir.name}\n".encode("utf-8"))
+    _prune(ns, new)
+    return new
+
+#--- keep the live + previous generation (workers that have not synced yet still read it) ---#
+def _prune(ns: str, gen: int) -> None:
+    d = _ns_dir(ns)
+    for old in d.glob("gen-*"):
+        try:
+            if int(old.name.split("-", 1)[1]) < gen - 1:
+                shutil.rmtree(old, ignore_errors=True)
+        except ValueError:
+            continue
+    if d != DOCS_DIR:                     # pre-generation files (the legacy global docs index is migrated separately)
+        for name in ("index.faiss", "meta.pkl", "vectors.f32"):
+            if (d / name).exists():
+                (d / name).unlink()
+        if (d / "meta").is_dir():
+            shutil.rmtree(d / "meta", ignore_errors=True)
+# it ensure that either you are changing your model or no--#
+def _ensure_dim(idx: faiss.IndexIDMap, meta: MetaStore, d: int, ns: str = "") -> faiss.IndexIDMap:
+    if meta.dim is None:
+        if getattr(idx, "ntotal", 0) != 0:
+            raise ValueError("Index not empty but dim is None; delete index files and retry.")
+        kind = index_factory.target_kind(ns, 0) if ns else "flat"
+        idx = index_factory.build_index(kind, d) if not index_factory.needs_training(kind) else _new_idmap(d)
+        meta.dim = d
+        return idx
+    if meta.dim != d:
+        raise ValueError(f"FAISS dimension mismatch: existing={meta.dim}, new={d}. Delete files to rebuild.")
+    return idx
+
+
+#-- build a faiss IDSelector for the eligible rows (bitmap when dense, hash set when sparse) --#
+def _id_selector(mask: np.ndarray, count: int) -> Tuple[faiss.IDSelector, Any]:
+    if count * 64 >= len(mask):
+        bits = np.packbits(mask, bitorder="little")
+        # faiss keeps a raw pointer -> caller must hold `bits` until the search returns
+        return faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits)), bits
+    return faiss.IDSelectorBatch(np.flatnonzero(mask).astype("int64")), None
+
+
+# ---------------- Namespace (resident index + meta) ----------------
+class Namespace:
+    """One resident FAISS index + its columnar metadata, loaded once from disk."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rw = RWLock()                                   # searches share, writers exclusive
+        self.flock = FileLock(_ns_dir(name) / ".lock")      # writers across worker processes
+        self.wal = WriteAheadLog(_ns_dir(name) / "wal.log")
+        self.last_snapshot = time.monotonic()
+        self._derived_lock = threading.Lock()             # lazily built side indexes (BM25, chunk hashes)
+        with self.flock.hold():
+            self._open()
+
+    #--- (re)load the live generation + replay its log; caller holds the file lock ---#
+    def _open(self) -> None:
+        self.gen = _current_gen(self.name)
+        self._stamp = _gen_stamp(self.name)
+        idx_path, meta_dir = _paths(self.name, self.gen)
+        # only a columnar snapshot is mapped (a legacy meta.pkl is converted in RAM first)
+        self.mmapped = _use_mmap(self.name) and idx_path.exists() and (meta_dir / "meta.json").exists()
+        self.idx, self.meta = _load(self.name, mmap=self.mmapped, gen=self.gen)
+        self.kind = index_factory.kind_of(self.idx)
+        self.delta: Optional[faiss.IndexIDMap] = None   # rows added on top of a mapped snapshot
+        self.base_rows = len(self.meta)                  # rows covered by the mapped snapshot
+        self.raw: Optional[RawVectors] = None
+        self.wal_pos = 0                                 # bytes of wal.log applied in memory
+        self.pending_writes = 0                          # log records since the last snapshot
+        self.lex: Optional[BM25Index] = None             # BM25 postings, loaded on first use (_lexical)
+        self.chunks: Optional[ChunkIndex] = None         # chunk text -> row (dedup), built on first use
+        if self.meta.dim is not None:
+            self._open_raw()
+        replayed = self._catch_up()
+        self._repair()
+        if replayed:
+            logger.info(f"Replayed {replayed} WAL record(s) into FAISS namespace '{self.name}'")
+
+    def ensure_dim(self, d: int) -> None:
+        with self._writing():
+            self._ensure_dim(d)
+
+    def _ensure_dim(self, d: int) -> None:
+        self.idx = _ensure_dim(self.idx, self.meta, d, self.name)
+        self.kind = index_factory.kind_of(self.idx)
+        if self.raw is None:
+            self._open_raw()
+
+    #--- raw vector sidecar, kept row-aligned with meta ---#
+    def _open_raw(self) -> None:
+        self.raw = RawVectors(_gen_dir(self.name, self.gen) / "vectors.f32", int(self.meta.dim))
+        self._trim_index()
+        if self.raw.rows < len(self.meta):
+            self._backfill_raw()
+
+    def _trim_index(self) -> None:
+        """An interrupted pre-generation snapshot can leave index rows past meta; drop them (the WAL replays them)."""
+        n = len(self.meta)
+        if not self.idx.ntotal or self.mmapped:
+            return                        # mapped: rows >= base_rows are never selected
+        ids = faiss.vector_to_array(self.idx.id_map)
+        if ids.max() < n:
+            return
+        if index_factory.supports_remove_ids(self.kind):
+            self.idx.remove_ids(faiss.IDSelectorRange(n, int(ids.max()) + 1))
+        else:
+            live = np.flatnonzero(~self.meta.deleted)
+            idx = index_factory.empty_like(self.idx)
+            idx.add_with_ids(self.raw.take(live), live)
+            self.idx = idx
+
+    def _backfill_raw(self) -> None:
+        """Existing namespaces without a sidecar: recover vectors from the (flat) index."""
+        if self.kind != "flat":
+            raise RuntimeError(f"FAISS '{self.name}': vectors.f32 is missing and a {self.kind} index cannot be reconstructed")
+        X = np.zeros((len(self.meta), int(self.meta.dim)), dtype="float32")
+        if self.idx.ntotal:
+            X[faiss.vector_to_array(self.idx.id_map)] = self.idx.index.reconstruct_n(0, self.idx.ntotal)
+        self.raw.rewrite(X)
+
+    #--- apply log records this process has not seen yet (its own replay, or other workers' writes) ---#
+    def _catch_up(self) -> int:
+        applied = 0
+        for head, payload, end in self.wal.read_from(self.wal_pos):
+            self.wal_pos = end
+            if head.get("gen", 0) != self.gen or head.get("epoch", 0) != self.meta.epoch:
+                continue                  # folded into a later snapshot / written before a compaction
+            if head["op"] == "add":
+                if head["start"] != len(self.meta):
+                    continue              # already folded into the snapshot
+                if self.meta.dim is None:
+                    self._ensure_dim(int(head["dim"]))
+                X = np.frombuffer(payload, dtype="float32").reshape(-1, int(head["dim"])).copy()
+                self._apply_add(X, head["texts"], head["fields"])
+            elif head["op"] == "del":
+                self._apply_del(np.asarray(head["rows"], dtype="int64"))
+            elif head["op"] == "link":
+                self.meta.link(head["doc_id"], head["rows"], head.get("filename"))
+            elif head["op"] == "drop":
+                self._apply_drop(head["doc_id"], np.asarray(head["rows"], dtype="int64"))
+            applied += 1
+        self.pending_writes += applied
+        return applied
+
+    def _repair(self) -> None:
+        """Cut what a crashed writer left past the last intact record (caller holds the file lock)."""
+        self.wal.truncate(self.wal_pos)
+        if self.raw is not None and self.raw.rows > len(self.meta):
+            self.raw.truncate(len(self.meta))
+
+    #--- bring this process up to date with the files (no-op when nothing changed) ---#
+    def sync(self) -> None:
+        if _gen_stamp(self.name) != self._stamp:
+            with self.rw.write(), self.flock.hold():
+                if _gen_stamp(self.name) != self._stamp:
+                    self._open()
+        elif self.wal.size > self.wal_pos:
+            with self.rw.write():
+                self._catch_up()
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Exclusive in this process and across workers, caught up with everything on disk."""
+        with self.rw.write(), self.flock.hold():
+            if _gen_stamp(self.name) != self._stamp:
+                self._open()
+            else:
+                self._catch_up()
+                self._repair()
+            yield
+
+    def reading(self):
+        """Shared lock for a search + the row lookups that follow it."""
+        return self.rw.read()
+
+    def _apply_add(self, X: np.ndarray, texts: List[str], fields: Dict[str, Any]) -> int:
+        start = self.meta.next_id
+        ids = np.arange(start, start + X.shape[0], dtype="int64")
+        if self.mmapped:
+            if self.delta is None:
+                self.delta = _new_idmap(X.shape[1])
+            self.delta.add_with_ids(X, ids)
+        else:
+            self.idx.add_with_ids(X, ids)
+        self.meta.append(texts, **fields)
+        if self.lex is not None:
+            self.lex.add(texts)
+        if self.chunks is not None:
+            self.chunks.add(texts, self.meta.column("user_id")[start:].tolist())
+        return start
+
+    def _apply_del(self, rowids: np.ndarray) -> None:
+        self.meta.mark_deleted(rowids)
+        if self.mmapped:
+            # the mapped snapshot is read-only: its rows stay filtered out until the next fold
+            if self.delta is not None:
+                self.delta.remove_ids(faiss.IDSelectorBatch(rowids[rowids >= self.base_rows]))
+        elif index_factory.supports_remove_ids(self.kind):
+            self.idx.remove_ids(faiss.IDSelectorBatch(rowids))
+        # otherwise (hnsw, ivf) rows stay filtered out by the IDSelector until compaction
+
+    def append(self, X: np.ndarray, texts: List[str], **fields: Any) -> int:
+        """Log + add normalized vectors with their metadata; returns the first row id."""
+        with self._writing():
+            return self._append(X, list(texts), fields)
+
+    def _append(self, X: np.ndarray, texts: List[str], fields: Dict[str, Any]) -> int:
+        X = np.ascontiguousarray(X, dtype="float32")
+        self._ensure_dim(int(X.shape[1]))
+        head = {
+            "op": "add", "gen": self.gen, "epoch": self.meta.epoch, "start": self.meta.next_id,
+            "dim": int(X.shape[1]), "texts": texts, "fields": fields,
+        }
+        # sidecar first: a logged add always finds its vectors on disk (other workers replay it)
+        self.raw.append(X)
+        self.wal_pos = self.wal.append(head, X.tobytes())
+        self.pending_writes += 1
+        if self.name.startswith("docs") and RETRIEVAL_MODE != "dense":
+            self._lexical()               # lexical default: no first-query build; dense-only shards never pay for it
+        return self._apply_add(X, texts, fields)
+
+    #--- chunk dedup: find rows that already hold these texts, then add / link in one write ---#
+    def dedup_plan(self, texts: List[str], user_id: str) -> Tuple[int, List[Optional[int]]]:
+        """(meta epoch, existing row per text or None). Rows may be tombstoned (their vectors are still in the sidecar)."""
+        with self.rw.read():
+            code = self.meta.code_of("user_id", user_id)
+            if code is None or self.meta.dim is None:
+                return self.meta.epoch, [None] * len(texts)
+            index = self._chunk_index()
+            return self.meta.epoch, [index.find(code, t) for t in texts]
+
+    def add_chunks(
+        self, X: Optional[np.ndarray], texts: List[str], fields: Dict[str, Any],
+        reuse: List[Tuple[str, int]], epoch: int,
+    ) -> Optional[Dict[str, int]]:
+        """
+        Add `texts` (vectors X) and make fields["doc_id"] contain the `reuse` rows:
+        live rows are linked, tombstoned ones are re-added with their stored vector.
+        None if a compaction renumbered rows since dedup_plan (caller re-plans).
+        """
+        with self._writing():
+            if epoch != self.meta.epoch:
+                return None
+            rows = np.asarray([r for _, r in reuse], dtype="int64")
+            dead = self.meta.deleted[rows] if rows.size else np.zeros(0, dtype=bool)
+            texts = list(texts) + [t for (t, _), d in zip(reuse, dead.tolist()) if d]
+            parts = ([X] if X is not None and len(X) else []) + ([self.raw.take(rows[dead])] if dead.any() else [])
+            if texts:
+                self._append(np.vstack(parts), texts, fields)
+            live = rows[~dead]
+            if live.size:
+                head = {
+                    "op": "link", "gen": self.gen, "epoch": self.meta.epoch,
+                    "doc_id": fields["doc_id"], "filename": fields.get("filename"), "rows": live.tolist(),
+                }
+                self.wal_pos = self.wal.append(head)
+                self.pending_writes += 1
+                self.meta.link(fields["doc_id"], live, fields.get("filename"))
+            return {"added": len(texts), "linked": int(live.size), "copied": int(dead.sum())}
+
+    def mark_deleted(self, rowids: Iterable[int]) -> int:
+        """Tombstone rows in meta and hard-remove their vectors from faiss (when the index type allows)."""
+        rowids = np.asarray(list(rowids) if not isinstance(rowids, np.ndarray) else rowids, dtype="int64")
+        with self._writing():
+            return self._delete(rowids)
+
+    def delete_where(self, **filters: Optional[str]) -> int:
+        """mark_deleted(eligible(**filters)) in one critical section (row ids cannot shift in between)."""
+        with self._writing():
+            return self._delete(np.flatnonzero(self.meta.mask(**filters)))
+
+    def delete_doc(self, doc_id: str, user_id: Optional[str] = None) -> int:
+        """Remove a document: unlink it and tombstone the rows no other live doc still uses (dedup)."""
+        with self._writing():
+            if self.meta.code_of("doc_id", doc_id) in (None, -1):
+                return 0
+            rows = self.meta.doomed_rows(doc_id, user_id)
+            head = {"op": "drop", "gen": self.gen, "epoch": self.meta.epoch, "doc_id": doc_id, "rows": rows.tolist()}
+            self.wal_pos = self.wal.append(head)
+            self.pending_writes += 1
+            self._apply_drop(doc_id, rows)
+            return int(rows.size)
+
+    def _apply_drop(self, doc_id: str, rowids: np.ndarray) -> None:
+        self.meta.drop_links(doc_id)
+        if rowids.size:
+            self._apply_del(rowids)
+
+    def _delete(self, rowids: np.ndarray) -> int:
+        rowids = rowids[~self.meta.deleted[rowids]]
+        if rowids.size == 0:
+            return 0
+        head = {"op": "del", "gen": self.gen, "epoch": self.meta.epoch, "rows": rowids.tolist()}
+        self.wal_pos = self.wal.append(head)
+        self.pending_writes += 1
+        self._apply_del(rowids)
+        return int(rowids.size)
+
+    @property
+    def ntotal(self) -> int:
+        return int(self.idx.ntotal) + (int(self.delta.ntotal) if self.delta is not None else 0)
+
+    @property
+    def version(self) -> Tuple[int, int, int]:
+        """Changes with every write this process has applied (its own or replayed from other workers)."""
+        return self.gen, self.meta.epoch, self.wal_pos
+
+    @property
+    def live_rows(self) -> int:
+        return len(self.meta) - int(self.meta.deleted.sum())
+
+    def desired_kind(self) -> str:
+        """Target index type for the live size; never falls back to flat just because deletes shrank it."""
+        target = index_factory.target_kind(self.name, self.live_rows)
+        if target == "flat" and index_factory.configured_kind(self.name) != "flat":
+            return self.kind
+        return target
+
+    @property
+    def tombstone_ratio(self) -> float:
+        n = len(self.meta)
+        return float(self.meta.deleted.sum()) / n if n else 0.0
+
+    def rebuild(self, kind: Optional[str] = None) -> int:
+        """
+        Rebuild index (+ meta/raw when there are tombstones) from the raw sidecar:
+        - drops tombstones, renumbering row ids 0..n-1 (compaction)
+        - builds `kind` (default: target kind for the live size), training IVF on live vectors
+        Persists immediately as a new generation so index, meta and sidecar switch together.
+        Returns the number of tombstones dropped.
+        """
+        with self._writing():
+            meta = self.meta
+            if meta.dim is None:
+                return 0
+            live = np.flatnonzero(~meta.deleted)
+            dead = len(meta) - live.size
+            kind = kind or self.desired_kind()
+            X = self.raw.take(live)
+            train = None
+            if index_factory.needs_training(kind):
+                if live.size == 0:
+                    kind = "flat"
+                else:
+                    pick = np.random.default_rng(0).permutation(live.size)[:FAISS_TRAIN_SAMPLE]
+                    train = X[np.sort(pick)]
+            new_idx = index_factory.build_index(kind, int(meta.dim), train)
+            if live.size:
+                new_idx.add_with_ids(X, np.arange(live.size, dtype="int64"))
+            self._commit(new_idx, meta.take(live) if dead else meta, X if dead else None)
+            return dead
+
+    def eligible(self, **filters: Optional[str]) -> np.ndarray:
+        """Live row ids matching every non-empty filter (field=value)."""
+        with self.rw.read():
+            return np.flatnonzero(self.meta.mask(**filters))
+
+    def search(self, q: np.ndarray, top_k: int, **filters: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact filtered top_k: only eligible rows are scored by faiss (IDSelector),
+        so no oversampling / post-filtering is needed. Quantized kinds fetch extra
+        candidates and re-rank them with exact float32 inner products.
+        """
+        with self.rw.read():
+            mask = self.meta.mask(**filters)
+            count = int(mask.sum())
+            k = min(int(top_k), count)
+            if k <= 0:
+                return np.empty((q.shape[0], 0), dtype="float32"), np.empty((q.shape[0], 0), dtype="int64")
+            if index_factory.is_lossy(self.kind) and index_factory.FAISS_RERANK > 0:
+                _, I = self._search(q, min(index_factory.candidates(self.kind, k), count), mask, count)
+                return index_factory.rerank(q, I, self.raw.matrix(), k)
+            return self._search(q, k, mask, count)
+
+    def search_batch(self, Q: np.ndarray, top_k: int, filters: Optional[List[Dict[str, Optional[str]]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Q: (n, d) queries, filters: one dict per query (or None = no filters).
+        Queries sharing a filter set go to faiss in ONE search call (usually all of them).
+        Returns (n, top_k) D / I; rows with fewer eligible hits are padded with -inf / -1.
+        """
+        n = Q.shape[0]
+        D = np.full((n, top_k), -np.inf, dtype="float32")
+        I = np.full((n, top_k), -1, dtype="int64")
+        groups: Dict[Tuple[Tuple[str, str], ...], List[int]] = {}
+        for i, f in enumerate(filters or [{}] * n):
+            groups.setdefault(tuple(sorted((k, v) for k, v in f.items() if v)), []).append(i)
+        with self.rw.read():
+            for key, rows in groups.items():
+                d, ix = self.search(Q[rows], top_k, **dict(key))
+                D[rows, : d.shape[1]] = d
+                I[rows, : ix.shape[1]] = ix
+        return D, I
+
+    def _search(self, q: np.ndarray, k: int, mask: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        if self.mmapped:
+            return self._search_mapped(q, k, mask)
+        if count == self.idx.ntotal:
+            return self.idx.search(q, k, params=index_factory.search_params(self.kind))
+        sel, keepalive = _id_selector(mask, count)
+        D, I = self.idx.search(q, k, params=index_factory.search_params(self.kind, sel))
+        del keepalive
+        return D, I
+
+    def _search_mapped(self, q: np.ndarray, k: int, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the mapped snapshot (ids < base_rows) and the delta, then merge the two top-k lists."""
+        idx, delta, nb = self.idx, self.delta, self.base_rows
+        tail = mask.copy()
+        tail[:nb] = False
+        Ds, Is = [], []
+        for part, m in ((idx, mask[:nb]), (delta, tail)):
+            count = int(m.sum()) if part is not None else 0
+            if not count:
+                continue
+            sel, keepalive = _id_selector(m, count)
+            kind = self.kind if part is idx else "flat"
+            D, I = part.search(q, min(k, count), params=index_factory.search_params(kind, sel))
+            del keepalive
+            Ds.append(D)
+            Is.append(I)
+        if len(Ds) == 1:
+            return Ds[0], Is[0]
+        D, I = np.hstack(Ds), np.hstack(Is)
+        order = np.argsort(-D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    #--- BM25 over the same rows / filters ---#
+    def _lexical(self) -> BM25Index:
+        """Postings aligned with meta: from the generation's bm25.npz (+ rows added since), else built from meta texts."""
+        with self._derived_lock:
+            if self.lex is None:
+                path = _gen_dir(self.name, self.gen) / "bm25.npz"
+                lex = BM25Index.load(path) if path.exists() else None
+                if lex is None or lex.rows > len(self.meta):
+                    lex = BM25Index()
+                lex.add([self.meta.text(i) for i in range(lex.rows, len(self.meta))])
+                self.lex = lex
+            return self.lex
+
+    def _chunk_index(self) -> ChunkIndex:
+        with self._derived_lock:
+            if self.chunks is None:
+                index = ChunkIndex()
+                index.add([self.meta.text(i) for i in range(len(self.meta))], self.meta.column("user_id").tolist())
+                self.chunks = index
+            return self.chunks
+
+    def lexical_search(self, query: str, top_k: int, **filters: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 top_k among eligible rows, shaped like search(): (1, n) D / I."""
+        with self.rw.read():
+            D, I = self._lexical().search(query, int(top_k), self.meta.mask(**filters))
+            return D[None, :], I[None, :]
+
+    @property
+    def dirty(self) -> bool:
+        return self.pending_writes > 0
+
+    def snapshot(self) -> None:
+        with self._writing():
+            if not self.dirty or self.meta.dim is None:
+                return                    # nothing logged (or another worker already folded it)
+            self._commit(self._folded() if self.mmapped else self.idx)
+
+    #--- write the next generation, switch to it, and drop the folded log ---#
+    def _commit(self, idx: Optional[faiss.IndexIDMap], meta: Optional[MetaStore] = None, raw_X: Optional[np.ndarray] = None) -> None:
+        meta = self.meta if meta is None else meta       # an empty MetaStore (everything compacted away) is falsy
+        lex = self.lex if meta is self.meta else None      # compaction renumbers rows: rebuilt lazily
+        self.gen = _save(self.name, self.gen, idx, meta, self.raw.path, raw_X)
+        self.lex = lex
+        if meta is not self.meta:
+            self.chunks = None
+        if lex is not None:
+            lex.save(_gen_dir(self.name, self.gen) / "bm25.npz")
+        self._stamp = _gen_stamp(self.name)
+        self.wal.reset()
+        self.wal_pos = 0
+        self.pending_writes = 0
+        self.last_snapshot = time.monotonic()
+        self.raw = RawVectors(_gen_dir(self.name, self.gen) / "vectors.f32", int(meta.dim))
+        if _use_mmap(self.name):
+            self._remap()
+        else:
+            self.idx, self.meta = idx if idx is not None else self.idx, meta
+            self.kind = index_factory.kind_of(self.idx)
+
+    #--- mapped mode: the delta folded into a private copy of the snapshot index (None = unchanged) ---#
+    def _folded(self) -> Optional[faiss.IndexIDMap]:
+        if self.delta is None or not self.delta.ntotal:
+            return None                   # deletes only: meta changes, the index file is reused
+        # a private copy exists only while folding; the re-mapped file replaces it right after
+        full = _read_index(_paths(self.name, self.gen)[0])
+        n, ids = self.base_rows, faiss.vector_to_array(self.delta.id_map)
+        stale = int(faiss.vector_to_array(full.id_map).max()) + 1 if full.ntotal else 0
+        if stale > n and not index_factory.supports_remove_ids(self.kind):
+            # rows past the snapshot left by an interrupted save (hnsw / ivf): rebuild from the sidecar
+            full = index_factory.empty_like(full)
+            ids = np.flatnonzero(~self.meta.deleted)
+        elif stale > n:
+            full.remove_ids(faiss.IDSelectorRange(n, stale))
+        full.add_with_ids(self.raw.take(ids), ids)
+        if index_factory.supports_remove_ids(self.kind):
+            dead = np.flatnonzero(self.meta.deleted)
+            if dead.size:
+                full.remove_ids(faiss.IDSelectorBatch(dead))
+        return full
+
+    def _remap(self) -> None:
+        """Swap the in-RAM index/meta for read-only maps of the live generation."""
+        idx_path, meta_dir = _paths(self.name, self.gen)
+        self.idx = _read_index(idx_path, mmap=True)
+        self.meta = MetaStore.load(meta_dir, mmap=True)
+        self.kind = index_factory.kind_of(self.idx)
+        self.delta, self.base_rows, self.mmapped = None, len(self.meta), True
+
+
+# ---------------- VectorStore (process-wide) ----------------
+class VectorStore:
+    """
+    Holds every namespace in memory for the lifetime of the process.
+    - ns(name)         -> resident Namespace (lazy-loaded on first use, synced with other workers)
+    - mark_dirty(name) -> snapshot if the policy says so
+    - flush()          -> persist all dirty namespaces now
+    """
+
+    def __init__(self, snapshot_every: int = FAISS_SNAPSHOT_EVERY, snapshot_secs: float = FAISS_SNAPSHOT_SECS):
+        self.snapshot_every = snapshot_every
+        self.snapshot_secs = snapshot_secs
+        self._spaces: Dict[str, Namespace] = {}
+        self._lock = threading.RLock()    # guards _spaces / namespace creation
+        self._flusher: Optional[threading.Thread] = None
+        self._legacy_checked = False
+        self._maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="faiss-maint")
+        self._rebuilding: set = set()
+
+    def ns(self, name: str) -> Namespace:
+        space = self._spaces.get(name)
+        if space is not None:
+            space.sync()
+            return space
+        with self._lock:
+            if name.startswith("docs:"):
+                self._migrate_legacy_docs()
+            space = self._spaces.get(name)
+            if space is not None:
+                return space
+            space = Namespace(name)
+            self._spaces[name] = space
+        logger.info(
+            f"Loaded FAISS namespace '{name}' (kind={space.kind}, ntotal={space.ntotal}"
+            f"{', mmap' if space.mmapped else ''}, gen={space.gen})"
+        )
+        self.maybe_upgrade(name)
+        return space
+
+    def exists(self, name: str) -> bool:
+        """True if the namespace is resident or has files on disk (never creates it)."""
+        if name in self._spaces:
+            return True
+        if name.startswith("docs:"):
+            with self._lock:
+                self._migrate_legacy_docs()
+        return _has_snapshot(name) or (_ns_dir(name) / "wal.log").exists()
+
+    def mark_dirty(self, name: str) -> None:
+        space = self.ns(name)
+        if (self.snapshot_every and space.pending_writes >= self.snapshot_every) or space.wal.size >= FAISS_WAL_MAX_BYTES:
+            space.snapshot()
+        elif self.snapshot_secs:
+            self._start_flusher()
+
+    def maybe_compact(self, name: str) -> None:
+        """Schedule a background compaction if the tombstone ratio passed the threshold."""
+        space = self._spaces.get(name)
+        if space is not None and space.tombstone_ratio >= FAISS_COMPACT_RATIO:
+            self._schedule_rebuild(name, "compaction")
+
+    def maybe_upgrade(self, name: str) -> None:
+        """Schedule a background rebuild when the namespace outgrew its index type (e.g. flat -> hnsw)."""
+        space = self._spaces.get(name)
+        if space is None or space.meta.dim is None:
+            return
+        target = space.desired_kind()
+        if target != space.kind:
+            self._schedule_rebuild(name, f"{space.kind} -> {target}")
+
+    def rebuild(self, name: str, kind: Optional[str] = None) -> int:
+        """Synchronous rebuild / migration of one namespace to `kind`."""
+        return self.ns(name).rebuild(kind)
+
+    def _schedule_rebuild(self, name: str, reason: str) -> None:
+        with self._lock:
+            if name in self._rebuilding:
+                return
+            self._rebuilding.add(name)
+        self._maintenance.submit(self._rebuild_job, name, reason)
+
+    def _rebuild_job(self, name: str, reason: str) -> None:
+        try:
+            space = self._spaces.get(name)
+            if space is None:
+                return
+            t0 = time.perf_counter()
+            dropped = space.rebuild()
+            logger.info(
+                f"Rebuilt FAISS namespace '{name}' ({reason}): kind={space.kind}, "
+                f"dropped {dropped} tombstones in {time.perf_counter() - t0:.2f}s"
+            )
+        except Exception as e:
+            logger.error(f"FAISS rebuild of '{name}' failed: {e}")
+        finally:
+            self._rebuilding.discard(name)
+
+    def flush(self, name: Optional[str] = None) -> None:
+        names = [name] if name else list(self._spaces)
+        for n in names:
+            space = self._spaces.get(n)
+            if space is not None and space.dirty:
+                space.snapshot()
+
+    def reload(self, name: Optional[str] = None) -> None:
+        """Drop resident state so the next access re-reads from disk."""
+        with self._lock:
+            if name:
+                self._spaces.pop(name, None)
+            else:
+                self._spaces.clear()
+
+    #--- one-time split of the old global docs index into per-user shards (caller holds _lock) ---#
+    def _migrate_legacy_docs(self) -> None:
+        if self._legacy_checked:
+            return
+        self._legacy_checked = True
+        idx_path, legacy_pkl = DOCS_DIR / "index.faiss", DOCS_DIR / "meta.pkl"
+        if not (idx_path.exists() and legacy_pkl.exists()):
+            return
+        with FileLock(DOCS_DIR / ".migrate.lock").hold():
+            if not (idx_path.exists() and legacy_pkl.exists()):
+                return                    # another worker migrated it meanwhile
+            idx, meta = _load("docs")
+            n = int(idx.ntotal)
+            shards = set()
+            if n:
+                X = idx.index.reconstruct_n(0, n)
+                rowids = faiss.vector_to_array(idx.id_map)
+                live = ~meta.deleted[rowids]
+                users = meta.column("user_id")[rowids]
+                for ucode in np.unique(users[live]).tolist():
+                    pos = np.flatnonzero(live & (users == ucode))
+                    rows = rowids[pos].tolist()
+                    name = docs_shard(meta.vocab["user_id"][ucode] if ucode >= 0 else "")
+                    space = self._spaces.get(name) or Namespace(name)
+                    space.append(
+                        X[pos],
+                        [meta.text(r) for r in rows],
+                        **{f: [meta.value(f, r) for r in rows] for f in CODE_FIELDS},
+                    )
+                    space.snapshot()
+                    self._spaces[name] = space
+                    shards.add(name)
+                logger.info(f"Migrated legacy docs index ({n} vectors) into {len(shards)} shard(s)")
+            idx_path.rename(idx_path.with_suffix(".faiss.migrated"))
+            legacy_pkl.rename(legacy_pkl.with_suffix(".pkl.migrated"))
+
+    #--- background timer: persist namespaces that stayed dirty for snapshot_secs ---#
+    def _start_flusher(self) -> None:
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="faiss-snapshot", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.snapshot_secs)
+            now = time.monotonic()
+            for space in list(self._spaces.values()):
+                if space.dirty and now - space.last_snapshot >= self.snapshot_secs:
+                    try:
+                        space.snapshot()
+                    except Exception as e:
+                        logger.error(f"FAISS snapshot of '{space.name}' failed: {e}")
+
+
+_STORE: Optional[VectorStore] = None
+_STORE_LOCK = threading.Lock()
+
+
+def get_store() -> VectorStore:
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                _STORE = VectorStore()
+                atexit.register(_STORE.flush)
+    return _STORE
+
+
+#--- every namespace present on disk (docs shards + conv) ---#
+def list_namespaces(prefix: str = "") -> List[str]:
+    names = [f"docs:{d.name}" for d in sorted(SHARDS_DIR.glob("*")) if _has_snapshot(f"docs:{d.name}")]
+    if _has_snapshot("conv"):
+        names.append("conv")
+    return [n for n in names if n.startswith(prefix)]
+
+
+# ---------------- CLI: migrate existing indexes to another type ----------------
+# python -m backend.database.vector_store rebuild <docs|conv|docs:<shard>> [flat|hnsw|ivfflat|ivfpq|sq8|fp16]
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 3 or sys.argv[1] != "rebuild":
+        sys.exit("usage: python -m backend.database.vector_store rebuild <docs|conv|docs:<shard>> [kind]")
+    target = sys.argv[3] if len(sys.argv) > 3 else None
+    store = get_store()
+    with store._lock:
+        store._migrate_legacy_docs()
+    for name in list_namespaces(sys.argv[2]):
+        dropped = store.rebuild(name, target)
+        space = store.ns(name)
+        print(f"{name}: kind={space.kind} rows={space.live_rows} (dropped {dropped} tombstones)")
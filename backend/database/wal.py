@@ -0,0 +1,79 @@
+# backend/database/wal.py
+# Append-only write-ahead log for one FAISS namespace (<ns dir>/wal.log).
+# - Every insert / delete is appended as one framed record BEFORE it is applied in
+#   memory, so a write costs O(record) disk I/O instead of rewriting the index
+# - On startup the records newer than the last snapshot are replayed
+# - A snapshot folds the log into index.faiss + meta and truncates it
+# Frame: b"WAL1" | u32 header_len | u32 payload_len | u32 crc32 | header json | payload
+# A torn / corrupt tail (crash mid-append, or a record another worker is still
+# writing) is detected by length/crc: readers stop there, and only a writer holding
+# the namespace file lock cuts it off (truncate)
+
+from __future__ import annotations
+from pathlib import Path
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterator, Tuple
+
+logger = logging.getLogger("wal")
+
+_MAGIC = b"WAL1"
+_FRAME = struct.Struct("<4sIII")
+
+FAISS_WAL_FSYNC = os.getenv("FAISS_WAL_FSYNC", "0") == "1"   # fsync each record (power-loss safe)
+
+
+class WriteAheadLog:
+    """Framed, crc-checked append-only record log."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @property
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, header: Dict[str, Any], payload: bytes = b"") -> int:
+        """Append one record; returns the log size after it."""
+        head = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        crc = zlib.crc32(payload, zlib.crc32(head))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(_FRAME.pack(_MAGIC, len(head), len(payload), crc) + head + payload)
+            f.flush()
+            if FAISS_WAL_FSYNC:
+                os.fsync(f.fileno())
+            return f.tell()
+
+    def read_from(self, pos: int = 0) -> Iterator[Tuple[Dict[str, Any], bytes, int]]:
+        """Yield (header, payload, end offset) for every intact record after `pos`; never modifies the file."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(pos)
+            while True:
+                frame = f.read(_FRAME.size)
+                if len(frame) < _FRAME.size:
+                    break
+                magic, hlen, plen, crc = _FRAME.unpack(frame)
+                body = f.read(hlen + plen)
+                if magic != _MAGIC or len(body) < hlen + plen or zlib.crc32(body) != crc:
+                    break
+                yield json.loads(body[:hlen].decode("utf-8")), body[hlen:], f.tell()
+
+    def truncate(self, pos: int) -> None:
+        """Cut a torn tail after the last intact record (caller holds the file lock)."""
+        size = self.size
+        if size > pos:
+            logger.warning(f"WAL {self.path}: dropping {size - pos} bytes of torn tail")
+            with open(self.path, "r+b") as f:
+                f.truncate(pos)
+
+    def reset(self) -> None:
+        """Called after a snapshot has folded every record in."""
+        if self.path.exists():
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
@@ -48,6 +48,43 @@ app.include_router(chat_router)                      # /chat...
 app.include_router(doc_router)                       # /docs...
 app.include_router(session_router)                   # /sessions...
 
+# ---------- Vector store lifecycle ----------
+# FAISS namespaces stay resident in memory; persist anything not yet snapshotted on shutdown.
+from backend.database.vector_store import get_store
+
+@app.on_event("shutdown")
+def _flush_vector_store():
+    get_store().flush()
+
+# ---------- Embedding model warmup ----------
+# The model loads in the background right after startup (not at import, not on the first request).
+from backend.utils.model_registry import MODEL_WARMUP, warmup
+
+@app.on_event("startup")
+def _warmup_models():
+    if MODEL_WARMUP:
+        warmup()
+
+# Ingestion embedding workers (EMBED_WORKERS > 0) start on the first large upload
+from backend.utils.embedding_pool import shutdown_pool
+
+@app.on_event("shutdown")
+def _stop_embedding_pool():
+    shutdown_pool()
+
+# ---------- Cache stats (sizing the retrieval / embedding caches) ----------
+from backend.database.retrieval_cache import get_cache
+from backend.utils.embedding_cache import get_embedding_cache
+from backend.utils.embedding_handler import query_batcher
+
+@app.get("/stats")
+def stats():
+    return {
+        "retrieval_cache": get_cache().stats(),
+        "embedding_cache": get_embedding_cache().stats(),
+        "embedding_batcher": query_batcher.stats() if query_batcher else None,
+    }
+
 # ---------- Root health check ----------
 @app.get("/")
 def root():
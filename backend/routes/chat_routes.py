@@ -2,11 +2,13 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional, Dict
 from bson import ObjectId
-from backend.database.faiss_handler import _norm_id, search_in_faiss_for_user
+from backend.database.faiss_handler import _norm_id, search_in_faiss_for_user, conv_remove
+from backend.database.lexical_index import RETRIEVAL_MODES
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from backend.utils.jwt_handler import require_user
-from backend.utils.embedding_handler import get_query_embedding
+from backend.utils.embedding_handler import aembed_query
 from backend.database.mongodb import db
 from backend.services.chat_service import ensure_indexes, chat_with_rag
 
@@ -25,6 +27,7 @@ class ChatBody(BaseModel):
     question: str
     conversation_id: Optional[str] = None
     doc_id: Optional[str] = None
+    mode: Optional[str] = None      # retrieval: "dense" | "bm25" | "hybrid" (default RETRIEVAL_MODE)
 
 # ---------------- Chat ----------------
 @router.post("/send")
@@ -35,17 +38,21 @@ async def chat_send(body: ChatBody, user=Depends(require_user)):
     q = (body.question or "").strip()
     if not q:
         raise HTTPException(status_code=400, detail="Question is required")
+    if body.mode and body.mode.strip().lower() not in RETRIEVAL_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(RETRIEVAL_MODES)}")
 
     try:
         # --- Step 1: FAISS retrieval ---
         hits = []
         if body.doc_id:
-            qvec = get_query_embedding(q)
+            qvec = await aembed_query(q)     # micro-batched with concurrent requests
             hits = search_in_faiss_for_user(
                 query_vector=qvec,
                 user_id=str(user["_id"]),
                 doc_id=body.doc_id,
-                top_k=5
+                top_k=5,
+                query_text=q,
+                mode=body.mode,
             )
 
         if not hits:
@@ -101,13 +108,16 @@ async def chat_send(body: ChatBody, user=Depends(require_user)):
 
     except Exception as e:
         # 🔄 Fallback to chat_with_rag if new pipeline fails
+        # (in the threadpool: it blocks on the embedding batcher, Mongo and the LLM)
         try:
-            out = chat_with_rag(
+            out = await run_in_threadpool(
+                chat_with_rag,
                 messages,
                 user_id=_norm_id(user["_id"]),   # always string
                 query=q,
                 conversation_id=_norm_id(body.conversation_id) if body.conversation_id else None,
-                doc_id=_norm_id(body.doc_id) if body.doc_id else None
+                doc_id=_norm_id(body.doc_id) if body.doc_id else None,
+                mode=body.mode,
             )
             return out
         except Exception as inner:
@@ -213,9 +223,11 @@ def delete_history_item(message_id: str, user=Depends(require_user)):
     except Exception:
         raise HTTPException(400, "Invalid message_id")
 
-    res = messages.delete_one({"_id": mid, "user_id": str(user["_id"])})
-    if res.deleted_count == 0:
+    doc = messages.find_one_and_delete({"_id": mid, "user_id": str(user["_id"])})
+    if doc is None:
         raise HTTPException(404, "Message not found")
+    # conversation memory is stored per conversation, so pass its id along
+    conv_remove(user_id=str(user["_id"]), conversation_id=doc.get("conversation_id"), message_ids=[message_id])
     return {"ok": True, "deleted": 1}
 
 # ---------------- Delete Whole Conversation ----------------
@@ -241,5 +253,6 @@ def delete_history_conversation(conversation_id: str = Query(...), user=Depends(
         {"_id": cid, "user_id": str(user["_id"])},
         {"$set": {"deleted": True}}
     )
+    conv_remove(user_id=str(user["_id"]), conversation_id=str(cid))
 
     return {"ok": True, "deleted_messages": int(res.modified_count)}
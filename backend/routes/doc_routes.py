@@ -1,15 +1,16 @@
 # backend/routes/doc_routes.py
 import os
-import uuid
-import shutil
+import asyncio
 import logging
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request
 from backend.database.faiss_handler import docs_remove_by_doc_id, _norm_id
 from bson import ObjectId
 from backend.utils.jwt_handler import require_user
 from backend.database.mongodb import db
-from backend.services.doc_service import process_document
+from backend.services import ingest_jobs
+from backend.services.doc_service import ensure_indexes as ensure_doc_indexes, find_ready_document, touch_document
+from backend.utils.upload_stream import receive_file
 
 # Router
 router = APIRouter(prefix="/docs", tags=["docs"])
@@ -25,67 +26,119 @@ logger = logging.getLogger("docs_routes")
 logging.basicConfig(level=logging.INFO)
 
 
+# ---------------- Startup ----------------
+@router.on_event("startup")
+def _start_ingest_workers():
+    ensure_doc_indexes()
+    ingest_jobs.ensure_indexes()
+    ingest_jobs.start_workers()
+
+@router.on_event("shutdown")
+def _stop_ingest_workers():
+    ingest_jobs.stop_workers()
+
+
 # ---------------- Helpers ----------------
 def _normalize_uid_str(user: dict) -> str:
     """Always return user_id as string."""
     return str(user.get("_id") or user.get("user_id"))
 
 
+def _discard(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
 # --- Routes - when user upload document from frontend this endpoint is called -----------
+# The file is saved and queued; ingest_jobs workers do load/chunk/embed/store in the background
+# so the event loop (and every other user's chat) is never blocked by a big PDF.
+# Poll GET /docs/jobs/{job_id}; ?wait=true keeps the old blocking response shape.
+# The multipart body is parsed from the request stream as it arrives (upload_stream.py),
+# not by FastAPI's File(): the file goes to disk chunk by chunk while its sha256 and size
+# are computed, and an oversized upload is refused from Content-Length or cut off at
+# MAX_UPLOAD_MB mid-stream. Content this user already has indexed returns at once
+# (metadata-only update, the received file is dropped, no job).
 @router.post("/upload")
-async def upload_doc(file: UploadFile = File(...), user: dict = Depends(require_user)):
-    """Upload and process a document."""
-    ext = os.path.splitext(file.filename or "")[1].lower()
-    if ext not in ALLOWED_EXTS:
-        raise HTTPException(400, f"Only {', '.join(sorted(ALLOWED_EXTS))} supported.")
-
-    content = await file.read()
-    size_mb = len(content) / (1024 * 1024)
-    if size_mb > MAX_UPLOAD_MB:
-        raise HTTPException(413, f"File too large ({size_mb:.1f} MB). Max {MAX_UPLOAD_MB}.")
-    await file.seek(0)
-
+async def upload_doc(request: Request, wait: bool = False, user: dict = Depends(require_user)):
+    """Upload a document (multipart field "file") and queue it for processing."""
     uid = _normalize_uid_str(user)
-    tmp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}{ext}")
+    upload = await receive_file(request, dest_dir=UPLOAD_DIR, exts=ALLOWED_EXTS, max_mb=MAX_UPLOAD_MB)
+    filename, partial = upload["filename"], upload["path"]
+    size_bytes, content_hash = upload["size_bytes"], upload["content_hash"]
+    size_mb = size_bytes / (1024 * 1024)
+    path = partial[: -len(".part")]       # a job only ever sees a complete file
 
+    # from here on every exit removes the received file, except the hand-off to a job
     try:
-        with open(tmp_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        # Process doc (chunks + embed + save Mongo + FAISS)
-        result = process_document(tmp_path, file.filename, uid)
-
-        return {
-            "ok": True,
-            **result,
-            "filename": file.filename,
-            "size_mb": round(size_mb, 2),
-        }
-
+        known = find_ready_document(uid, content_hash)
+        if known:
+            _discard(partial)
+            return {
+                "ok": True, "job_id": None, "status": "done", **touch_document(known, filename),
+                "filename": filename, "size_mb": round(size_mb, 2),
+            }
+        os.replace(partial, path)
+        job_id = ingest_jobs.enqueue(
+            user_id=uid, filename=filename, path=path, size_bytes=size_bytes, content_hash=content_hash,
+        )
     except Exception as e:
         logger.error(f"Upload failed: {e}")
+        _discard(partial)
+        _discard(path)
         raise HTTPException(500, f"Upload failed: {e}")
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+
+    if not wait:
+        return {"ok": True, "job_id": job_id, "status": "queued", "filename": filename, "size_mb": round(size_mb, 2)}
+
+    while True:
+        job = ingest_jobs.get_job(job_id, uid)
+        if job is None or job["status"] in ("done", "failed"):
+            break
+        await asyncio.sleep(0.5)
+    if job is None or job["status"] == "failed":
+        raise HTTPException(500, f"Upload failed: {job['error'] if job else 'job lost'}")
+    return {
+        "ok": True,
+        "job_id": job_id,
+        "document_id": job["document_id"],
+        "chunk_count": job["chunk_count"],
+        "duplicate": job["duplicate"],
+        "filename": filename,
+        "size_mb": round(size_mb, 2),
+    }
+
+#--- the frontend polls this after an upload until status is "done" or "failed" ---------#
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str, user: dict = Depends(require_user)):
+    """Status, stage and progress (0..1) of an ingest job."""
+    job = ingest_jobs.get_job(job_id, _normalize_uid_str(user))
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
 
 #--- when user open document page in frontend this endpoint is called ---------#
 @router.get("/list")
 async def list_docs(user: dict = Depends(require_user)):
     """List all documents for the current user."""
     uid = _normalize_uid_str(user)
-    cur = db.documents.find({"user_id": uid, "deleted": False}).sort("created_at", -1)
+    cur = db.documents.find({"user_id": uid, "deleted": False})
+    # most recently uploaded first: a metadata-only re-upload (same content) counts as an upload
+    docs = sorted(cur, key=lambda d: d.get("last_uploaded_at") or d.get("created_at") or datetime.min, reverse=True)
     out = []
-    for d in cur:
+    for d in docs:
         out.append(
             {
                 "_id": str(d["_id"]),
                 "filename": d.get("filename"),
                 "chunk_count": d.get("chunk_count"),
                 "size_bytes": d.get("size_bytes"),
+                "status": d.get("status", "ready"),
+                "aliases": d.get("aliases", []),
+                "upload_count": d.get("upload_count", 1),
                 "created_at": d.get("created_at"),
+                "last_uploaded_at": d.get("last_uploaded_at") or d.get("created_at"),
             }
         )
     return {"documents": out}
@@ -9,11 +9,11 @@ from pymongo import ASCENDING, DESCENDING
 from groq import Groq
 
 from backend.database.mongodb import db
-from backend.utils.embedding_handler import get_query_embedding, get_embeddings
+from backend.utils.embedding_handler import embed_query, embed_texts
 from backend.database.faiss_handler import (
-    search_in_faiss_for_user,
-    conv_search,
+    rag_search,
     conv_save_vectors,
+    conv_remove,
 )
 
 # ---------------- Groq client ----------------
@@ -76,7 +76,9 @@ def chat_with_rag(
     query: str,
     conversation_id: Optional[str] = None,
     doc_id: Optional[str] = None,
+    mode: Optional[str] = None,
 ) -> dict:
+    """mode: retrieval mode for the document context ("dense" / "bm25" / "hybrid", default RETRIEVAL_MODE)."""
     start_time = datetime.utcnow()
 
     # Ensure conversation_id is string
@@ -111,24 +113,20 @@ def chat_with_rag(
         logger.warning(f"Failed to auto-update conversation title: {e}")
 
     # ---- Embedding
-    qvec = get_query_embedding(query)
+    qvec = embed_query(query)
 
-    # ---- Document retrieval
-    doc_hits = search_in_faiss_for_user(
-        query_vector=qvec,
-        user_id=str(user_id),
-        doc_id=str(doc_id) if doc_id else None,
-        top_k=8,
-    )
-    doc_chunks = [h["text"] for h in doc_hits]
-
-    # ---- Conversation memory retrieval
-    conv_hits = conv_search(
+    # ---- Document + conversation memory retrieval (one normalized query, batch search APIs)
+    doc_hits, conv_hits = rag_search(
         user_id=str(user_id),
         conversation_id=conv_id_str,
         query_vector=qvec,
-        top_k=5,
+        doc_top_k=8,
+        conv_top_k=5,
+        doc_id=str(doc_id) if doc_id else None,
+        query_text=query,
+        mode=mode,
     )
+    doc_chunks = [h["text"] for h in doc_hits]
     conv_chunks = [h["text"] for h in conv_hits]
 
     # ---- Prompt build
@@ -187,7 +185,7 @@ def chat_with_rag(
             user_id=str(user_id),
             conversation_id=conv_id_str,
             texts=[query, answer],
-            vectors=get_embeddings([query, answer]),
+            vectors=embed_texts([query, answer]),
             roles=["user", "assistant"],
             message_ids=[str(user_msg["_id"]), str(asst_msg["_id"])],
         )
@@ -253,4 +251,5 @@ def delete_conversation(user_id: str, conversation_id: str) -> dict:
         {"conversation_id": cid, "user_id": str(user_id)},
         {"$set": {"deleted": True}}
     )
+    conv_remove(user_id=str(user_id), conversation_id=cid)
     return {"ok": True}
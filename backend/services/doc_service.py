@@ -1,7 +1,11 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
 import os
-from typing import Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from bson import ObjectId
+import numpy as np
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 import hashlib
 
@@ -12,11 +16,36 @@ except Exception:
     HAS_DOCX = False
 
 from backend.utils.chunkers import chunk_text
-from backend.utils.embedding_handler import get_embeddings
-from backend.database.faiss_handler import save_to_faiss
+from backend.utils.embedding_handler import embed_texts
 from backend.database.mongodb import db
 from backend.database.faiss_handler import docs_remove_by_doc_id
 
+logger = logging.getLogger("doc_service")
+
+# chunks embedded per progress update when a job tracks progress (ingest_jobs.py)
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "512"))
+# an "indexing" claim older than this belongs to a dead worker (same knob as the job queue)
+INGEST_STALE_SECS = float(os.getenv("INGEST_STALE_SECS", "600"))
+
+
+class IndexingInProgress(RuntimeError):
+    """Another live ingest holds the (user, hash) document; try again once it is done."""
+
+
+def ensure_indexes() -> None:
+    # one document per (user, content): concurrent ingests of the same file cannot both insert.
+    # claim_document relies on this index, so the app does not start without it
+    try:
+        db.documents.create_index(
+            [("user_id", ASCENDING), ("content_hash", ASCENDING)], unique=True,
+            partialFilterExpression={"content_hash": {"$type": "string"}},
+        )
+    except OperationFailure as e:
+        raise RuntimeError(
+            f"documents (user_id, content_hash) unique index could not be created "
+            f"(duplicate documents per user and hash must be merged first): {e}"
+        ) from e
+
 #--this is file loader function--#
 def _load_text(file_path: str, filename: str) -> str:
     lower = filename.lower()
@@ -32,88 +61,166 @@ def _load_text(file_path: str, filename: str) -> str:
         return docx2txt.process(file_path)
     raise ValueError("Unsupported file type (PDF, TXT, DOCX allowed)")
 
+# embed in INGEST_EMBED_BATCH slices so a job's progress moves through the embedding stage --#
+def _embed_with_progress(report: Callable[[str, float], None]) -> Callable[[List[str]], np.ndarray]:
+    def embed(texts: List[str]) -> np.ndarray:
+        out: Optional[np.ndarray] = None
+        for s in range(0, len(texts), INGEST_EMBED_BATCH):
+            V = embed_texts(texts[s:s + INGEST_EMBED_BATCH])
+            if out is None:
+                out = np.empty((len(texts), V.shape[1]), dtype="float32")
+            out[s:s + len(V)] = V
+            report("embedding", 0.2 + 0.7 * min(s + INGEST_EMBED_BATCH, len(texts)) / len(texts))
+        report("storing", 0.9)
+        return out
+    return embed
+
+# ---------------- content-hash fast path ----------------
+# A (user, sha256) pair that is already indexed needs no parse, embed or FAISS work: the
+# upload only refreshes the document's metadata. Docs still "indexing" (or "failed")
+# are not ready, so their re-upload runs the full pipeline again, after claiming the
+# (user, hash) pair (claim_document): a second ingest of the same content gets
+# IndexingInProgress instead of reusing the first one's doc id under it (the job queue
+# retries it later, when it usually takes the fast path).
+def file_sha256(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def find_ready_document(user_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    return db.documents.find_one({
+        "user_id": str(user_id), "content_hash": content_hash,
+        "deleted": False, "status": {"$nin": ["indexing", "failed"]},
+    })
+
+
+def touch_document(doc: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """Metadata-only re-upload: the stored chunks / vectors stay as they are."""
+    update: Dict[str, Any] = {"$set": {"last_uploaded_at": datetime.utcnow()}, "$inc": {"upload_count": 1}}
+    if "upload_count" not in doc:                         # documents indexed before the counter existed
+        update = {"$set": {**update["$set"], "upload_count": 2}}
+    if filename and filename != doc.get("filename"):
+        # search metadata keeps the original name; /docs/list shows the aliases and
+        # orders by last_uploaded_at, so the re-upload moves to the top
+        update["$addToSet"] = {"aliases": filename}
+    db.documents.update_one({"_id": doc["_id"]}, update)
+    return {"document_id": str(doc["_id"]), "chunk_count": doc.get("chunk_count"), "duplicate": True}
+
+
+def claim_document(user_id: str, content_hash: str, rec: Dict[str, Any]) -> Optional[Tuple[ObjectId, bool]]:
+    """
+    Atomically mark the (user, hash) document "indexing" for this ingest, creating it if
+    needed. Returns (doc id, existed before) or None while another live ingest holds it.
+    """
+    now = datetime.utcnow()
+    new_id = ObjectId()
+    try:
+        before = db.documents.find_one_and_update(
+            {
+                "user_id": user_id, "content_hash": content_hash,
+                "$or": [{"status": {"$ne": "indexing"}}, {"indexing_at": {"$lt": now - timedelta(seconds=INGEST_STALE_SECS)}}],
+            },
+            {"$set": {**rec, "status": "indexing", "indexing_at": now}, "$setOnInsert": {"_id": new_id}},
+            upsert=True, return_document=ReturnDocument.BEFORE,
+        )
+    except DuplicateKeyError:
+        return None                       # the document exists and is being indexed right now
+    return (before["_id"], True) if before else (new_id, False)
+
+
 #----it is the main point which is called after uploading a document---#
-def process_document(file_path: str, filename: str, user_id: str) -> Dict[str, Any]:
+def process_document(
+    file_path: str,
+    filename: str,
+    user_id: str,
+    progress: Optional[Callable[[str, float], None]] = None,
+    content_hash: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Load, chunk, embed, and store a document in Mongo + FAISS.
-    Returns: {"document_id": str, "chunk_count": int}
+    progress(stage, fraction) is called as the work advances (background ingest jobs).
+    content_hash: sha256 of the file if the caller already has it (computed while uploading).
+    Returns: {"document_id": str, "chunk_count": int, "duplicate": bool}
     """
-    from backend.database.faiss_handler import save_to_faiss, docs_remove_by_doc_id, _norm_id
+    from backend.database.faiss_handler import docs_add_chunks, docs_remove_by_doc_id, _norm_id
 
     user_id = str(user_id)   # normalize
+    report = progress or (lambda stage, fraction: None)
 
-    # ---- Load text
-    text = _load_text(file_path, filename)
-    if not text.strip():
-        raise ValueError("Empty file")
+    # ---- Content hash first: already indexed content short-circuits before any parsing
+    content_hash = content_hash or file_sha256(file_path)
+    known = find_ready_document(user_id, content_hash)
+    if known:
+        report("done", 1.0)
+        return touch_document(known, filename)
 
-    # ---- Chunk text
-    chunks = chunk_text(text, chunk_size=1000, overlap=200)
-    if not chunks:
-        raise ValueError("No chunks created")
+    # ---- Claim the (user, hash) document before any parsing. Same content stored before
+    # but deleted / failed reuses its id; while another ingest of it is running, give up now
+    now = datetime.utcnow()
+    rec = {
+        "user_id": user_id,
+        "filename": filename,
+        "size_bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
+        "created_at": now,
+        "last_uploaded_at": now,
+        "upload_count": 1,
+        "deleted": False,
+        "content_hash": content_hash,
+    }
+    claim = claim_document(user_id, content_hash, rec)
+    if claim is None:
+        raise IndexingInProgress(f"{filename}: the same content is being indexed by another upload")
+    doc_objid, existing = claim
+    doc_id = str(doc_objid)
 
-    # ---- Embeddings
-    vectors = get_embeddings(chunks)
+    def heartbeat(stage: str, fraction: float) -> None:
+        # progress refreshes the claim too, so a long ingest is never taken for a dead one
+        db.documents.update_one({"_id": doc_objid, "status": "indexing"}, {"$set": {"indexing_at": datetime.utcnow()}})
+        report(stage, fraction)
 
-    # ---- Compute content hash
-    h = hashlib.sha256()
-    with open(file_path, "rb") as fh:
-        for chunk in iter(lambda: fh.read(8192), b""):
-            h.update(chunk)
-    content_hash = h.hexdigest()
-
-    # ---- Check for existing document with same hash
-    existing = db.documents.find_one({"user_id": user_id, "content_hash": content_hash})
-    if existing:
-        # Reuse existing doc
-        doc_objid = existing["_id"]
-        doc_id = str(doc_objid)
-
-        rec = {
-            "user_id": user_id,
-            "filename": filename,
-            "chunk_count": len(chunks),
-            "size_bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
-            "created_at": datetime.utcnow(),
-            "deleted": False,
-            "content_hash": content_hash,
-        }
-        db.documents.update_one({"_id": doc_objid}, {"$set": rec}, upsert=True)
-
-        # 🟢 delete old vectors only in existing doc case
-        try:
-            docs_remove_by_doc_id(user_id=_norm_id(user_id), doc_id=_norm_id(doc_id))
-        except Exception as e:
-            print("⚠️ FAISS delete failed:", e)
-    else:
-        # New doc
-        doc_objid = ObjectId()
-        doc_id = str(doc_objid)
-
-        rec = {
-            "_id": doc_objid,
-            "user_id": user_id,
-            "filename": filename,
-            "chunk_count": len(chunks),
-            "size_bytes": os.path.getsize(file_path) if os.path.exists(file_path) else None,
-            "created_at": datetime.utcnow(),
-            "deleted": False,
-            "content_hash": content_hash,
-        }
-        db.documents.update_one({"_id": rec["_id"]}, {"$set": rec}, upsert=True)
-        # ❌ no delete for new doc
-
-    # ---- Save new vectors (force normalized IDs)
-    metadata_list = [
-        {
-            "user_id": _norm_id(user_id),
-            "doc_id": _norm_id(doc_id),
-            "filename": filename,
-            "chunk": c
-        }
-        for c in chunks
-    ]
-    save_to_faiss(vectors, metadata_list)
-
-    print(f"✅ Saved {len(chunks)} chunks for doc_id={doc_id}")
-    return {"document_id": doc_id, "chunk_count": len(chunks)}
+    try:
+        # ---- Load text
+        heartbeat("loading", 0.05)
+        text = _load_text(file_path, filename)
+        if not text.strip():
+            raise ValueError("Empty file")
+
+        # ---- Chunk text
+        heartbeat("chunking", 0.15)
+        chunks = chunk_text(text, chunk_size=1000, overlap=200)
+        if not chunks:
+            raise ValueError("No chunks created")
+
+        if existing:
+            # 🟢 delete leftover vectors (a half-finished earlier ingest) only in existing doc case
+            try:
+                docs_remove_by_doc_id(user_id=_norm_id(user_id), doc_id=_norm_id(doc_id))
+            except Exception as e:
+                print("⚠️ FAISS delete failed:", e)
+
+        # ---- Embed + save (force normalized IDs). Chunks this user already stored (boilerplate,
+        # repeated headers, re-uploads) are linked instead of re-embedded; the shard's BM25
+        # index, once built, picks up new chunks in the same append
+        heartbeat("embedding", 0.2)
+        stats = docs_add_chunks(
+            user_id=_norm_id(user_id),
+            doc_id=_norm_id(doc_id),
+            texts=chunks,
+            embed=_embed_with_progress(heartbeat) if progress else embed_texts,
+            filename=filename,
+        )
+    except Exception:
+        db.documents.update_one({"_id": doc_objid}, {"$set": {"status": "failed"}})
+        raise
+    db.documents.update_one({"_id": doc_objid}, {"$set": {"status": "ready", "chunk_count": stats["chunks"]}})
+    report("done", 1.0)
+
+    logger.info(
+        f"Saved {stats['chunks']} chunks for doc_id={doc_id} "
+        f"(embedded {stats['added'] - stats['copied']}, reused {stats['linked'] + stats['copied']})"
+    )
+    # chunk_count is what the doc has indexed: repeats inside the upload were dropped
+    return {"document_id": doc_id, "chunk_count": stats["chunks"], "duplicate": False}
@@ -0,0 +1,199 @@
+# backend/services/ingest_jobs.py
+# Background ingestion queue for /docs/upload.
+# - The upload is written to UPLOAD_DIR and a job document is inserted into Mongo
+#   (db.ingest_jobs); the endpoint returns the job id right away
+# - INGEST_WORKERS threads per API process claim queued jobs atomically
+#   (find_one_and_update queued -> running), so several uvicorn workers share one queue
+#   and a job runs exactly once; enqueue() wakes the local workers, others poll
+# - The worker runs doc_service.process_document and writes stage / progress into
+#   the job (GET /docs/jobs/{id}); every update doubles as a heartbeat
+# - A job whose heartbeat is older than INGEST_STALE_SECS (its process died) is put
+#   back in the queue, up to INGEST_MAX_ATTEMPTS runs; the uploaded file is removed
+#   once the job is done or has failed for good
+# - A job whose content another job is indexing right now (doc_service.IndexingInProgress)
+#   goes back in the queue as "waiting" for INGEST_CLAIM_RETRY_SECS instead of holding a
+#   worker; the retry usually takes the content-hash fast path. Waiting does not count
+#   as an attempt
+# - Jobs are served from the process-local disk: all API workers of a deployment
+#   must share UPLOAD_DIR
+# Env: INGEST_WORKERS, INGEST_POLL_SECS, INGEST_STALE_SECS, INGEST_MAX_ATTEMPTS,
+#      INGEST_CLAIM_RETRY_SECS
+
+from __future__ import annotations
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from backend.database.mongodb import db
+from backend.services.doc_service import IndexingInProgress, process_document
+
+logger = logging.getLogger("ingest_jobs")
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_POLL_SECS = float(os.getenv("INGEST_POLL_SECS", "2"))
+INGEST_STALE_SECS = float(os.getenv("INGEST_STALE_SECS", "600"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_CLAIM_RETRY_SECS = float(os.getenv("INGEST_CLAIM_RETRY_SECS", "5"))
+
+jobs = db["ingest_jobs"]
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads: List[threading.Thread] = []
+_lock = threading.Lock()
+
+
+def ensure_indexes() -> None:
+    jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    jobs.create_index([("user_id", ASCENDING), ("created_at", ASCENDING)])
+
+
+# ---------------- API side ----------------
+def enqueue(*, user_id: str, filename: str, path: str, size_bytes: int, content_hash: Optional[str] = None) -> str:
+    now = datetime.utcnow()
+    job_id = jobs.insert_one({
+        "user_id": str(user_id),
+        "filename": filename,
+        "path": path,
+        "size_bytes": size_bytes,
+        "content_hash": content_hash,
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0.0,
+        "attempts": 0,
+        "document_id": None,
+        "chunk_count": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }).inserted_id
+    _wake.set()
+    return str(job_id)
+
+
+def get_job(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    try:
+        oid = ObjectId(job_id)
+    except Exception:
+        return None
+    job = jobs.find_one({"_id": oid, "user_id": str(user_id)})
+    return public(job) if job else None
+
+
+def public(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "job_id": str(job["_id"]),
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "progress": round(float(job.get("progress") or 0.0), 3),
+        "filename": job.get("filename"),
+        "size_bytes": job.get("size_bytes"),
+        "document_id": job.get("document_id"),
+        "chunk_count": job.get("chunk_count"),
+        "duplicate": job.get("duplicate", False),
+        "error": job.get("error"),
+        "attempts": job.get("attempts"),
+        "created_at": job.get("created_at"),
+        "updated_at": job.get("updated_at"),
+    }
+
+
+# ---------------- worker side ----------------
+def _claim() -> Optional[Dict[str, Any]]:
+    now = datetime.utcnow()
+    return jobs.find_one_and_update(
+        {"status": "queued", "run_after": {"$not": {"$gt": now}}},
+        {"$set": {"status": "running", "stage": "starting", "updated_at": now, "started_at": now, "worker": os.getpid()},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _requeue_stale() -> None:
+    cutoff = datetime.utcnow() - timedelta(seconds=INGEST_STALE_SECS)
+    stale = {"status": "running", "updated_at": {"$lt": cutoff}}
+    jobs.update_many({**stale, "attempts": {"$lt": INGEST_MAX_ATTEMPTS}},
+                     {"$set": {"status": "queued", "stage": "queued", "updated_at": datetime.utcnow()}})
+    for job in jobs.find({**stale, "attempts": {"$gte": INGEST_MAX_ATTEMPTS}}):
+        _finish(job, {"status": "failed", "error": "worker stopped while processing (retries exhausted)"})
+
+
+def _finish(job: Dict[str, Any], fields: Dict[str, Any]) -> None:
+    jobs.update_one({"_id": job["_id"]}, {"$set": {**fields, "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}})
+    try:
+        os.remove(job["path"])
+    except OSError:
+        pass
+
+
+def _retry_later(job: Dict[str, Any], delay: float) -> None:
+    now = datetime.utcnow()
+    jobs.update_one({"_id": job["_id"]}, {
+        "$set": {"status": "queued", "stage": "waiting", "run_after": now + timedelta(seconds=delay), "updated_at": now},
+        "$inc": {"attempts": -1},
+    })
+
+
+def _run(job: Dict[str, Any]) -> None:
+    def progress(stage: str, fraction: float) -> None:
+        jobs.update_one({"_id": job["_id"]}, {"$set": {"stage": stage, "progress": fraction, "updated_at": datetime.utcnow()}})
+
+    try:
+        result = process_document(
+            job["path"], job["filename"], job["user_id"], progress=progress, content_hash=job.get("content_hash"),
+        )
+    except IndexingInProgress:
+        _retry_later(job, INGEST_CLAIM_RETRY_SECS)
+        return
+    except Exception as e:
+        logger.error(f"Ingest job {job['_id']} ({job['filename']}) failed: {e}")
+        _finish(job, {"status": "failed", "stage": "failed", "error": str(e)})
+        return
+    _finish(job, {
+        "status": "done", "stage": "done", "progress": 1.0,
+        "document_id": result["document_id"], "chunk_count": result["chunk_count"],
+        "duplicate": result.get("duplicate", False),
+    })
+
+
+def _loop() -> None:
+    last_sweep = 0.0
+    while not _stop.is_set():
+        try:
+            if time.monotonic() - last_sweep > INGEST_POLL_SECS * 10:
+                _requeue_stale()
+                last_sweep = time.monotonic()
+            job = _claim()
+        except Exception as e:
+            logger.error(f"Ingest queue unavailable: {e}")
+            job = None
+        if job is None:
+            _wake.wait(INGEST_POLL_SECS)
+            _wake.clear()
+            continue
+        _run(job)
+
+
+def start_workers(n: int = INGEST_WORKERS) -> None:
+    with _lock:
+        if _threads:
+            return
+        _stop.clear()
+        for i in range(max(1, n)):
+            t = threading.Thread(target=_loop, name=f"ingest-{i}", daemon=True)
+            t.start()
+            _threads.append(t)
+
+
+def stop_workers() -> None:
+    """Stop claiming new jobs; a job already running finishes (or is requeued once stale)."""
+    _stop.set()
+    _wake.set()
+    with _lock:
+        _threads.clear()
@@ -0,0 +1,30 @@
+# backend/tests/conftest.py
+# Shared fixtures: every test gets its own vectorstores/ tree under tmp_path and a fresh
+# process-wide VectorStore (and retrieval cache), so nothing touches the repo's
+# vectorstores/ directory.
+
+import numpy as np
+import pytest
+
+from backend.database import retrieval_cache, vector_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    base = tmp_path / "vectorstores"
+    monkeypatch.setattr(vector_store, "BASE", base)
+    monkeypatch.setattr(vector_store, "DOCS_DIR", base / "docs")
+    monkeypatch.setattr(vector_store, "SHARDS_DIR", base / "docs" / "shards")
+    monkeypatch.setattr(vector_store, "CONV_DIR", base / "conversations")
+    (base / "docs" / "shards").mkdir(parents=True)
+    (base / "conversations").mkdir(parents=True)
+    store = vector_store.VectorStore(snapshot_every=0, snapshot_secs=0)
+    monkeypatch.setattr(vector_store, "_STORE", store)
+    monkeypatch.setattr(retrieval_cache, "_CACHE", None)    # cached hits would outlive the store
+    yield store
+    store._maintenance.shutdown(wait=True)
+
+
+def unit_rows(n: int, d: int = 32, seed: int = 0) -> np.ndarray:
+    X = np.random.default_rng(seed).standard_normal((n, d)).astype("float32")
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
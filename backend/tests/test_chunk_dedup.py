@@ -0,0 +1,71 @@
+# backend/tests/test_chunk_dedup.py
+# Shared chunks (docs_add_chunks links) after one of the docs sharing them is removed.
+
+import numpy as np
+import pytest
+
+from backend.database import faiss_handler as fh
+from backend.database.vector_store import docs_shard
+from backend.tests.conftest import unit_rows
+
+SHARED, ONLY_A, ONLY_B = "shared boilerplate chunk", "chunk only in a", "chunk only in b"
+VECS = dict(zip([SHARED, ONLY_A, ONLY_B], unit_rows(3)))
+
+
+def _embed(texts):
+    return np.stack([VECS[t] for t in texts])
+
+
+def _search(**filters):
+    return fh.docs_search(user_id="u", query_vector=VECS[SHARED], top_k=5, **filters)
+
+
+@pytest.fixture
+def two_docs(store):
+    fh.docs_add_chunks(user_id="u", doc_id="A", texts=[SHARED, ONLY_A], embed=_embed, filename="a.pdf")
+    res = fh.docs_add_chunks(user_id="u", doc_id="B", texts=[SHARED, ONLY_B], embed=_embed, filename="b.pdf")
+    assert res["linked"] == 1
+    return store
+
+
+def test_linked_hit_reports_the_filtered_doc(two_docs):
+    hit = _search(doc_id="B")[0]
+    assert hit["text"] == SHARED
+    assert hit["metadata"]["doc_id"] == "B" and hit["metadata"]["filename"] == "b.pdf"
+    assert _search(doc_id="A")[0]["metadata"]["filename"] == "a.pdf"
+
+
+def test_filename_filter_follows_links(two_docs):
+    assert {h["text"] for h in _search(filename="b.pdf")} == {SHARED, ONLY_B}
+    assert {h["text"] for h in _search(filename="a.pdf")} == {SHARED, ONLY_A}
+
+
+def test_removed_doc_is_not_searchable(two_docs):
+    fh.docs_remove_by_doc_id(user_id="u", doc_id="A")
+    assert _search(doc_id="A") == []
+    assert _search(filename="a.pdf") == []
+    assert {h["text"] for h in _search(doc_id="B")} == {SHARED, ONLY_B}
+    assert {h["text"] for h in _search(filename="b.pdf")} == {SHARED, ONLY_B}
+    for hit in _search():                                   # unfiltered: the shared row now belongs to B
+        assert hit["metadata"]["doc_id"] == "B" and hit["metadata"]["filename"] == "b.pdf"
+
+
+def test_links_survive_snapshot_and_compaction(two_docs):
+    fh.docs_remove_by_doc_id(user_id="u", doc_id="A")
+    shard = docs_shard("u")
+    space = two_docs.ns(shard)
+    space.rebuild()                                         # drops the tombstoned "only in a" row
+    two_docs.reload(shard)                                  # re-read the snapshot from disk
+    assert _search(doc_id="A") == []
+    hits = _search(filename="b.pdf")
+    assert {h["text"] for h in hits} == {SHARED, ONLY_B}
+    assert {h["metadata"]["doc_id"] for h in hits} == {"B"}
+
+
+def test_exact_dedup_ignores_whitespace_not_case(store):
+    rows = iter(unit_rows(3, seed=1))
+    embed = lambda texts: np.stack([next(rows) for _ in texts])
+    fh.docs_add_chunks(user_id="u", doc_id="A", texts=["Shared  Boilerplate"], embed=embed, filename="a.pdf")
+    assert fh.docs_add_chunks(user_id="u", doc_id="B", texts=["Shared\nBoilerplate "], embed=embed)["linked"] == 1
+    res = fh.docs_add_chunks(user_id="u", doc_id="C", texts=["shared boilerplate"], embed=embed)
+    assert res["linked"] == 0 and res["added"] == 1
@@ -0,0 +1,35 @@
+# backend/tests/test_lexical_index.py
+# BM25 postings are built on the first lexical search (dense-only shards never pay for them),
+# then kept in step with later appends.
+
+from backend.database import faiss_handler as fh
+from backend.database import vector_store
+from backend.database.vector_store import docs_shard
+from backend.tests.conftest import unit_rows
+
+
+def _add(doc_id, texts, seed):
+    rows = unit_rows(len(texts), seed=seed)
+    fh.docs_add_chunks(user_id="u", doc_id=doc_id, texts=texts, embed=lambda t: rows[:len(t)], filename=f"{doc_id}.pdf")
+
+
+def _bm25(text):
+    return [h["text"] for h in fh.docs_search(user_id="u", query_vector=unit_rows(1)[0], query_text=text, mode="bm25")]
+
+
+def test_postings_built_on_first_lexical_search(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "RETRIEVAL_MODE", "dense")
+    _add("A", ["invoice ISO-9001 audit", "unrelated text"], seed=1)
+    space = store.ns(docs_shard("u"))
+    assert space.lex is None
+    assert _bm25("ISO-9001") == ["invoice ISO-9001 audit"]
+    assert space.lex is not None and space.lex.rows == len(space.meta)
+    _add("B", ["second ISO-9001 report"], seed=2)
+    assert space.lex.rows == len(space.meta)
+    assert sorted(_bm25("ISO-9001")) == ["invoice ISO-9001 audit", "second ISO-9001 report"]
+
+
+def test_lexical_default_keeps_postings_from_first_upload(store, monkeypatch):
+    monkeypatch.setattr(vector_store, "RETRIEVAL_MODE", "hybrid")
+    _add("A", ["invoice ISO-9001 audit"], seed=1)
+    assert store.ns(docs_shard("u")).lex is not None
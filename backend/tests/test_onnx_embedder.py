@@ -0,0 +1,52 @@
+# backend/tests/test_onnx_embedder.py
+# OnnxEmbedder must be a drop-in for the SentenceTransformer path: (n, dim) float32 unit rows
+# pointing the same way as the PyTorch model's. Skipped unless onnxruntime is installed and
+# the model has been exported (python -m backend.utils.onnx_embedder export).
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from backend.utils.model_registry import EMBED_MODEL, model_source
+from backend.utils.onnx_embedder import ONNX_FILE, ONNX_INT8_FILE, OnnxEmbedder, onnx_dir, parity
+
+PATH = onnx_dir(EMBED_MODEL)
+if not (PATH / ONNX_FILE).is_file():
+    pytest.skip(f"no exported ONNX model in {PATH}", allow_module_level=True)
+
+TEXTS = [
+    "hi",
+    "What is the refund policy for annual plans?",
+    "FAISS shards are rebuilt in the background once the tombstone ratio passes the threshold.",
+    " ".join(["a long passage that runs past the max sequence length"] * 60),
+    "Ünïcödé, emoji 🙂 and punctuation... all in one line!",
+]
+
+KINDS = [(False, 0.999), pytest.param(True, 0.98, marks=pytest.mark.skipif(
+    not (PATH / ONNX_INT8_FILE).is_file(), reason="no int8 export"))]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    st = pytest.importorskip("sentence_transformers")
+    return st.SentenceTransformer(model_source(EMBED_MODEL), device="cpu")
+
+
+@pytest.mark.parametrize("quantized,_floor", KINDS)
+def test_output_shape_dtype_norm(quantized, _floor):
+    model = OnnxEmbedder(PATH, quantized=quantized)
+    V = model.encode(TEXTS, batch_size=2)
+    assert V.dtype == np.float32 and V.ndim == 2 and V.shape[0] == len(TEXTS)
+    np.testing.assert_allclose(np.linalg.norm(V, axis=1), 1.0, atol=1e-5)
+    one = model.encode(TEXTS[1])
+    assert one.shape == (V.shape[1],)
+    np.testing.assert_allclose(one, V[1], atol=1e-5)      # batching/sorting keeps input order
+
+
+@pytest.mark.parametrize("quantized,floor", KINDS)
+def test_cosine_parity_with_sentence_transformers(reference, quantized, floor):
+    p = parity(reference, OnnxEmbedder(PATH, quantized=quantized), TEXTS)
+    assert p["dim"] == p["dim_ref"]
+    assert p["min"] >= floor, p
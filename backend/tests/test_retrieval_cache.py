@@ -0,0 +1,27 @@
+# backend/tests/test_retrieval_cache.py
+# Cached results are shared: what one caller does to its hits must not leak to the next.
+
+from backend.database import faiss_handler as fh
+from backend.database.retrieval_cache import get_cache
+from backend.tests.conftest import unit_rows
+
+ROWS = unit_rows(2)
+
+
+def _search():
+    return fh.docs_search(user_id="u", query_vector=ROWS[0], top_k=2)
+
+
+def test_cached_hits_are_copies(store):
+    fh.docs_add_chunks(user_id="u", doc_id="A", texts=["first", "second"], embed=lambda t: ROWS, filename="a.pdf")
+    first = _search()
+    first[0]["metadata"]["doc_id"] = "changed"
+    first[0]["metadata"].pop("filename")
+    first[0].score = 99.0
+    hits_before = get_cache().hits
+    again = _search()
+    assert get_cache().hits == hits_before + 1
+    assert again[0]["metadata"]["doc_id"] == "A" and again[0]["metadata"]["filename"] == "a.pdf"
+    assert again[0]["score"] != 99.0
+    again[0]["metadata"]["doc_id"] = "changed again"
+    assert _search()[0]["metadata"]["doc_id"] == "A"
@@ -0,0 +1,106 @@
+# backend/utils/embedding_batcher.py
+# Dynamic micro-batching for query embeddings.
+# - Concurrent get_query_embedding calls (one string each) are queued; a single worker
+#   thread drains the queue into one encode call per batch, flushed when it reaches
+#   EMBED_BATCH_MAX texts or EMBED_BATCH_WAIT_MS after its first request, whichever is first
+# - Each request gets a concurrent.futures.Future: sync callers block on .result(),
+#   async callers await it via asyncio.wrap_future (the event loop is never blocked)
+# - An encode error fails every future of that batch; the worker keeps running
+# - The worker thread starts on first use (after any fork), is a daemon, and is the
+#   only thread that calls the model for queries
+# Env: EMBED_BATCH (1 = on), EMBED_BATCH_MAX, EMBED_BATCH_WAIT_MS
+
+from __future__ import annotations
+from concurrent.futures import Future
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger("embedding_batcher")
+
+EMBED_BATCH = os.getenv("EMBED_BATCH", "1") == "1"
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+EMBED_BATCH_WAIT_MS = float(os.getenv("EMBED_BATCH_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """Queue of (text, future); encode_fn(list of texts) -> (n, dim) array runs on one worker thread."""
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray],
+                 max_batch: int = EMBED_BATCH_MAX, max_wait_ms: float = EMBED_BATCH_WAIT_MS):
+        self.encode_fn = encode_fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._q: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        self.batches = self.requests = self.errors = 0
+        self.largest = 0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    #--- API ---#
+    def submit(self, text: str) -> Future:
+        self._ensure_worker()
+        fut: Future = Future()
+        self._q.put((text, fut))
+        return fut
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        return self.submit(text).result(timeout)
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(text))
+
+    #--- worker ---#
+    def _collect(self) -> List[Tuple[str, Future]]:
+        batch = [self._q.get()]                        # block until there is work
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            left = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=left) if left > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            batch = [(t, f) for t, f in batch if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            self.largest = max(self.largest, len(batch))
+            try:
+                V = self.encode_fn([t for t, _ in batch])
+                for (_, fut), v in zip(batch, V):
+                    fut.set_result(v)
+            except Exception as e:                     # never let one bad batch kill the worker
+                self.errors += 1
+                logger.error(f"Embedding batch of {len(batch)} failed: {e}")
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches, "requests": self.requests, "errors": self.errors,
+            "largest_batch": self.largest, "queued": self._q.qsize(),
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000.0,
+        }
@@ -0,0 +1,194 @@
+# backend/utils/embedding_cache.py
+# Two-tier cache of text embeddings (embedding_handler.get_embeddings / get_query_embedding).
+# - Key: (model name, sha256 of the exact text) -> float32 vector; a different model never
+#   shares vectors, and any change to the text is a different key
+# - Tier 1: in-process LRU of EMBED_CACHE_SIZE vectors
+# - Tier 2: sqlite file (EMBED_CACHE_PATH) shared by all workers and kept across restarts;
+#   disk hits are promoted into the LRU
+# - Covers chunks shared across different files that chunk dedup cannot link (another
+#   user's shard, a doc deleted and compacted away, a retried failed ingest), repeated
+#   questions, and the [query, answer] pair re-encoded for conversation memory. Re-uploads
+#   of indexed content never reach it: the content-hash fast path skips embedding
+# - Hit / miss counters per tier via stats() (GET /stats)
+# Env: EMBED_CACHE_SIZE (vectors in RAM, 0 = off), EMBED_CACHE_DISK (1 = sqlite tier on),
+#      EMBED_CACHE_PATH
+
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+logger = logging.getLogger("embedding_cache")
+
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "20000"))
+EMBED_CACHE_DISK = os.getenv("EMBED_CACHE_DISK", "1") == "1"
+EMBED_CACHE_PATH = Path(os.getenv("EMBED_CACHE_PATH", str(ROOT / "vectorstores" / "embeddings.sqlite")))
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS embeddings ("
+    " model TEXT NOT NULL, key BLOB NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL,"
+    " PRIMARY KEY (model, key)) WITHOUT ROWID"
+)
+_SQL_VARS = 500                         # keys per IN (...) lookup, under sqlite's variable limit
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Thread-safe LRU over an optional sqlite store; vectors are read-only float32 arrays."""
+
+    def __init__(self, size: int = EMBED_CACHE_SIZE, path: Optional[Path] = EMBED_CACHE_PATH if EMBED_CACHE_DISK else None):
+        self.size = size
+        self.path = path
+        self._lru: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self.mem_hits = self.disk_hits = self.misses = self.evictions = self.disk_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    #--- disk tier ---#
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+                db.execute("PRAGMA journal_mode=WAL")        # readers in other workers don't block writers
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.execute(_SCHEMA)
+                db.commit()
+                self._db = db
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding disk cache disabled ({self.path}): {e}")
+                self.path = None
+                return None
+        return self._db
+
+    def _disk_get(self, model: str, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        out: Dict[bytes, np.ndarray] = {}
+        with self._db_lock:
+            db = self._conn()
+            if db is None:
+                return out
+            try:
+                for i in range(0, len(keys), _SQL_VARS):
+                    part = keys[i:i + _SQL_VARS]
+                    rows = db.execute(
+                        f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                        [model, *part],
+                    ).fetchall()
+                    for key, vec in rows:
+                        out[bytes(key)] = np.frombuffer(vec, dtype="float32")
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                logger.warning(f"Embedding disk cache read failed: {e}")
+        return out
+
+    def _disk_put(self, model: str, items: List[Tuple[bytes, np.ndarray]]) -> None:
+        with self._db_lock:
+            db = self._conn()
+            if db is None:
+                return
+            try:
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, dim, vec) VALUES (?, ?, ?, ?)",
+                    [(model, k, int(v.size), v.tobytes()) for k, v in items],
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                self.disk_errors += 1
+                logger.warning(f"Embedding disk cache write failed: {e}")
+
+    #--- lookups ---#
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vector per text (None where neither tier has it)."""
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        if not self.enabled:
+            return out
+        keys = [text_hash(t) for t in texts]
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._lru.get((model, key))
+                if vec is not None:
+                    self._lru.move_to_end((model, key))
+                    self.mem_hits += 1
+                    out[i] = vec
+                else:
+                    missing.setdefault(key, []).append(i)
+        if missing:
+            found = self._disk_get(model, list(missing))
+            with self._lock:
+                for key, idx in missing.items():
+                    vec = found.get(key)
+                    if vec is None:
+                        self.misses += len(idx)
+                        continue
+                    self.disk_hits += len(idx)
+                    self._remember((model, key), vec)
+                    for i in idx:
+                        out[i] = vec
+        return out
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not self.enabled or not len(texts):
+            return
+        V = np.asarray(vectors, dtype="float32").reshape(len(texts), -1)
+        items = []
+        with self._lock:
+            for text, v in zip(texts, V):
+                key = text_hash(text)
+                v = v.copy()
+                v.flags.writeable = False             # shared by every caller that hits it
+                self._remember((model, key), v)
+                items.append((key, v))
+        self._disk_put(model, items)
+
+    def _remember(self, key: Tuple[str, bytes], vec: np.ndarray) -> None:
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.size:
+            self._lru.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.mem_hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._lru), "capacity": self.size,
+                "disk": str(self.path) if self.path is not None else None,
+                "mem_hits": self.mem_hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "evictions": self.evictions, "disk_errors": self.disk_errors,
+                "hit_rate": round((self.mem_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+_CACHE: Optional[EmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = EmbeddingCache()
+    return _CACHE
@@ -9,28 +9,115 @@ This module handles:
 """
 
 from fastapi import HTTPException
-from backend.database.faiss_handler import search_in_faiss_for_user, conv_search
+from fastapi.concurrency import run_in_threadpool
+from backend.database.faiss_handler import docs_search_batch
 from backend.services.llm_services import call_llm
 from backend.database.mongodb import db
 from bson import ObjectId
-from sentence_transformers import SentenceTransformer
+from backend.utils.model_registry import get_model, model_key
+from backend.utils.embedding_cache import get_embedding_cache
+from backend.utils.embedding_batcher import EMBED_BATCH, EmbeddingBatcher
+from backend.utils.embedding_pool import encode_parallel
+import numpy as np
 
 
 # -----------------------------
-# Load embedding model once
+# Embedding model: loaded once per process on first use (model_registry.py)
+# Vectors are cached by (model, sha256(text)) in RAM + sqlite (embedding_cache.py)
+# Concurrent single-query misses are micro-batched into one encode (embedding_batcher.py)
+# Large ingests are sharded across a process pool when EMBED_WORKERS > 0 (embedding_pool.py)
+# embed_texts / embed_query return contiguous, L2-normalized float32 arrays that go to
+# faiss_handler as-is (normalized once, here); get_embeddings / get_query_embedding are
+# list shims for older callers
 # -----------------------------
-_model = SentenceTransformer("all-MiniLM-L6-v2")
+def _unit(X: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float32 array we own, in place."""
+    norms = np.sqrt(np.einsum("ij,ij->i", X, X))
+    X /= np.maximum(norms, 1e-12)[:, None]
+    return X
+
+
+def _encode_fresh(texts: list[str]) -> np.ndarray:
+    """Run the model on texts (each distinct text once), normalize and cache the vectors."""
+    todo = list(dict.fromkeys(texts))
+    fresh = np.ascontiguousarray(
+        encode_parallel(todo, lambda t: get_model().encode(t, convert_to_numpy=True)), dtype="float32"
+    )
+    fresh = _unit(fresh if fresh.flags.writeable else fresh.copy())
+    get_embedding_cache().put_many(model_key(), todo, fresh)
+    if len(todo) == len(texts):
+        return fresh
+    pos = {t: i for i, t in enumerate(todo)}
+    return fresh[[pos[t] for t in texts]]
+
+
+def _encode(texts: list[str]) -> np.ndarray:
+    """(len(texts), dim) float32; only texts missing from the cache reach the model (once each)."""
+    cached = get_embedding_cache().get_many(model_key(), texts)
+    miss = [i for i, v in enumerate(cached) if v is None]
+    if len(miss) == len(texts):
+        return _encode_fresh(texts)
+    dim = next(v.size for v in cached if v is not None)
+    out = np.empty((len(texts), dim), dtype="float32")
+    for i, v in enumerate(cached):
+        if v is not None:
+            out[i] = v
+    if miss:
+        out[miss] = _encode_fresh([texts[i] for i in miss])
+    return out
+
+
+query_batcher = EmbeddingBatcher(_encode_fresh) if EMBED_BATCH else None
+
+
+def embed_texts(texts: list[str]) -> np.ndarray:
+    """
+    Embeddings for a list of texts.
+    Returns a (len(texts), dim) C-contiguous, L2-normalized float32 array.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype="float32")
+    return _encode(list(texts))
+
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    Embedding for one query string: (dim,) L2-normalized float32 (read-only, may be shared
+    with the cache). Empty text -> empty array.
+    """
+    if not text or not text.strip():
+        return np.empty(0, dtype="float32")
+    embedding = get_embedding_cache().get_many(model_key(), [text])[0]
+    if embedding is None:
+        embedding = query_batcher.embed(text) if query_batcher else _encode_fresh([text])[0]
+    return embedding
+
 
+async def aembed_query(text: str) -> np.ndarray:
+    """
+    embed_query for async code: waits on the batcher without blocking the event loop.
+    """
+    if not text or not text.strip():
+        return np.empty(0, dtype="float32")
+    embedding = get_embedding_cache().get_many(model_key(), [text])[0]
+    if embedding is None:
+        if query_batcher is None:
+            return await run_in_threadpool(embed_query, text)
+        embedding = await query_batcher.aembed(text)
+    return embedding
 
+
+# list shims (pre-ndarray API) --#
 def get_query_embedding(text: str) -> list[float]:
     """
     Generate an embedding for a single text string.
     Returns a list of floats (vector).
     """
-    if not text or not text.strip():
-        return []
-    embedding = _model.encode(text, convert_to_numpy=True)
-    return embedding.tolist()
+    return embed_query(text).tolist()
+
+
+async def aget_query_embedding(text: str) -> list[float]:
+    return (await aembed_query(text)).tolist()
 
 
 def get_embeddings(texts: list[str]) -> list[list[float]]:
@@ -40,8 +127,7 @@ def get_embeddings(texts: list[str]) -> list[list[float]]:
     """
     if not texts:
         return []
-    embeddings = _model.encode(texts, convert_to_numpy=True)
-    return embeddings.tolist()
+    return embed_texts(texts).tolist()
 
 
 # -----------------------------
@@ -67,14 +153,12 @@ def get_conversation_history(user_id: str, conversation_id: str):
     # Extract text and prepare embeddings
     conversation_context = [{"role": m["role"], "content": m["content"]} for m in items]
 
-    embeddings = []
-    for item in conversation_context:
-        try:
-            query_vector = get_query_embedding(item["content"])  # Create the query embedding
-            result = search_in_faiss_for_user(query_vector, user_id=user_id)
-            embeddings.append(result)
-        except Exception as e:
-            embeddings.append({"error": f"Embedding failed for: {item['content'][:50]} | {str(e)}"})
+    # one encode call + one batched FAISS search for all messages
+    try:
+        query_vectors = embed_texts([item["content"] for item in conversation_context])
+        embeddings = docs_search_batch(user_id=user_id, query_vectors=query_vectors, top_k=5) if len(query_vectors) else []
+    except Exception as e:
+        embeddings = [{"error": f"Embedding failed for: {item['content'][:50]} | {str(e)}"} for item in conversation_context]
 
     return conversation_context, embeddings
 
@@ -0,0 +1,146 @@
+# backend/utils/embedding_pool.py
+# Process-pool embedding for large ingests (a 300-page PDF = thousands of chunks).
+# - EMBED_WORKERS worker processes (spawned, not forked: torch / onnxruntime threads do
+#   not survive fork) each load the model ONCE, in the pool initializer, via model_registry
+# - encode_parallel(texts): the parent allocates one (n, dim) float32 SharedMemory block,
+#   shards the texts into EMBED_POOL_SHARD-sized slices, and every worker writes its
+#   slice's vectors straight into the block; only text goes over the pipe, no pickled arrays
+# - Each worker gets EMBED_WORKER_THREADS intra-op threads (default cores // workers), so
+#   the pool uses all cores without oversubscribing them
+# - Calls with fewer than EMBED_POOL_MIN texts stay in-process (queries, chat turns)
+# - A crashed worker (BrokenProcessPool) drops the pool; the caller falls back to
+#   in-process encoding and the next large ingest starts a fresh pool
+# Env: EMBED_WORKERS (0 = off), EMBED_POOL_MIN, EMBED_POOL_SHARD, EMBED_WORKER_THREADS
+
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+import logging
+import os
+import threading
+from typing import List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger("embedding_pool")
+
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+EMBED_POOL_MIN = int(os.getenv("EMBED_POOL_MIN", "128"))
+EMBED_POOL_SHARD = int(os.getenv("EMBED_POOL_SHARD", "64"))
+EMBED_WORKER_THREADS = int(os.getenv("EMBED_WORKER_THREADS", "0"))     # 0 = cores // workers
+
+
+# ---------------- worker side ----------------
+def _init_worker(threads: int) -> None:
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["EMBED_ONNX_THREADS"] = str(threads)
+    os.environ["MODEL_WARMUP"] = "0"
+    from backend.utils.model_registry import EMBED_BACKEND, get_model
+    if EMBED_BACKEND == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    get_model().encode(["warmup"], convert_to_numpy=True)
+
+
+def _worker_dim() -> int:
+    from backend.utils.model_registry import get_model
+    return int(get_model().encode(["dim"], convert_to_numpy=True).shape[1])
+
+
+def _encode_into(shm_name: str, n: int, dim: int, start: int, texts: List[str]) -> int:
+    from backend.utils.model_registry import get_model
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((n, dim), dtype="float32", buffer=shm.buf)
+        out[start:start + len(texts)] = get_model().encode(texts, batch_size=32, convert_to_numpy=True)
+        del out                                            # release the view before close()
+    finally:
+        shm.close()
+    return len(texts)
+
+
+# ---------------- parent side ----------------
+class EmbeddingPool:
+    def __init__(self, workers: int = EMBED_WORKERS, threads: int = EMBED_WORKER_THREADS, shard: int = EMBED_POOL_SHARD):
+        self.workers = max(1, workers)
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.shard = max(1, shard)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dim: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context("spawn"),
+                    initializer=_init_worker, initargs=(self.threads,),
+                )
+                self._dim = None
+            return self._pool
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """(len(texts), dim) float32, computed across the worker processes."""
+        texts = list(texts)
+        try:
+            pool = self._executor()
+            if self._dim is None:
+                self._dim = pool.submit(_worker_dim).result()
+            return self._encode(pool, texts, self._dim)
+        except BrokenProcessPool:
+            self.shutdown()
+            raise
+
+    def _encode(self, pool: ProcessPoolExecutor, texts: List[str], dim: int) -> np.ndarray:
+        n = len(texts)
+        shm = shared_memory.SharedMemory(create=True, size=max(n * dim * 4, 1))
+        try:
+            futs = [
+                pool.submit(_encode_into, shm.name, n, dim, s, texts[s:s + self.shard])
+                for s in range(0, n, self.shard)
+            ]
+            wait(futs)
+            for f in futs:
+                f.result()                                  # re-raise the first worker error
+            return np.ndarray((n, dim), dtype="float32", buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_POOL: Optional[EmbeddingPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> Optional[EmbeddingPool]:
+    global _POOL
+    if EMBED_WORKERS <= 0:
+        return None
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = EmbeddingPool()
+    return _POOL
+
+
+def encode_parallel(texts: Sequence[str], encode_local) -> np.ndarray:
+    """Pool encode for big inputs; encode_local(texts) for small ones, pool off, or a dead pool."""
+    pool = get_pool()
+    if pool is None or len(texts) < EMBED_POOL_MIN:
+        return encode_local(texts)
+    try:
+        return pool.encode(texts)
+    except BrokenProcessPool as e:
+        logger.error(f"Embedding pool crashed ({e}); encoding {len(texts)} texts in-process")
+        return encode_local(texts)
+
+
+def shutdown_pool() -> None:
+    if _POOL is not None:
+        _POOL.shutdown()
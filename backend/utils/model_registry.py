@@ -0,0 +1,105 @@
+# backend/utils/model_registry.py
+# Process-wide registry of embedding models.
+# - A model is loaded ONCE per process, on first use (get_model), never at import time,
+#   so importing embedding_handler / chat_service no longer blocks startup
+# - Concurrent first callers wait for the single load instead of loading twice
+# - Offline hosts: EMBED_MODEL_PATH (or MODEL_DIR/<name>) points at a local copy;
+#   a local path is loaded straight from disk, no hub access
+# - warmup() loads (and runs one encode) in a background thread; main.py calls it on
+#   FastAPI startup so the first request does not pay for the model load
+# - Backend (EMBED_BACKEND): "torch" = SentenceTransformer, "onnx" = onnx_embedder.OnnxEmbedder
+#   (exported ONNX graph, optionally int8); both expose the same encode()
+# Env: EMBED_MODEL (default all-MiniLM-L6-v2), EMBED_MODEL_PATH, MODEL_DIR,
+#      EMBED_DEVICE (cpu / cuda, default auto), MODEL_WARMUP (1 = warm up on startup),
+#      EMBED_BACKEND (torch / onnx)
+
+from __future__ import annotations
+from pathlib import Path
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("model_registry")
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "all-MiniLM-L6-v2")
+EMBED_MODEL_PATH = os.getenv("EMBED_MODEL_PATH", "").strip()
+MODEL_DIR = os.getenv("MODEL_DIR", "").strip()
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "").strip() or None
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").strip().lower()
+EMBED_BACKENDS = ("torch", "onnx")
+if EMBED_BACKEND not in EMBED_BACKENDS:
+    raise ValueError(f"Unknown EMBED_BACKEND '{EMBED_BACKEND}' (expected one of {', '.join(EMBED_BACKENDS)})")
+
+_models: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def model_source(name: Optional[str] = None) -> str:
+    """Where `name` is loaded from: a local path when one is configured, else the hub name."""
+    name = name or EMBED_MODEL
+    if EMBED_MODEL_PATH and name == EMBED_MODEL:
+        return EMBED_MODEL_PATH
+    if MODEL_DIR and (Path(MODEL_DIR) / name).is_dir():
+        return str(Path(MODEL_DIR) / name)
+    return name
+
+
+def model_key(name: Optional[str] = None) -> str:
+    """Identity of the vectors `name` produces with the configured backend (embedding cache key)."""
+    name = name or EMBED_MODEL
+    if EMBED_BACKEND == "onnx":
+        from backend.utils.onnx_embedder import EMBED_ONNX_QUANT
+        return f"{name}@onnx-int8" if EMBED_ONNX_QUANT else f"{name}@onnx"
+    return name
+
+
+def _load(name: str):
+    if EMBED_BACKEND == "onnx":
+        from backend.utils.onnx_embedder import OnnxEmbedder, onnx_dir
+        return OnnxEmbedder(onnx_dir(name)), str(onnx_dir(name))
+    from sentence_transformers import SentenceTransformer   # heavy import, deferred too
+    source = model_source(name)
+    return SentenceTransformer(source, device=EMBED_DEVICE), source
+
+
+def get_model(name: Optional[str] = None):
+    """The loaded encoder for `name` (default EMBED_MODEL), loading it on first use."""
+    name = name or EMBED_MODEL
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:                      # one load per model; other models load in parallel
+        model = _models.get(name)
+        if model is None:
+            t0 = time.perf_counter()
+            model, source = _load(name)
+            _models[name] = model
+            logger.info(f"Loaded embedding model '{name}' ({EMBED_BACKEND}) from {source} in {time.perf_counter() - t0:.1f}s")
+    return model
+
+
+def loaded_models() -> List[str]:
+    return list(_models)
+
+
+def warmup(names: Optional[List[str]] = None, background: bool = True) -> Optional[threading.Thread]:
+    """Load the models and run one tiny encode (first-call kernels / allocations) ahead of traffic."""
+    def _run() -> None:
+        for name in names or [EMBED_MODEL]:
+            try:
+                get_model(name).encode(["warmup"], convert_to_numpy=True)
+            except Exception as e:
+                logger.error(f"Warmup of embedding model '{name}' failed: {e}")
+
+    if not background:
+        _run()
+        return None
+    t = threading.Thread(target=_run, name="model-warmup", daemon=True)
+    t.start()
+    return t
@@ -0,0 +1,154 @@
+# backend/utils/onnx_embedder.py
+# ONNX Runtime backend for the sentence-embedding model (EMBED_BACKEND=onnx).
+# - Same output as the SentenceTransformer path for MiniLM-style models: transformer ->
+#   attention-masked mean pooling -> L2 normalize -> (n, 384) float32
+# - Runs on CPU without torch: onnxruntime + the model's fast tokenizer (tokenizer.json)
+# - EMBED_ONNX_QUANT=1 loads model.int8.onnx (dynamic int8 weights) instead of model.onnx
+# - export_onnx() produces the directory once, on a host that has torch:
+#     python -m backend.utils.onnx_embedder export [--out DIR] [--no-quantize]
+#   -> DIR/model.onnx, DIR/model.int8.onnx, DIR/tokenizer.json (+ tokenizer config)
+# - parity() compares against the PyTorch model (cosine per text); the benchmark
+#   backend/benchmarks/bench_onnx_embedding.py runs it before measuring throughput
+# Env: EMBED_ONNX_DIR (default MODEL_DIR/<model>-onnx, else <repo>/models/<model>-onnx),
+#      EMBED_ONNX_QUANT, EMBED_ONNX_THREADS (0 = onnxruntime default), EMBED_MAX_SEQ
+
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger("onnx_embedder")
+
+ROOT = Path(__file__).resolve().parents[2]  # repo root
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "").strip()
+EMBED_ONNX_QUANT = os.getenv("EMBED_ONNX_QUANT", "0") == "1"
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))
+EMBED_MAX_SEQ = int(os.getenv("EMBED_MAX_SEQ", "256"))       # all-MiniLM-L6-v2 max_seq_length
+
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+def onnx_dir(name: str) -> Path:
+    if EMBED_ONNX_DIR:
+        return Path(EMBED_ONNX_DIR)
+    model_dir = os.getenv("MODEL_DIR", "").strip()
+    return (Path(model_dir) if model_dir else ROOT / "models") / f"{name.replace('/', '__')}-onnx"
+
+
+class OnnxEmbedder:
+    """Drop-in for the SentenceTransformer.encode() calls this repo makes."""
+
+    def __init__(self, path: Path, quantized: bool = EMBED_ONNX_QUANT, max_seq: int = EMBED_MAX_SEQ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = Path(path)
+        model_file = path / (ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not model_file.is_file():
+            raise FileNotFoundError(
+                f"{model_file} not found; run `python -m backend.utils.onnx_embedder export --out {path}`"
+            )
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if EMBED_ONNX_THREADS > 0:
+            opts.intra_op_num_threads = EMBED_ONNX_THREADS
+        self.session = ort.InferenceSession(str(model_file), opts, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(path / "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_seq)
+        self.tokenizer.no_padding()                 # padded per batch in _batch
+        self.quantized = quantized
+        self.path = path
+
+    def _batch(self, texts: Sequence[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(list(texts))
+        width = max(len(e.ids) for e in enc)
+        ids = np.zeros((len(enc), width), dtype="int64")
+        mask = np.zeros((len(enc), width), dtype="int64")
+        for i, e in enumerate(enc):
+            ids[i, :len(e.ids)] = e.ids
+            mask[i, :len(e.ids)] = 1
+        feed: Dict[str, np.ndarray] = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feed)[0]                      # (n, seq, dim)
+        m = mask[:, :, None].astype("float32")
+        pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def encode(self, sentences, batch_size: int = 32, convert_to_numpy: bool = True, **_) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        # length-sorted batches waste less padding; results go back in input order
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out: Optional[np.ndarray] = None
+        for s in range(0, len(texts), batch_size):
+            idx = order[s:s + batch_size]
+            V = self._batch([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), V.shape[1]), dtype="float32")
+            out[idx] = V
+        return out[0] if single else out
+
+
+# ---------------- export / parity ----------------
+def export_onnx(name: str, out: Path, quantize: bool = True, opset: int = 14) -> Path:
+    """Export the transformer of SentenceTransformer(name) to out/model.onnx (+ int8 copy)."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from backend.utils.model_registry import model_source
+
+    out = Path(out)
+    out.mkdir(parents=True, exist_ok=True)
+    st = SentenceTransformer(model_source(name), device="cpu")
+    hf = st[0].auto_model.eval()
+    st.tokenizer.save_pretrained(str(out))            # writes tokenizer.json (fast tokenizer)
+    dummy = st.tokenizer(["an example sentence"], return_tensors="pt")
+    names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+    axes = {k: {0: "batch", 1: "seq"} for k in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            hf, tuple(dummy[k] for k in names), str(out / ONNX_FILE),
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes=axes, opset_version=opset, do_constant_folding=True,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(out / ONNX_FILE), str(out / ONNX_INT8_FILE), weight_type=QuantType.QInt8)
+    logger.info(f"Exported {name} to {out}")
+    return out
+
+
+def parity(reference, candidate, texts: Sequence[str]) -> Dict[str, float]:
+    """Cosine similarity per text between two encoders' outputs (1.0 = identical direction)."""
+    A = np.asarray(reference.encode(list(texts), convert_to_numpy=True), dtype="float32")
+    B = np.asarray(candidate.encode(list(texts), convert_to_numpy=True), dtype="float32")
+    cos = (A * B).sum(axis=1) / (np.linalg.norm(A, axis=1) * np.linalg.norm(B, axis=1) + 1e-12)
+    return {"min": float(cos.min()), "mean": float(cos.mean()), "dim_ref": A.shape[1], "dim": B.shape[1]}
+
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    from backend.utils.model_registry import EMBED_MODEL
+
+    ap = argparse.ArgumentParser(description="ONNX embedding backend tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ex = sub.add_parser("export", help="export the embedding model to ONNX (+ int8)")
+    ex.add_argument("--model", default=EMBED_MODEL)
+    ex.add_argument("--out", default=None)
+    ex.add_argument("--no-quantize", action="store_true")
+    args = ap.parse_args(argv)
+    if args.cmd == "export":
+        path = export_onnx(args.model, Path(args.out) if args.out else onnx_dir(args.model), quantize=not args.no_quantize)
+        print(f"✅ ONNX model written to {path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    _main()
@@ -0,0 +1,160 @@
+# backend/utils/upload_stream.py
+# Streaming receive for multipart file uploads (/docs/upload).
+# - FastAPI's UploadFile is only handed to the route after Starlette has parsed the WHOLE
+#   body into a spooled temp file, so no size check in the route can stop a big upload.
+#   receive_file() takes the raw Request instead and feeds request.stream() through
+#   python-multipart's push parser as the bytes arrive
+# - A Content-Length above the limit is refused before the body is read; otherwise the
+#   running byte count is checked on every network chunk and the request is cut off with
+#   413 as soon as the file part passes max_bytes (the partial file is removed)
+# - The file part is hashed (sha256) and counted in the same pass and written to
+#   <dest_dir>/<uuid><ext>.part in chunk_bytes pieces (off the event loop); at most one
+#   piece + one network chunk is held in memory per upload
+# - An unsupported extension is rejected as soon as the part headers are in
+# Env: UPLOAD_CHUNK_KB
+
+from __future__ import annotations
+import hashlib
+import os
+import uuid
+from typing import Any, Dict, Iterable, Optional
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    from python_multipart.exceptions import FormParserError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:                       # python-multipart < 0.0.13
+    from multipart.exceptions import FormParserError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_KB", "1024")) * 1024
+MULTIPART_OVERHEAD = 64 * 1024            # boundaries + part headers on top of the file itself
+
+
+class _Receiver:
+    """python-multipart callbacks: routes the `field` part's bytes to a hashed .part file."""
+
+    def __init__(self, field: str, dest_dir: str, exts: Iterable[str], max_bytes: int, max_mb: float):
+        self.field, self.dest_dir, self.exts = field, dest_dir, set(exts)
+        self.max_bytes, self.max_mb = max_bytes, max_mb
+        self.error: Optional[HTTPException] = None
+        self.filename: Optional[str] = None
+        self.path: Optional[str] = None
+        self.fh = None
+        self.size = 0
+        self.sha = hashlib.sha256()
+        self.buf = bytearray()
+        self._headers: Dict[bytes, bytes] = {}
+        self._field, self._value = b"", b""
+        self._active = False              # inside the file part
+
+    def callbacks(self) -> Dict[str, Any]:
+        return {
+            "on_part_begin": self.part_begin,
+            "on_header_field": self.header_field,
+            "on_header_value": self.header_value,
+            "on_header_end": self.header_end,
+            "on_headers_finished": self.headers_finished,
+            "on_part_data": self.part_data,
+            "on_part_end": self.part_end,
+        }
+
+    def part_begin(self) -> None:
+        self._headers, self._field, self._value = {}, b"", b""
+
+    def header_field(self, data: bytes, start: int, end: int) -> None:
+        self._field += data[start:end]
+
+    def header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def header_end(self) -> None:
+        self._headers[self._field.lower()] = self._value
+        self._field, self._value = b"", b""
+
+    def headers_finished(self) -> None:
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name, filename = params.get(b"name", b"").decode("utf-8", "replace"), params.get(b"filename")
+        if name != self.field or filename is None or self.fh is not None:
+            return                        # other form fields (and repeats of `field`) are skipped
+        self.filename = filename.decode("utf-8", "replace")
+        ext = os.path.splitext(self.filename)[1].lower()
+        if ext not in self.exts:
+            self.error = HTTPException(400, f"Only {', '.join(sorted(self.exts))} supported.")
+            return
+        self.path = os.path.join(self.dest_dir, f"{uuid.uuid4().hex}{ext}.part")
+        self.fh = open(self.path, "wb")
+        self._active = True
+
+    def part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._active or self.error is not None:
+            return
+        self.size += end - start
+        if self.size > self.max_bytes:
+            self.error = HTTPException(413, f"File too large (over {self.max_mb} MB). Max {self.max_mb}.")
+            return
+        piece = data[start:end]
+        self.sha.update(piece)
+        self.buf += piece
+
+    def part_end(self) -> None:
+        self._active = False
+
+    def flush(self) -> None:
+        if self.buf:
+            self.fh.write(self.buf)
+            self.buf = bytearray()
+
+    def discard(self) -> None:
+        if self.fh is not None:
+            self.fh.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+async def receive_file(
+    request: Request, *, dest_dir: str, exts: Iterable[str], max_mb: float,
+    field: str = "file", chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """
+    Stream the multipart `field` file of `request` to dest_dir.
+    Returns {"filename", "path" (the .part file, complete), "size_bytes", "content_hash"}.
+    Raises HTTPException 400 (not multipart / no file / bad extension) or 413 (too large).
+    """
+    max_bytes = int(max_mb * 1024 * 1024)
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > max_bytes + MULTIPART_OVERHEAD:
+        raise HTTPException(413, f"File too large ({int(length) / (1024 * 1024):.1f} MB). Max {max_mb}.")
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    if ctype != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(400, "Expected a multipart/form-data upload.")
+
+    rx = _Receiver(field, dest_dir, exts, max_bytes, max_mb)
+    parser = MultipartParser(params[b"boundary"], rx.callbacks())
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes + MULTIPART_OVERHEAD:      # chunked bodies carry no Content-Length
+                raise HTTPException(413, f"File too large (over {max_mb} MB). Max {max_mb}.")
+            parser.write(chunk)
+            if rx.error is not None:
+                raise rx.error            # stop reading: the rest of the body is never received
+            if len(rx.buf) >= chunk_bytes:
+                await run_in_threadpool(rx.flush)
+        parser.finalize()
+        if rx.fh is None:
+            raise HTTPException(400, f"No '{field}' file in the upload.")
+        await run_in_threadpool(rx.flush)
+        rx.fh.close()
+    except FormParserError as e:
+        rx.discard()
+        raise HTTPException(400, f"Malformed multipart upload: {e}")
+    except BaseException:
+        rx.discard()
+        raise
+    return {"filename": rx.filename, "path": rx.path, "size_bytes": rx.size, "content_hash": rx.sha.hexdigest()}
@@ -1,3 +1,4 @@
+import time
 import streamlit as st
 from state.auth import get_token, is_logged_in
 from services.api import get, post, delete
@@ -43,6 +44,42 @@ def upload_to_backend(file):
         st.error(f"File upload error: {e}")
         return None
 
+def api_get_job(job_id: str):
+    try:
+        return get(f"/docs/jobs/{job_id}", headers=_auth_headers())
+    except Exception as e:
+        st.error(f"Error fetching upload status: {e}")
+        return None
+
+STAGE_LABELS = {
+    "queued": "Waiting in queue", "starting": "Starting", "loading": "Reading file",
+    "chunking": "Splitting into chunks", "embedding": "Embedding chunks", "storing": "Saving to index",
+    "waiting": "Waiting for an identical upload to finish", "done": "Done",
+}
+
+def poll_job(job_id: str, filename: str, timeout_s: float = 90):
+    """
+    Poll /docs/jobs/{id} with a progress bar until the document is indexed (or failed).
+    The page is frozen while this runs, so after timeout_s the job is left to finish in
+    the background and its status is on the Documents page.
+    """
+    bar = st.progress(0.0, text=f"📂 {filename}: queued")
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        resp = api_get_job(job_id)
+        job = resp.json() if resp and getattr(resp, "ok", False) else None
+        if not job:
+            bar.empty()
+            return None
+        label = STAGE_LABELS.get(job.get("stage"), job.get("stage") or "")
+        bar.progress(min(max(float(job.get("progress") or 0.0), 0.0), 1.0), text=f"📂 {filename}: {label}")
+        if job.get("status") in ("done", "failed"):
+            bar.empty()
+            return job
+        time.sleep(1.0)
+    bar.empty()
+    return {"status": "running", "error": "still processing in the background, check the Documents page"}
+
 def ask_backend(question: str, conversation_id: str | None):
     payload = {"question": question}
     if conversation_id:
@@ -78,6 +115,8 @@ ss = st.session_state
 ss.setdefault("chat_messages", [])
 ss.setdefault("chat_conversation_id", None)
 ss.setdefault("last_resp", None)
+ss.setdefault("uploaded_keys", [])      # files already sent (the uploader keeps its value across reruns)
+ss.setdefault("ingest_job", None)       # {"job_id", "filename"} while the backend indexes an upload
 
 # ---------------- Sidebar ----------------
 with st.sidebar:
@@ -128,16 +167,36 @@ with col1:
 with col2:
     prompt = st.chat_input("Type your question here…")
 
-# --- Handle Upload ---
-if uploaded_file:
+# --- Handle Upload (queued on the backend, then polled until indexed) ---
+upload_key = f"{uploaded_file.name}:{uploaded_file.size}" if uploaded_file else None
+if uploaded_file and upload_key not in ss.uploaded_keys and not ss.ingest_job:
     resp = upload_to_backend(uploaded_file)
-    if resp and getattr(resp, "ok", False):
+    data = resp.json() if resp and getattr(resp, "ok", False) else None
+    if data and not data.get("job_id"):
+        # content already indexed: the backend answered from the content hash, nothing to poll
+        ss.uploaded_keys.append(upload_key)
         ss.chat_messages.append({"role": "user", "content": f"📂 Uploaded: {uploaded_file.name}"})
-        st.success(f"✅ Uploaded: {uploaded_file.name}")
+        st.success(f"✅ Already indexed: {uploaded_file.name} ({data.get('chunk_count')} chunks)")
         st.rerun()
+    elif data:
+        ss.uploaded_keys.append(upload_key)
+        ss.ingest_job = {"job_id": data.get("job_id"), "filename": uploaded_file.name}
     else:
         st.error(f"Upload failed: {getattr(resp, 'text', resp)}")
 
+if ss.ingest_job:
+    job = poll_job(ss.ingest_job["job_id"], ss.ingest_job["filename"])
+    name = ss.ingest_job["filename"]
+    ss.ingest_job = None
+    if job and job.get("status") == "done":
+        ss.chat_messages.append({"role": "user", "content": f"📂 Uploaded: {name}"})
+        st.success(f"✅ Uploaded: {name} ({job.get('chunk_count')} chunks)")
+        st.rerun()
+    elif job and job.get("status") == "failed":
+        st.error(f"Upload failed: {job.get('error')}")
+    else:
+        st.info(f"⏳ {name}: {(job or {}).get('error') or 'status unavailable'}")
+
 # --- Handle Question ---
 if prompt:
     resp = ask_backend(prompt, ss.chat_conversation_id)
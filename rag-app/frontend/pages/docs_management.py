@@ -106,7 +106,7 @@ if not items:
 else:
     def _key(it):
         if isinstance(it, dict):
-            return it.get("created_at") or it.get("created") or ""
+            return it.get("last_uploaded_at") or it.get("created_at") or it.get("created") or ""
         return str(it) or ""
 
     items = [i for i in items if isinstance(i, dict)]
@@ -138,12 +138,14 @@ else:
         c1, c2, c3, c4, c5, c6 = st.columns([3, 5, 2, 2, 3, 1])
         _id = it.get("_id") or it.get("id") or ""
         _filename = it.get("filename") or "(unnamed)"
-        _chunks = it.get("chunk_count", it.get("chunks", 0))
+        _chunks = it.get("chunk_count") or it.get("chunks") or "—"      # not counted until indexed
         _size = fmt_bytes(it.get("size_bytes") or it.get("size"))
         _created = fmt_dt(it.get("created_at") or it.get("created"))
 
         c1.code((_id[:10] + "…") if len(_id) > 10 else _id)
         c2.write(_filename)
+        if it.get("aliases"):
+            c2.caption("also uploaded as: " + ", ".join(it["aliases"]))
         c3.write(_chunks)
         c4.write(_size)
         c5.write(_created)